@@ -0,0 +1,265 @@
+"""
+bench_image_engine.py
+────────────────────────────────────────────────────────────────────────────
+Benchmark de image_engine sobre pantallas sintéticas (sin monitor real).
+
+Genera escritorios falsos (fondo, "ventanas", texto) a 1080p, 1440p y 4K,
+pega un template ("botón") a distintas escalas, con ruido o con el color
+desplazado, y mide por estrategia de búsqueda:
+
+• `_find_in_monitor` sobre la captura en memoria, y
+• `find_image` completo, sobre la misma pantalla servida con el backend de
+  replay (screen1.png + monitors.json en un directorio temporal).
+
+Por caso se guardan percentiles de latencia, intentos, pico de memoria
+(tracemalloc, en una pasada aparte sin cronometrar) y acierto (posición
+encontrada a ≤ 3 px de la real). Los resultados van a un JSON que se puede
+comparar con el de otro commit.
+
+$ python benchmarks/bench_image_engine.py --repeat 5 --out bench.json
+$ python benchmarks/bench_image_engine.py --compare bench.json      # tras el cambio
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import image_engine  # noqa: E402
+from replay_capture import save_metadata  # noqa: E402
+
+RESOLUTIONS = {"1080p": (1920, 1080), "1440p": (2560, 1440), "4K": (3840, 2160)}
+TEMPLATE_SCALES = (1.0, 0.9, 1.1)
+# nombre → (sigma del ruido gaussiano, desplazamiento de color BGR)
+DISTORTIONS = {
+    "clean": (0.0, (0, 0, 0)),
+    "noise": (6.0, (0, 0, 0)),
+    "shift": (0.0, (16, -10, 8)),
+}
+TARGETS = ("find_in_monitor", "find_image")
+_HIT_TOLERANCE = 3       # px
+_ATTEMPT_RE = re.compile(r"^\[attempt (\d+)\]")
+
+# ────────────────────────── datos sintéticos ──────────────────────────
+def synthetic_screen(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Escritorio falso: degradado + ventanas con barra de título + texto."""
+    ramp = np.linspace(40, 90, width, dtype=np.float32)
+    screen = np.repeat(ramp[None, :, None], height, axis=0).repeat(3, axis=2).astype(np.uint8)
+    for _ in range(12):
+        w, h = int(rng.integers(width // 8, width // 2)), int(rng.integers(height // 8, height // 2))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        color = tuple(int(c) for c in rng.integers(150, 250, 3))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), color, -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + 28), (70, 70, 70), -1)
+        for line in range(1, max(2, h // 40)):
+            txt = "".join(chr(int(c)) for c in rng.integers(97, 123, 18))
+            cv2.putText(screen, txt, (x + 10, y + 28 + line * 30), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6, (20, 20, 20), 1, cv2.LINE_AA)
+    return screen
+
+def synthetic_template(rng: np.random.Generator, size: Tuple[int, int] = (140, 44)) -> np.ndarray:
+    """Botón con borde, color propio y una etiqueta."""
+    w, h = size
+    tpl = np.full((h, w, 3), (int(rng.integers(60, 200)), 120, 215), np.uint8)
+    cv2.rectangle(tpl, (1, 1), (w - 2, h - 2), (30, 30, 30), 2)
+    cv2.putText(tpl, "Aceptar", (12, h - 14), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+    return tpl
+
+def embed(screen: np.ndarray, tpl: np.ndarray, scale: float, rng: np.random.Generator,
+          noise: float = 0.0, shift: Tuple[int, int, int] = (0, 0, 0)
+          ) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Pega `tpl` escalado en una posición aleatoria, con ruido gaussiano de
+    sigma `noise` y el color desplazado `shift` (BGR); devuelve (pantalla, (x, y)).
+    """
+    scaled = image_engine._resize_template(tpl, scale).astype(np.int16)
+    if noise:
+        scaled += rng.normal(0, noise, scaled.shape).round().astype(np.int16)
+    scaled += np.array(shift, dtype=np.int16)
+    scaled = np.clip(scaled, 0, 255).astype(np.uint8)
+    h, w = scaled.shape[:2]
+    x = int(rng.integers(0, screen.shape[1] - w))
+    y = int(rng.integers(0, screen.shape[0] - h))
+    out = screen.copy()
+    out[y:y + h, x:x + w] = scaled
+    return out, (x, y)
+
+# ─────────────────────────────── medidas ───────────────────────────────
+def _confs(base: float = 0.95, floor: float = 0.30, step: float = 0.05) -> List[float]:
+    out, cur = [], base
+    while cur >= floor - 1e-6:
+        out.append(round(cur, 2))
+        cur -= step
+    return out
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms)
+    return {"mean": round(float(arr.mean()), 3), "p50": round(float(np.percentile(arr, 50)), 3),
+            "p90": round(float(np.percentile(arr, 90)), 3), "p95": round(float(np.percentile(arr, 95)), 3),
+            "max": round(float(arr.max()), 3)}
+
+def _peak_bytes(fn: Callable[[], object]) -> int:
+    """Pico de memoria Python/numpy reservada durante `fn()` (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _is_hit(found: Optional[tuple], truth: Tuple[int, int]) -> bool:
+    return (found is not None and abs(found[0] - truth[0]) <= _HIT_TOLERANCE
+            and abs(found[1] - truth[1]) <= _HIT_TOLERANCE)
+
+class _Searcher:
+    """Ejecuta una búsqueda de un caso y devuelve ((x, y) o None, intentos)."""
+
+    def __init__(self, target: str, strategy: str, tpl: np.ndarray, workdir: Path) -> None:
+        self.target, self.strategy, self.tpl, self.workdir = target, strategy, tpl, workdir
+        self.scales = image_engine._build_scales()
+        self.pyramid = {sc: image_engine._resize_template(tpl, sc) for sc in self.scales}
+        self.confs = _confs()
+        self.tpl_path = workdir / "template.png"
+        cv2.imwrite(str(self.tpl_path), tpl)
+        self.hay: Optional[np.ndarray] = None
+
+    def prepare(self, hay: np.ndarray) -> None:
+        """Deja el caso listo fuera de la medida (escribe la pantalla para el replay)."""
+        self.hay = hay
+        if self.target == "find_image":
+            cv2.imwrite(str(self.workdir / "screen1.png"), hay)
+            h, w = hay.shape[:2]
+            save_metadata(self.workdir, [{"left": 0, "top": 0, "width": w, "height": h}], [1.0])
+            image_engine.use_replay(self.workdir)
+
+    def __call__(self) -> Tuple[Optional[Tuple[int, int]], int]:
+        if self.target == "find_in_monitor":
+            found, attempts = image_engine._find_in_monitor(
+                self.hay, self.tpl, self.confs, self.scales, lambda _m: None, 0, 20,
+                self.pyramid, None, self.strategy)
+            return (found[:2] if found else None), attempts
+        attempts = []
+        def log(msg: str) -> None:
+            m = _ATTEMPT_RE.match(msg)
+            if m:
+                attempts.append(int(m.group(1)))
+        loc = image_engine.find_image(
+            self.tpl_path, base_confidence=self.confs[0], timeout=0.2, poll_every=0.2,
+            strategy=self.strategy, remember=False, parallel=False, log_fn=log)
+        return (loc[:2] if loc else None), (attempts[-1] if attempts else 0)
+
+def run(repeat: int, seed: int, resolutions: List[str], targets: List[str]) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    tpl = synthetic_template(rng)
+    results: List[dict] = []
+
+    print(f"{'target':>15} {'screen':>6} {'scale':>5} {'distort':>7} {'strategy':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'tries':>5} {'peak MB':>7} {'hits':>6}")
+    with tempfile.TemporaryDirectory(prefix="bench-ie-") as tmp:
+        for label in resolutions:
+            w, h = RESOLUTIONS[label]
+            screen = synthetic_screen(w, h, rng)
+            for tpl_scale in TEMPLATE_SCALES:
+                for distortion, (noise, shift) in DISTORTIONS.items():
+                    cases = [embed(screen, tpl, tpl_scale, rng, noise, shift) for _ in range(repeat)]
+                    for target in targets:
+                        for strategy in image_engine.STRATEGIES:
+                            search = _Searcher(target, strategy, tpl, Path(tmp))
+                            times, tries, hits = [], [], 0
+                            for hay, truth in cases:
+                                search.prepare(hay)
+                                t0 = time.perf_counter()
+                                found, attempts = search()
+                                times.append((time.perf_counter() - t0) * 1000)
+                                tries.append(attempts)
+                                hits += _is_hit(found, truth)
+                            # Memory in a separate, untimed pass (tracemalloc slows things down)
+                            search.prepare(cases[0][0])
+                            peak = _peak_bytes(search)
+                            image_engine.stop_replay()
+
+                            row = {"target": target, "resolution": label, "template_scale": tpl_scale,
+                                   "distortion": distortion, "strategy": strategy, "runs": repeat,
+                                   "latency_ms": _percentiles(times),
+                                   "attempts": {"mean": round(float(np.mean(tries)), 2),
+                                                "max": int(max(tries))},
+                                   "peak_bytes": peak, "hits": hits,
+                                   "accuracy": round(hits / repeat, 3)}
+                            results.append(row)
+                            print(f"{target:>15} {label:>6} {tpl_scale:>5.2f} {distortion:>7} "
+                                  f"{strategy:>10} {row['latency_ms']['p50']:>8.1f} "
+                                  f"{row['latency_ms']['p95']:>8.1f} {row['attempts']['mean']:>5.1f} "
+                                  f"{peak / 2**20:>7.1f} {hits:>3}/{repeat}")
+    return results
+
+# ───────────────────────────── resultados ─────────────────────────────
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def _case_key(row: dict) -> tuple:
+    return (row["target"], row["resolution"], row["template_scale"], row["distortion"], row["strategy"])
+
+def compare(baseline: dict, results: List[dict]) -> None:
+    """Imprime, por caso común, la variación de p50 / p95 / acierto frente a `baseline`."""
+    old = {_case_key(r): r for r in baseline.get("results", [])}
+    print(f"\nvs {baseline.get('commit') or 'baseline'}:")
+    for row in results:
+        prev = old.get(_case_key(row))
+        if prev is None:
+            continue
+        p50, p95 = row["latency_ms"]["p50"], row["latency_ms"]["p95"]
+        d50 = (p50 / prev["latency_ms"]["p50"] - 1) * 100 if prev["latency_ms"]["p50"] else 0.0
+        d95 = (p95 / prev["latency_ms"]["p95"] - 1) * 100 if prev["latency_ms"]["p95"] else 0.0
+        dacc = row["accuracy"] - prev["accuracy"]
+        print(f"{' '.join(str(k) for k in _case_key(row)):<48} p50 {d50:+6.1f}%  p95 {d95:+6.1f}%"
+              + (f"  accuracy {dacc:+.2f}" if dacc else ""))
+
+def _cli() -> None:
+    p = argparse.ArgumentParser(description="Benchmark image_engine strategies on synthetic screens.")
+    p.add_argument("--repeat", type=int, default=3, help="searches per case")
+    p.add_argument("--seed",   type=int, default=0,  help="RNG seed")
+    p.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    p.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    p.add_argument("--out",    default="bench_results.json", help="JSON results file")
+    p.add_argument("--compare", metavar="JSON", help="results of a previous run to compare against")
+    args = p.parse_args()
+
+    # Read the baseline first: it may be the file this run overwrites
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    results = run(args.repeat, args.seed, args.resolutions, args.targets)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "cpus": cv2.getNumberOfCPUs(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n📄 Results → {args.out}")
+    if baseline is not None:
+        compare(baseline, results)
+
+if __name__ == "__main__":
+    _cli()
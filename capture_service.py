@@ -0,0 +1,298 @@
+"""
+capture_service.py
+────────────────────────────────────────────────────────────────────────────
+Servicio opcional de captura continua para image_engine.
+
+Sin el servicio, cada ronda de búsqueda captura los monitores bajo demanda
+y paga la latencia de la captura. Con el servicio activo, un hilo en
+segundo plano captura todos los monitores a `fps` fotogramas por segundo
+en un ring buffer preasignado, mientras se ejecutan los pasos anteriores;
+las búsquedas leen siempre el fotograma más reciente.
+
+• Memoria fija: `slots` buffers por monitor, reservados al arrancar (y al
+  cambiar el layout). Si no caben en `max_bytes` se reducen los slots
+  (mínimo 2); si aun así no caben, el servicio no arranca y image_engine
+  captura bajo demanda como siempre, hasta que el layout de monitores
+  cambie (entonces lo vuelve a intentar).
+• Se detiene solo tras `idle_s` segundos sin lecturas y vuelve a arrancar
+  con la siguiente (esa primera lectura espera un fotograma).
+• El escritor nunca pisa el fotograma más reciente ni uno que se esté
+  leyendo: las lecturas copian (o convierten a gris) el fotograma, o el
+  recorte pedido, al buffer del lector.
+
+Uso
+───
+from capture_service import start_service
+
+start_service(fps=10, max_bytes=512 * 1024 * 1024)
+# … image_engine.find_image() lee ahora del servicio …
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from mss.exception import ScreenShotError
+
+import run_log
+from screen_capture import close_session, get_session, layout_generation, reuse_buffer
+
+_MIN_SLOTS = 2
+
+class _MonitorRing:
+    """Ring buffer de un monitor: `slots` frames BGR preasignados."""
+
+    def __init__(self, mon: dict, slots: int, shape: Tuple[int, int]) -> None:
+        self.mon = dict(mon)
+        h, w = shape
+        self.frames = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(slots)]
+        self.readers = [0] * slots
+        self.newest = -1
+        self.seq = 0
+        self.ts = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(f.nbytes for f in self.frames)
+
+    def free_slot(self) -> Optional[int]:
+        """Slot que el escritor puede usar (ni el más reciente ni uno en lectura)."""
+        with self.lock:
+            n = len(self.frames)
+            for k in range(1, n + 1):
+                i = (self.newest + k) % n
+                if i != self.newest and self.readers[i] == 0:
+                    return i
+            return None
+
+    def publish(self, i: int) -> None:
+        with self.lock:
+            self.newest = i
+            self.seq += 1
+            self.ts = time.time()
+
+class CaptureService:
+    """
+    Background capture of every monitor into a fixed ring buffer.
+
+    `read(rect, color)` returns the newest frame cropped to `rect` (which
+    must lie inside one monitor), or None when the service cannot serve it
+    — the caller then captures directly.
+    """
+
+    def __init__(
+        self,
+        fps: float = 10.0,
+        slots: int = 3,
+        max_bytes: int = 512 * 1024 * 1024,
+        idle_s: float = 10.0,
+    ) -> None:
+        if fps <= 0:
+            raise ValueError("fps must be > 0")
+        self.fps = fps
+        self.slots = max(_MIN_SLOTS, int(slots))
+        self.max_bytes = int(max_bytes)
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._first_frame = threading.Event()
+        self._rings: List[_MonitorRing] = []
+        self._generation = -1
+        self._last_read = 0.0
+        self._failed_generation: Optional[int] = None   # layout que no cupo en max_bytes
+        self._out = threading.local()     # buffers de lectura por hilo
+
+    # ───────────────────── ciclo de vida ─────────────────────
+    @property
+    def running(self) -> bool:
+        t = self._thread
+        return t is not None and t.is_alive()
+
+    def _ensure_running(self) -> bool:
+        with self._lock:
+            self._last_read = time.monotonic()
+            if self.running:
+                return True
+            if self._failed_generation is not None:
+                if self._failed_generation == layout_generation():
+                    return False
+                self._failed_generation = None      # monitors changed: try again
+            self._stop.clear()
+            self._first_frame.clear()
+            self._thread = threading.Thread(target=self._run, name="capture-service", daemon=True)
+            self._thread.start()
+        # First read after a (re)start waits for one frame of every monitor
+        self._first_frame.wait(timeout=max(1.0, 5.0 / self.fps))
+        return self.running
+
+    def stop(self) -> None:
+        """Detiene el hilo y libera el ring buffer."""
+        self._stop.set()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=2.0)
+        with self._lock:
+            self._rings = []
+            self._generation = -1
+
+    # ───────────────────── escritor ─────────────────────
+    def _allocate(self, monitors) -> bool:
+        """(Re)serva los rings para el layout actual respetando max_bytes."""
+        per_slot = sum(m["width"] * m["height"] * 3 for m in monitors)
+        slots = min(self.slots, self.max_bytes // per_slot if per_slot else 0)
+        if slots < _MIN_SLOTS:
+            run_log.log(f"⚠️ Capture service disabled: {len(monitors)} monitor(s) need "
+                        f"{_MIN_SLOTS * per_slot / 2**20:.0f} MB > cap "
+                        f"{self.max_bytes / 2**20:.0f} MB", run_log.WARNING)
+            return False
+        # Frames may be larger than the logical rect (Retina): size from a real grab
+        rings = []
+        for mon in monitors:
+            frame = get_session().grab(mon)
+            ring = _MonitorRing(mon, slots, frame.shape[:2])
+            if ring.nbytes * len(monitors) > self.max_bytes:
+                run_log.log("⚠️ Capture service disabled: frames exceed the memory cap",
+                            run_log.WARNING)
+                return False
+            ring.frames[0][...] = frame
+            ring.publish(0)
+            rings.append(ring)
+        with self._lock:
+            self._rings = rings
+            self._generation = layout_generation()
+        return True
+
+    def _run(self) -> None:
+        interval = 1.0 / self.fps
+        try:
+            try:
+                if not self._allocate(get_session().monitors()):
+                    self._failed_generation = layout_generation()
+                    return
+            except ScreenShotError:
+                return      # retried on the next read
+            self._first_frame.set()
+            while not self._stop.is_set():
+                t0 = time.monotonic()
+                if t0 - self._last_read > self.idle_s:
+                    break
+                monitors = get_session().monitors()
+                if layout_generation() != self._generation:
+                    try:
+                        if not self._allocate(monitors):
+                            self._failed_generation = layout_generation()
+                            return
+                    except ScreenShotError:
+                        self._stop.wait(interval)
+                        continue
+                for ring in self._rings:
+                    i = ring.free_slot()
+                    if i is None:
+                        continue        # every slot busy: skip this tick
+                    try:
+                        # BGRA → BGR straight into the ring slot, no extra copy
+                        get_session().grab(ring.mon, "bgr", out=ring.frames[i])
+                    except (ScreenShotError, ValueError):
+                        break       # layout changed; re-read on next tick
+                    ring.publish(i)
+                self._stop.wait(max(0.0, interval - (time.monotonic() - t0)))
+        finally:
+            self._first_frame.set()
+            with self._lock:
+                self._rings = []
+                self._generation = -1
+            close_session()
+
+    # ───────────────────── lectores ─────────────────────
+    def read(self, rect: dict, color: str = "bgr") -> Optional[np.ndarray]:
+        """
+        Newest frame of the monitor containing `rect`, cropped to it, as BGR
+        or gray. The result is a per-thread buffer, valid until this thread's
+        next read of the same size and colour. None if not available.
+        """
+        if not self._ensure_running():
+            return None
+        with self._lock:
+            rings = self._rings
+        for ring in rings:
+            m = ring.mon
+            if (m["left"] <= rect["left"] and m["top"] <= rect["top"]
+                    and rect["left"] + rect["width"] <= m["left"] + m["width"]
+                    and rect["top"] + rect["height"] <= m["top"] + m["height"]):
+                break
+        else:
+            return None
+
+        with ring.lock:
+            i = ring.newest
+            if i < 0:
+                return None
+            ring.readers[i] += 1
+        try:
+            frame = ring.frames[i]
+            # Logical rect → frame pixels (differs on Retina-style displays)
+            fx = frame.shape[1] / m["width"]
+            fy = frame.shape[0] / m["height"]
+            x0, y0 = int((rect["left"] - m["left"]) * fx), int((rect["top"] - m["top"]) * fy)
+            crop = frame[y0:y0 + int(rect["height"] * fy), x0:x0 + int(rect["width"] * fx)]
+            bufs = getattr(self._out, "bufs", None)
+            if bufs is None:
+                bufs = self._out.bufs = OrderedDict()
+            out = reuse_buffer(bufs, (crop.shape[:2], color),
+                               crop.shape[:2] if color == "gray" else crop.shape)
+            if color == "gray":
+                cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=out)
+            else:
+                np.copyto(out, crop)
+            return out
+        finally:
+            with ring.lock:
+                ring.readers[i] -= 1
+
+    def stats(self) -> dict:
+        """Estado para diagnóstico: running, slots, bytes reservados, fotogramas por monitor."""
+        with self._lock:
+            rings = list(self._rings)
+        return {
+            "running": self.running,
+            "fps": self.fps,
+            "monitors": len(rings),
+            "slots": len(rings[0].frames) if rings else 0,
+            "bytes": sum(r.nbytes for r in rings),
+            "max_bytes": self.max_bytes,
+            "frames": [r.seq for r in rings],
+        }
+
+# ───────────────────────── instancia del proceso ─────────────────────────
+_service: Optional[CaptureService] = None
+_service_lock = threading.Lock()
+
+def get_service() -> Optional[CaptureService]:
+    """Servicio activo, o None si la captura es bajo demanda."""
+    return _service
+
+def start_service(**kwargs) -> CaptureService:
+    """
+    Enable the process-wide capture service (see CaptureService for the
+    keyword arguments). Replaces a previously started one.
+    """
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.stop()
+        _service = CaptureService(**kwargs)
+        return _service
+
+def stop_service() -> None:
+    """Vuelve a la captura bajo demanda."""
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.stop()
+        _service = None
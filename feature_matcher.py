@@ -0,0 +1,153 @@
+"""
+feature_matcher.py
+────────────────────────────────────────────────────────────────────────────
+Backend de búsqueda por puntos clave (ORB / AKAZE) para image_engine.
+
+La escalera de escalas de `_build_scales` (0.8–1.2) no cubre pantallas al
+125 % / 150 % y cuesta una correlación completa por escala. Aquí se buscan
+puntos clave del template en la captura, se emparejan (ratio test de Lowe)
+y se verifica la geometría con una homografía RANSAC, lo que localiza el
+template a cualquier escala en una sola pasada.
+
+Los templates con poca textura (botones lisos, iconos planos) no dan
+suficientes puntos clave: `prepare()` devuelve None y image_engine vuelve
+al template matching clásico.
+
+Uso
+───
+from feature_matcher import get_backend
+
+orb = get_backend("orb")
+prepared = orb.prepare(template_bgr_or_gray)
+if prepared is not None:
+    hit = orb.match(haystack, prepared)     # (x, y, w, h, score) o None
+"""
+from __future__ import annotations
+
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FEATURE_BACKENDS = ("orb", "akaze")
+
+class PreparedTemplate(NamedTuple):
+    keypoints: tuple
+    descriptors: np.ndarray
+    width: int
+    height: int
+
+def _to_gray(img: np.ndarray) -> np.ndarray:
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+class FeatureMatcher:
+    """
+    Keypoint matcher with homography verification.
+
+    `min_keypoints`: below this the template is considered low-texture.
+    `min_inliers` / `min_inlier_ratio`: RANSAC support needed to accept a hit.
+    The returned score is the inlier ratio (0–1), not a correlation value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_keypoints: int = 12,
+        min_inliers: int = 8,
+        min_inlier_ratio: float = 0.35,
+        lowe_ratio: float = 0.75,
+        max_skew: float = 0.25,
+    ) -> None:
+        if name not in FEATURE_BACKENDS:
+            raise ValueError(f"Unknown feature backend {name!r}; expected one of {FEATURE_BACKENDS}")
+        self.name = name
+        self.min_keypoints = min_keypoints
+        self.min_inliers = min_inliers
+        self.min_inlier_ratio = min_inlier_ratio
+        self.lowe_ratio = lowe_ratio
+        self.max_skew = max_skew
+        # Both ORB and AKAZE (MLDB) produce binary descriptors
+        self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+    def _detector(self, for_haystack: bool):
+        if self.name == "akaze":
+            return cv2.AKAZE_create(threshold=0.0003)
+        # A full screen needs many more ORB features than a small template
+        return cv2.ORB_create(nfeatures=20000 if for_haystack else 1500,
+                              fastThreshold=10, edgeThreshold=15, patchSize=15)
+
+    def prepare(self, template: np.ndarray) -> Optional[PreparedTemplate]:
+        """Keypoints + descriptores del template, o None si tiene poca textura."""
+        gray = _to_gray(template)
+        kps, desc = self._detector(False).detectAndCompute(gray, None)
+        if desc is None or len(kps) < self.min_keypoints:
+            return None
+        h, w = gray.shape[:2]
+        return PreparedTemplate(tuple(kps), desc, w, h)
+
+    def match(
+        self, haystack: np.ndarray, prepared: PreparedTemplate
+    ) -> Optional[Tuple[int, int, int, int, float]]:
+        """
+        Locate the prepared template in `haystack`. Returns the bounding box
+        of the projected template as (x, y, w, h, inlier_ratio), or None.
+        """
+        gray = _to_gray(haystack)
+        kps, desc = self._detector(True).detectAndCompute(gray, None)
+        if desc is None or len(kps) < self.min_inliers:
+            return None
+
+        pairs = self._matcher.knnMatch(prepared.descriptors, desc, k=2)
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < self.lowe_ratio * p[1].distance]
+        if len(good) < self.min_inliers:
+            return None
+
+        src = np.float32([prepared.keypoints[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+        dst = np.float32([kps[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+        H, mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+        if H is None:
+            return None
+        inliers = int(mask.sum())
+        ratio = inliers / len(good)
+        if inliers < self.min_inliers or ratio < self.min_inlier_ratio:
+            return None
+        if not self._plausible(H):
+            return None
+
+        w, h = prepared.width, prepared.height
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        quad = cv2.perspectiveTransform(corners, H).reshape(-1, 2)
+        x0, y0 = np.floor(quad.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(quad.max(axis=0)).astype(int)
+        hay_h, hay_w = gray.shape[:2]
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(hay_w, x1), min(hay_h, y1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return int(x0), int(y0), int(x1 - x0), int(y1 - y0), ratio
+
+    def _plausible(self, H: np.ndarray) -> bool:
+        """
+        UI elements are only scaled/translated on screen: reject homographies
+        with real perspective, mirroring, strong shear or absurd scale.
+        """
+        if abs(H[2, 0]) > 1e-3 or abs(H[2, 1]) > 1e-3:
+            return False
+        a = H[:2, :2] / H[2, 2]
+        if np.linalg.det(a) <= 0:
+            return False
+        sx, sy = np.linalg.norm(a[:, 0]), np.linalg.norm(a[:, 1])
+        if not (0.2 <= sx <= 5 and 0.2 <= sy <= 5):
+            return False
+        if abs(sx - sy) / max(sx, sy) > self.max_skew:
+            return False
+        return True
+
+_backends: Dict[str, FeatureMatcher] = {}
+
+def get_backend(name: str) -> FeatureMatcher:
+    """Instancia compartida del backend `name` ("orb" o "akaze")."""
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = FeatureMatcher(name)
+    return backend
@@ -0,0 +1,345 @@
+"""
+frame_server.py
+────────────────────────────────────────────────────────────────────────────
+Servidor local de fotogramas en memoria compartida.
+
+Cuando el CLI de image_engine y el runner (o varios procesos de matching)
+corren a la vez, cada uno captura la pantalla por su cuenta. Aquí un único
+proceso captura los monitores y los publica en bloques de
+`multiprocessing.shared_memory`; los clientes se adjuntan y leen los
+fotogramas sin copiarlos ni llamar a mss.
+
+Bloques
+───────
+• Índice `<name>`: generación del layout + JSON con los monitores y el
+  nombre del bloque de cada uno.
+• Un bloque por monitor `<name>-g<gen>-m<idx>`: cabecera int64 y `slots`
+  fotogramas BGR. El escritor rellena siempre el slot más antiguo y
+  después publica su número de secuencia, así que un fotograma leído no
+  se pisa hasta pasados (slots - 1) / fps segundos.
+• `SharedFrame.intact()` comprueba después de usar un fotograma (sin
+  copiarlo) que el escritor no lo ha reutilizado mientras tanto.
+
+Uso
+───
+$ python frame_server.py --fps 10            # proceso servidor
+
+from frame_server import FrameClient
+client = FrameClient()
+frame = client.read(mon)                     # vista zero-copy (SharedFrame)
+…
+if frame.intact(): …
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from mss.exception import ScreenShotError
+
+from screen_capture import close_session, get_session, layout_generation, reuse_buffer
+
+DEFAULT_NAME = "ie-frames"
+_INDEX_SIZE = 64 * 1024
+_MAGIC = 0x1E_F4A3E5
+# Cabecera del bloque de un monitor (int64): campos fijos + seq y ts por slot
+_H_MAGIC, _H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_LATEST_SEQ, _H_LATEST_SLOT = range(6)
+_H_FIXED = 8
+
+def _header_len(slots: int) -> int:
+    return _H_FIXED + 2 * slots
+
+# Bloques creados por un FrameServer de este proceso
+_owned: set = set()
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Adjunta un bloque existente sin que el resource_tracker lo borre al salir."""
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _owned:
+        try:
+            # Before 3.13 attaching registers the block as if we owned it
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+class SharedFrame(np.ndarray):
+    """
+    Vista de un fotograma publicado. `seq` es su número de secuencia;
+    `intact()` dice si el slot sigue conteniendo ese fotograma.
+    """
+
+    def __array_finalize__(self, obj) -> None:
+        self._slot_seq = getattr(obj, "_slot_seq", None)
+        self.seq = getattr(obj, "seq", -1)
+
+    def intact(self) -> bool:
+        return self._slot_seq is None or int(self._slot_seq[0]) == self.seq
+
+class _MonitorBlock:
+    """Bloque compartido de un monitor: cabecera + `slots` fotogramas."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool) -> None:
+        self.shm = shm
+        self.owner = owner
+        head = np.ndarray((_H_FIXED,), dtype=np.int64, buffer=shm.buf)
+        if head[_H_MAGIC] != _MAGIC and not owner:
+            raise ValueError(f"{shm.name} is not a frame block")
+        self.slots = int(head[_H_SLOTS])
+        self.height, self.width = int(head[_H_HEIGHT]), int(head[_H_WIDTH])
+        self.header = np.ndarray((_header_len(self.slots),), dtype=np.int64, buffer=shm.buf)
+        offset = self.header.nbytes
+        self.frames = np.ndarray((self.slots, self.height, self.width, 3), dtype=np.uint8,
+                                 buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, name: str, slots: int, height: int, width: int) -> "_MonitorBlock":
+        size = _header_len(slots) * 8 + slots * height * width * 3
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _owned.add(name)
+        head = np.ndarray((_header_len(slots),), dtype=np.int64, buffer=shm.buf)
+        head[:] = 0
+        head[_H_MAGIC], head[_H_SLOTS], head[_H_HEIGHT], head[_H_WIDTH] = _MAGIC, slots, height, width
+        head[_H_LATEST_SLOT] = -1
+        head[_H_FIXED:] = -1
+        return cls(shm, owner=True)
+
+    def slot_seq(self, i: int) -> np.ndarray:
+        return self.header[_H_FIXED + i:_H_FIXED + i + 1]
+
+    def close(self) -> None:
+        self.frames = self.header = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass    # a SharedFrame still points here; the mapping goes with it
+        if self.owner:
+            _owned.discard(self.shm.name)
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+# ───────────────────────────── servidor ─────────────────────────────
+class FrameServer:
+    """
+    Captures every monitor at `fps` and publishes the frames in shared
+    memory under `name`. Runs on its own thread (`start()`), or in the
+    foreground with `serve_forever()`.
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME, fps: float = 10.0, slots: int = 4) -> None:
+        if fps <= 0 or slots < 2:
+            raise ValueError("fps must be > 0 and slots >= 2")
+        self.name = name
+        self.fps = fps
+        self.slots = slots
+        self._index: Optional[shared_memory.SharedMemory] = None
+        self._blocks: List[Tuple[dict, _MonitorBlock]] = []
+        self._generation = -1
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _publish_layout(self, monitors) -> None:
+        """(Re)crea los bloques de los monitores y actualiza el índice."""
+        for _, block in self._blocks:
+            block.close()
+        self._blocks = []
+        self._generation = layout_generation()
+        entries = []
+        for idx, mon in enumerate(monitors, start=1):
+            # Frames may be larger than the logical rect (Retina): size from a real grab
+            h, w = get_session().grab(mon).shape[:2]
+            block_name = f"{self.name}-g{self._generation}-m{idx}"
+            block = _MonitorBlock.create(block_name, self.slots, h, w)
+            self._blocks.append((dict(mon), block))
+            entries.append({"left": mon["left"], "top": mon["top"], "width": mon["width"],
+                            "height": mon["height"], "block": block_name})
+        payload = json.dumps({"generation": self._generation, "fps": self.fps,
+                              "monitors": entries}).encode("utf-8")
+        if len(payload) + 16 > _INDEX_SIZE:
+            raise ValueError("too many monitors for the frame index")
+        buf = self._index.buf
+        head = np.ndarray((2,), dtype=np.int64, buffer=buf)
+        buf[16:16 + len(payload)] = payload
+        head[1] = len(payload)
+        head[0] = self._generation      # written last: clients re-read on change
+
+    def _publish_frames(self) -> None:
+        for mon, block in self._blocks:
+            head = block.header
+            slot = int((head[_H_LATEST_SLOT] + 1) % block.slots)
+            seq = int(head[_H_LATEST_SEQ]) + 1
+            block.slot_seq(slot)[0] = -1           # being written
+            get_session().grab(mon, "bgr", out=block.frames[slot])
+            block.slot_seq(slot)[0] = seq
+            head[_H_FIXED + block.slots + slot] = time.time_ns()
+            head[_H_LATEST_SLOT] = slot
+            head[_H_LATEST_SEQ] = seq
+
+    def serve_forever(self) -> None:
+        interval = 1.0 / self.fps
+        try:
+            self._index = shared_memory.SharedMemory(name=self.name, create=True, size=_INDEX_SIZE)
+        except FileExistsError:
+            raise RuntimeError(f"A frame server named {self.name!r} is already running") from None
+        _owned.add(self.name)
+        np.ndarray((2,), dtype=np.int64, buffer=self._index.buf)[:] = -1
+        try:
+            while not self._stop.is_set():
+                t0 = time.monotonic()
+                try:
+                    monitors = get_session().monitors()
+                    if layout_generation() != self._generation:
+                        self._publish_layout(monitors)
+                    self._publish_frames()
+                except (ScreenShotError, ValueError):
+                    # Layout changed under us: re-enumerate on the next tick
+                    pass
+                self._stop.wait(max(0.0, interval - (time.monotonic() - t0)))
+        finally:
+            for _, block in self._blocks:
+                block.close()
+            self._blocks = []
+            self._index.close()
+            self._index.unlink()
+            _owned.discard(self.name)
+            self._index = None
+            close_session()
+
+    def start(self) -> "FrameServer":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.serve_forever, name="frame-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+# ───────────────────────────── cliente ─────────────────────────────
+class FrameClient:
+    """
+    Attaches to a running FrameServer. Thread-safe for readers; frames are
+    zero-copy views (SharedFrame) into the server's blocks.
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME) -> None:
+        self.name = name
+        self._index = _attach(name)
+        self._index_head = np.ndarray((2,), dtype=np.int64, buffer=self._index.buf)
+        self._lock = threading.Lock()
+        self._generation = -2
+        self._monitors: List[Tuple[dict, _MonitorBlock]] = []
+        self._gray = threading.local()
+
+    def _refresh(self) -> None:
+        gen = int(self._index_head[0])
+        if gen == self._generation:
+            return
+        with self._lock:
+            if gen == self._generation:
+                return
+            for _, block in self._monitors:
+                block.close()
+            self._monitors = []
+            if gen >= 0:
+                n = int(self._index_head[1])
+                info = json.loads(bytes(self._index.buf[16:16 + n]).decode("utf-8"))
+                for m in info["monitors"]:
+                    block = _MonitorBlock(_attach(m["block"]), owner=False)
+                    self._monitors.append(({k: m[k] for k in ("left", "top", "width", "height")},
+                                           block))
+            self._generation = gen
+
+    def monitors(self) -> List[dict]:
+        self._refresh()
+        return [dict(m) for m, _ in self._monitors]
+
+    def read(self, rect: dict, color: str = "bgr", seq: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Newest frame of the monitor containing `rect`, cropped to it. BGR is
+        a zero-copy SharedFrame view; gray is converted into a per-thread
+        buffer (also tagged with `seq`). None if no published monitor
+        contains `rect` yet. With `seq`, that exact frame is read instead of
+        the newest one, or None once its slot has been reused.
+        """
+        try:
+            self._refresh()
+        except FileNotFoundError:
+            return None     # server re-publishing; next read retries
+        for m, block in self._monitors:
+            if (m["left"] <= rect["left"] and m["top"] <= rect["top"]
+                    and rect["left"] + rect["width"] <= m["left"] + m["width"]
+                    and rect["top"] + rect["height"] <= m["top"] + m["height"]):
+                break
+        else:
+            return None
+        if seq is None:
+            slot = int(block.header[_H_LATEST_SLOT])
+            if slot < 0:
+                return None
+            seq = int(block.slot_seq(slot)[0])
+            if seq < 0:
+                return None
+        else:
+            slot = next((i for i in range(block.slots) if int(block.slot_seq(i)[0]) == seq), None)
+            if slot is None:
+                return None
+
+        frame = block.frames[slot].view(SharedFrame)
+        frame._slot_seq = block.slot_seq(slot)
+        frame.seq = seq
+        # Logical rect → frame pixels (differs on Retina-style displays)
+        fx, fy = block.width / m["width"], block.height / m["height"]
+        x0, y0 = int((rect["left"] - m["left"]) * fx), int((rect["top"] - m["top"]) * fy)
+        crop = frame[y0:y0 + int(rect["height"] * fy), x0:x0 + int(rect["width"] * fx)]
+        if color != "gray":
+            return crop
+
+        bufs = getattr(self._gray, "bufs", None)
+        if bufs is None:
+            bufs = self._gray.bufs = OrderedDict()
+        out = reuse_buffer(bufs, crop.shape[:2], crop.shape[:2])
+        cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=out)
+        if not crop.intact():
+            return None
+        gray = out.view(SharedFrame)
+        gray._slot_seq, gray.seq = None, seq     # a private copy: always intact
+        return gray
+
+    def close(self) -> None:
+        with self._lock:
+            for _, block in self._monitors:
+                block.close()
+            self._monitors = []
+            self._index.close()
+
+def _cli() -> None:
+    p = argparse.ArgumentParser(
+        description="Publish all monitors in shared memory for image_engine clients.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    p.add_argument("--name",  default=DEFAULT_NAME, help="shared memory name")
+    p.add_argument("--fps",   type=float, default=10.0, help="captures per second")
+    p.add_argument("--slots", type=int, default=4, help="frames kept per monitor")
+    args = p.parse_args()
+
+    server = FrameServer(args.name, args.fps, args.slots)
+    print(f"🖥 Serving frames as {args.name!r} at {args.fps} fps (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    _cli()
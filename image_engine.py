@@ -10,6 +10,8 @@ $ python image_engine.py imgmacos.png --conf 0.80 --timeout 10
 
 • Si encuentra la imagen, imprime las coordenadas absolutas y sale con código 0.
 • Si no la encuentra (timeout o max-attempts), sale con código 1.
+• Guarda además screenN.png + monitors.json de cada monitor; con
+  `--replay <dir|vídeo>` se busca en una grabación así, sin pantalla.
 
 Uso programático
 ────────────────
@@ -23,28 +25,158 @@ from __future__ import annotations
 
 import argparse
 import sys
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Callable, Optional, Tuple, List
+from typing import Callable, Dict, Optional, Sequence, Tuple, List
 
 import cv2
-import mss
 import numpy as np
+from mss.exception import ScreenShotError
+
+from capture_service import get_service, start_service
+from feature_matcher import FEATURE_BACKENDS, FeatureMatcher, PreparedTemplate, get_backend
+from frame_server import DEFAULT_NAME as FRAME_SERVER_NAME, FrameClient
+from image_memory import get_memory, set_memory_path
+from match_pool import FrameGone, get_pool, start_pool, stop_pool
+import perf_trace
+from replay_capture import ReplaySource, save_metadata
+import run_log
+from screen_capture import get_layout, get_session
 
 # ────────────────────────── utilidades internas ──────────────────────────
 def _default_log(msg: str) -> None:
-    print(time.strftime("%Y-%m-%d | %H:%M:%S"), "|", msg)
+    run_log.log(msg)
+
+# Capture rounds of the calling thread's last find_image / find_images /
+# find_all_images (run_module's per-step trace reads it)
+_last_search = threading.local()
+
+def last_search_rounds() -> int:
+    """Rondas de captura de la última búsqueda de este hilo (0 si no hubo ninguna)."""
+    return getattr(_last_search, "rounds", 0)
+
+def _chatter(log_fn: Callable[[str], None]) -> bool:
+    """
+    Whether to log per-attempt / per-round detail: always for a caller's
+    own log_fn, only at run_log's "debug" level for the default one (so the
+    lines are not even formatted in production).
+    """
+    return log_fn is not _default_log or run_log.enabled(run_log.DEBUG)
 
 def _list_real_monitors() -> List[dict]:
     """Devuelve los descriptores MSS de monitores reales (ignora monitors[0])."""
-    with mss.mss() as sct:
-        return list(sct.monitors[1:])
+    replay = _replay
+    if replay is not None:
+        return [dict(m) for m in replay.monitors()]
+    return list(get_layout())
+
+_replay: Optional[ReplaySource] = None
+
+def use_replay(path: str | Path, fps: Optional[float] = None, loop: bool = False) -> ReplaySource:
+    """
+    Search recorded frames instead of the screen: a directory of
+    `screenN.png` (as dumped by the CLI, with its `monitors.json`), a
+    directory of such snapshots, or a video. Monitors, their UI scale and
+    the frames all come from the recording until `stop_replay()`.
+    ValueError if the recording cannot be replayed (see replay_capture).
+    """
+    global _replay
+    source = ReplaySource(path, fps=fps, loop=loop)
+    stop_replay()
+    _replay = source
+    return source
 
-def _capture_monitor(mon: dict) -> np.ndarray:
-    """Captura un monitor y devuelve un np.ndarray BGR."""
-    with mss.mss() as sct:
-        grab = sct.grab(mon)            # BGRA
-    return cv2.cvtColor(np.array(grab), cv2.COLOR_BGRA2BGR)
+def stop_replay() -> None:
+    global _replay
+    source, _replay = _replay, None
+    if source is not None:
+        source.close()
+
+_frame_client: Optional[FrameClient] = None
+
+def connect_frame_server(name: str = FRAME_SERVER_NAME) -> bool:
+    """
+    Read frames from a running frame_server (shared memory) instead of
+    capturing. Returns False, and keeps capturing locally, if none is
+    running under `name`.
+    """
+    global _frame_client
+    try:
+        client = FrameClient(name)
+    except FileNotFoundError:
+        return False
+    disconnect_frame_server()
+    _frame_client = client
+    return True
+
+def disconnect_frame_server() -> None:
+    global _frame_client
+    client, _frame_client = _frame_client, None
+    if client is not None:
+        client.close()
+
+def _frame_intact(frame: np.ndarray) -> bool:
+    """False si `frame` es una vista del frame_server que se sobrescribió mientras se usaba."""
+    intact = getattr(frame, "intact", None)
+    return intact is None or intact()
+
+def _capture_monitor(mon: dict, color: str = "bgr", reuse: bool = False) -> np.ndarray:
+    """
+    Captura un monitor con la sesión MSS del hilo, en BGR o en gris (`color`).
+    Con `reuse=True` el frame es un buffer de la sesión, válido hasta la
+    siguiente captura de ese monitor en este hilo.
+
+    When connected to a frame server, BGR frames are zero-copy views into
+    its shared memory (check `_frame_intact` after matching). While the
+    capture service is running the newest frame from its ring buffer is
+    used instead (no capture latency); see capture_service. During a
+    replay (`use_replay`) frames come from the recording.
+    """
+    with perf_trace.span("capture", "capture", {"color": color}):
+        replay = _replay
+        if replay is not None:
+            frame = replay.read(mon, color)
+            if frame is None:
+                raise ScreenShotError(f"No recorded monitor contains {mon}")
+            return frame if reuse else frame.copy()
+        client = _frame_client
+        if client is not None:
+            frame = client.read(mon, color)
+            if frame is not None:
+                return frame if reuse else np.array(frame)
+        service = get_service()
+        if service is not None:
+            frame = service.read(mon, color)
+            if frame is not None:
+                return frame if reuse else frame.copy()
+        return get_session().grab(mon, color, reuse)
+
+def _monitor_scale(mon: dict) -> float:
+    """Escala UI del monitor (ver screen_capture.CaptureSession.monitor_scale)."""
+    replay = _replay
+    if replay is not None:
+        return replay.monitor_scale(mon)
+    return get_session().monitor_scale(mon)
+
+def _frame_signature(frame: np.ndarray, stride: int = 4) -> int:
+    """Firma barata de un frame: CRC32 de una rejilla submuestreada (1 de cada `stride` px)."""
+    return zlib.crc32(np.ascontiguousarray(frame[::stride, ::stride]))
+
+def _build_confs(base_confidence: float, min_confidence: float, confidence_step: float) -> List[float]:
+    """Escalera de confianza: base_confidence, base - step, … ≥ min_confidence (descendente)."""
+    confs: List[float] = []
+    cur_conf = base_confidence
+    while cur_conf >= min_confidence - 1e-6:
+        confs.append(round(cur_conf, 2))
+        cur_conf -= confidence_step
+
+    # Ensure unique and sorted (descending)
+    return sorted(set(confs), reverse=True)
 
 def _build_scales(min_scale=0.8, max_scale=1.2, step=0.1) -> List[float]:
     """Genera la lista de escalas: [1.0, 0.9, 1.1, 0.8, 1.2, …]."""
@@ -63,7 +195,328 @@ def _build_scales(min_scale=0.8, max_scale=1.2, step=0.1) -> List[float]:
         k += 1
     return scales
 
+# ────────────────────────── caché de templates ──────────────────────────
+class TemplateCache:
+    """
+    Process-wide LRU cache of decoded templates and their scaled variants.
+
+    Entries are keyed by (path, mtime_ns, size, color), so editing or
+    replacing the .png on disk is picked up on the next lookup. The cache evicts the least
+    recently used template once `max_entries` or `max_bytes` is exceeded.
+    Keypoints prepared by feature_matcher live under the same key and are
+    dropped together with their template. All methods are thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[np.ndarray, Dict[float, np.ndarray]]]" = OrderedDict()
+        # key → {backend name: PreparedTemplate or None (poca textura)}
+        self._features: Dict[tuple, Dict[str, Optional[PreparedTemplate]]] = {}
+        self._nbytes = 0
+
+    @staticmethod
+    def _entry_size(template: np.ndarray, pyramid: Dict[float, np.ndarray]) -> int:
+        return template.nbytes + sum(v.nbytes for sc, v in pyramid.items() if sc != 1.0)
+
+    @staticmethod
+    def _features_size(features: Dict[str, Optional[PreparedTemplate]]) -> int:
+        return sum(p.descriptors.nbytes for p in features.values() if p is not None)
+
+    @staticmethod
+    def _key(template_path: Path, color: str) -> tuple:
+        st = template_path.stat()
+        return (str(template_path.resolve()), st.st_mtime_ns, st.st_size, color)
+
+    def _drop(self, key: tuple) -> None:
+        self._nbytes -= self._entry_size(*self._entries.pop(key))
+        self._nbytes -= self._features_size(self._features.pop(key, {}))
+
+    def get(
+        self, template_path: Path, scales: List[float], color: str = "bgr"
+    ) -> Optional[Tuple[np.ndarray, Dict[float, np.ndarray]]]:
+        """
+        Return (template, {scale: scaled_template}) for `template_path`, with
+        every scale in `scales` present, decoded as `color` ("bgr" or
+        "gray"). Returns None if OpenCV cannot read the file.
+        """
+        key = self._key(template_path, color)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                template, pyramid = entry
+                missing = [sc for sc in scales if sc not in pyramid]
+                if missing:
+                    self._nbytes -= self._entry_size(template, pyramid)
+                    for sc in missing:
+                        pyramid[sc] = _resize_template(template, sc)
+                    self._nbytes += self._entry_size(template, pyramid)
+                    self._evict()
+                return template, pyramid
+            self.misses += 1
+
+        # Decode outside the lock; a concurrent miss on the same key is harmless
+        if color == "gray":
+            # Same BGR→gray weights as the capture path (cv2.cvtColor)
+            bgr = self.get(template_path, [], "bgr")
+            template = None if bgr is None else cv2.cvtColor(bgr[0], cv2.COLOR_BGR2GRAY)
+        else:
+            template = cv2.imread(str(template_path))
+        if template is None:
+            return None
+        pyramid = {sc: _resize_template(template, sc) for sc in scales}
+
+        with self._lock:
+            # Drop stale versions of the same file (old mtime/size)
+            for old in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+                self._drop(old)
+            if key not in self._entries:
+                self._entries[key] = (template, pyramid)
+                self._nbytes += self._entry_size(template, pyramid)
+                self._evict()
+        return template, pyramid
+
+    def features(
+        self, template_path: Path, color: str, template: np.ndarray, backend: FeatureMatcher
+    ) -> Optional[PreparedTemplate]:
+        """
+        `backend.prepare(template)` for the cached entry of (`template_path`,
+        `color`), computed once per file version. The result — None included,
+        for low-texture templates — is evicted together with the template.
+        """
+        key = self._key(template_path, color)
+        with self._lock:
+            cached = self._features.get(key, {})
+            if backend.name in cached:
+                return cached[backend.name]
+
+        # Detect outside the lock, like the decode in get()
+        prepared = backend.prepare(template)
+
+        with self._lock:
+            if key in self._entries:
+                cached = self._features.setdefault(key, {})
+                if backend.name not in cached:
+                    cached[backend.name] = prepared
+                    self._nbytes += self._features_size({backend.name: prepared})
+                    self._evict()
+        return prepared
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._nbytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._features.clear()
+            self._nbytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Counters for tuning: hits, misses, entries and bytes in use."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+def _resize_template(template: np.ndarray, sc: float) -> np.ndarray:
+    """Escala el template con INTER_AREA (1.0 devuelve el original)."""
+    if sc == 1.0:
+        return template
+    th, tw = template.shape[:2]
+    with perf_trace.span("resize", "match", {"scale": sc}):
+        return cv2.resize(template, (int(tw * sc), int(th * sc)), interpolation=cv2.INTER_AREA)
+
+TEMPLATE_CACHE = TemplateCache()
+
+def template_cache_stats() -> dict:
+    """Hit/miss counters of the process-wide template cache."""
+    return TEMPLATE_CACHE.stats()
+
+# ────────────────────────── modo de color ──────────────────────────
+COLOR_MODES = ("auto", "gray", "bgr")
+
+_SATURATED_LEVEL = 60       # S (HSV, 0-255) a partir del cual un píxel "tiene color"
+_SATURATED_SHARE = 0.20     # fracción de píxeles saturados para considerar el template en color
+
+def _needs_color(template: np.ndarray) -> bool:
+    """
+    True if the template is noticeably chromatic (≥20 % saturated pixels).
+    Such templates may only differ from a neighbour by hue (e.g. enabled vs
+    disabled button), so they are matched in BGR; the rest go to gray.
+    """
+    sat = cv2.cvtColor(template, cv2.COLOR_BGR2HSV)[..., 1]
+    return float(np.count_nonzero(sat > _SATURATED_LEVEL)) / sat.size >= _SATURATED_SHARE
+
+def _resolve_color_mode(template_path: Path, color_mode: str) -> Optional[str]:
+    """Convierte "auto" en "gray" o "bgr" según el template (None si no se puede leer)."""
+    if color_mode != "auto":
+        return color_mode
+    cached = TEMPLATE_CACHE.get(template_path, [], "bgr")
+    if cached is None:
+        return None
+    return "bgr" if _needs_color(cached[0]) else "gray"
+
 # ────────────────────────── búsqueda en un solo monitor ──────────────────────────
+# ────────────────────────── coarse-to-fine ──────────────────────────
+STRATEGIES = ("exhaustive", "pyramid")
+
+_COARSE_FACTORS = (0.25, 0.5)   # factores de reducción probados, del más barato al más fino
+_COARSE_MIN_SIDE = 12           # lado mínimo (px) del template reducido
+_COARSE_CANDIDATES = 3          # picos del mapa reducido que se refinan a resolución completa
+_COARSE_AMBIGUITY = 0.03        # si el pico K+1 está a menos de esto del mejor → ambiguo
+
+def _coarse_factor(templ_w: int, templ_h: int) -> Optional[float]:
+    """Factor de reducción más agresivo que deja el template utilizable (o None)."""
+    for f in _COARSE_FACTORS:
+        if min(templ_w, templ_h) * f >= _COARSE_MIN_SIDE:
+            return f
+    return None
+
+def _top_peaks(res: np.ndarray, k: int, radius_w: int, radius_h: int) -> List[Tuple[float, Tuple[int,int]]]:
+    """Los `k` máximos de `res`, suprimiendo una ventana alrededor de cada uno."""
+    res = res.copy()
+    peaks: List[Tuple[float, Tuple[int,int]]] = []
+    for _ in range(k):
+        _, val, _, (x, y) = cv2.minMaxLoc(res)
+        if val == -np.inf:
+            break
+        peaks.append((val, (x, y)))
+        res[max(0, y - radius_h):y + radius_h + 1, max(0, x - radius_w):x + radius_w + 1] = -np.inf
+    return peaks
+
+def _match_coarse_to_fine(
+    haystack: np.ndarray,
+    resized: np.ndarray,
+    coarse_hays: Dict[float, np.ndarray],
+) -> Optional[Tuple[float, Tuple[int,int]]]:
+    """
+    Match a downsampled haystack/template first, then re-score only a small
+    full-resolution neighbourhood around the best coarse candidates.
+    Returns (max_val, max_loc) like minMaxLoc, or None when the template is
+    too small to downsample or the coarse pass is ambiguous (the caller then
+    falls back to the exhaustive search). `coarse_hays` caches the reduced
+    haystack per factor so all scales of one capture share it.
+    """
+    templ_h, templ_w = resized.shape[:2]
+    hay_h, hay_w = haystack.shape[:2]
+    f = _coarse_factor(templ_w, templ_h)
+    if f is None:
+        return None
+
+    small_hay = coarse_hays.get(f)
+    if small_hay is None:
+        with perf_trace.span("resize", "match", {"haystack": f}):
+            small_hay = cv2.resize(haystack, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+        coarse_hays[f] = small_hay
+    with perf_trace.span("resize", "match", {"coarse": f}):
+        small_tpl = cv2.resize(resized, (max(1, round(templ_w * f)), max(1, round(templ_h * f))),
+                               interpolation=cv2.INTER_AREA)
+    if small_tpl.shape[0] > small_hay.shape[0] or small_tpl.shape[1] > small_hay.shape[1]:
+        return None
+
+    with perf_trace.span("matchTemplate", "match", {"pass": "coarse"}):
+        res = cv2.matchTemplate(small_hay, small_tpl, cv2.TM_CCOEFF_NORMED)
+    sh, sw = small_tpl.shape[:2]
+    peaks = _top_peaks(res, _COARSE_CANDIDATES + 1, sw // 2, sh // 2)
+    if not peaks:
+        return None
+    # Too many look-alikes: refining only K of them could miss the real one
+    if len(peaks) > _COARSE_CANDIDATES and peaks[0][0] - peaks[-1][0] < _COARSE_AMBIGUITY:
+        return None
+
+    pad = int(np.ceil(1 / f)) + 2
+    best: Optional[Tuple[float, Tuple[int,int]]] = None
+    for _, (cx, cy) in peaks[:_COARSE_CANDIDATES]:
+        x0 = max(0, int(cx / f) - pad)
+        y0 = max(0, int(cy / f) - pad)
+        x1 = min(hay_w, int(cx / f) + templ_w + pad)
+        y1 = min(hay_h, int(cy / f) + templ_h + pad)
+        roi = haystack[y0:y1, x0:x1]
+        if roi.shape[0] < templ_h or roi.shape[1] < templ_w:
+            continue
+        with perf_trace.span("matchTemplate", "match", {"pass": "fine"}):
+            fine = cv2.matchTemplate(roi, resized, cv2.TM_CCOEFF_NORMED)
+        _, val, _, (fx, fy) = cv2.minMaxLoc(fine)
+        if best is None or val > best[0]:
+            best = (val, (x0 + fx, y0 + fy))
+    return best
+
+def _score_scales(
+    haystack: np.ndarray,
+    template: np.ndarray,
+    scales: List[float],
+    log_fn: Callable[[str], None],
+    stop_at: float,
+    pyramid: Optional[Dict[float, np.ndarray]] = None,
+    cancel: Optional[threading.Event] = None,
+    strategy: str = "exhaustive",
+    coarse_hays: Optional[Dict[float, np.ndarray]] = None,
+) -> List[Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]]:
+    """
+    Correlate every scale of `template` against `haystack` exactly once.
+    Returns one entry per scale: (max_val, max_loc, (w, h)), or None when the
+    scaled template does not fit in the haystack. Stops early as soon as a
+    scale reaches `stop_at` (nothing later can beat it). Scaled templates
+    are taken from `pyramid` when available. If `cancel` gets set, the
+    remaining scales are skipped. `strategy="pyramid"` scores each scale
+    coarse-to-fine and only falls back to the full correlation when the
+    coarse pass cannot decide; pass the same `coarse_hays` dict for every
+    template matched against one haystack to downsample it only once.
+    """
+    hay_h, hay_w = haystack.shape[:2]
+    if coarse_hays is None:
+        coarse_hays = {}
+    scores: List[Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]] = []
+
+    for sc in scales:
+        if cancel is not None and cancel.is_set():
+            break
+
+        # Resize the template according to the current scale
+        resized = pyramid.get(sc) if pyramid else None
+        if resized is None:
+            resized = _resize_template(template, sc)
+
+        # Check that the resized template fits within the haystack image
+        templ_h, templ_w = resized.shape[:2]
+        if templ_h > hay_h or templ_w > hay_w:
+            log_fn(f"⚠️ Skipping scale={sc:.2f} because template ({templ_h}×{templ_w}) > haystack ({hay_h}×{hay_w})")
+            scores.append(None)
+            continue
+
+        coarse = (_match_coarse_to_fine(haystack, resized, coarse_hays)
+                  if strategy == "pyramid" else None)
+        if coarse is not None:
+            max_val, max_loc = coarse
+        else:
+            with perf_trace.span("matchTemplate", "match", {"scale": sc}):
+                res = cv2.matchTemplate(haystack, resized, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if _chatter(log_fn):
+            log_fn(f"[scale {sc:.2f}] best score → {max_val:.3f}"
+                   + (" (coarse-to-fine)" if coarse is not None else ""))
+        scores.append((max_val, max_loc, (templ_w, templ_h)))
+        if max_val >= stop_at:
+            break
+
+    return scores
+
 def _find_in_monitor(
     haystack: np.ndarray,
     template: np.ndarray,
@@ -71,44 +524,489 @@ def _find_in_monitor(
     scales: List[float],
     log_fn: Callable[[str], None],
     attempts_start: int,
-    max_attempts: int
-) -> Tuple[Optional[Tuple[int,int,int,int]], int]:
+    max_attempts: int,
+    pyramid: Optional[Dict[float, np.ndarray]] = None,
+    cancel: Optional[threading.Event] = None,
+    strategy: str = "exhaustive",
+    coarse_hays: Optional[Dict[float, np.ndarray]] = None,
+    order: Optional[List[Tuple[float, float]]] = None,
+    deadline: Optional[float] = None,
+    scores: Optional[List[Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]]] = None,
+    free_scales: frozenset = frozenset(),
+) -> Tuple[Optional[Tuple[int,int,int,int,float]], int]:
     """
-    Process a single monitor's capture (haystack) by iterating through
-    confidence levels and scale factors. Returns ((x, y, w, h), attempts)
-    if a match is found, or (None, attempts) otherwise.
+    Process a single monitor's capture (haystack). Each scale is correlated
+    only once; the resulting score is then checked against the confidence
+    ladder, walking the (conf, scale) pairs in the same order as before so
+    the winner and the `max_attempts` budget are unchanged.
+    With `order` (see `_plan_attempts`) the (conf, scale) pairs are walked
+    in that order instead, correlating each scale only when first needed
+    and no new scale once `deadline` has passed.
+    `scores` are the per-scale correlations already computed elsewhere
+    (the match pool, see `_pool_scores`), aligned with `scales`.
+    Attempts at `free_scales` (predicted scales added in front of the
+    ladder, see `_monitor_scale_order`) do not count against
+    `max_attempts`, so predicting a scale never costs a confidence tier.
+    Returns ((x, y, w, h, score), attempts) if a match is found, or
+    (None, attempts).
     """
     attempts = attempts_start
-    th, tw = template.shape[:2]
+    budget = max_attempts - attempts_start
+    if budget <= 0 or not confs or not scales:
+        return None, attempts + 1
+
+    if order is not None:
+        return _walk_attempts(haystack, template, order, log_fn, attempts, max_attempts,
+                              pyramid, cancel, strategy, coarse_hays, deadline,
+                              dict(zip(scales, scores)) if scores is not None else None,
+                              free_scales)
+
+    if scores is None:
+        # Only the tiers reachable within the attempt budget can ever match
+        counted = sum(sc not in free_scales for sc in scales)
+        reachable = confs[:(budget + counted - 1) // counted] if counted else confs
+        scores = _score_scales(haystack, template, scales, log_fn,
+                               stop_at=reachable[0], pyramid=pyramid, cancel=cancel,
+                               strategy=strategy, coarse_hays=coarse_hays)
 
     for conf in confs:
-        for sc in scales:
+        for si, sc in enumerate(scales):
+            if sc not in free_scales:
+                attempts += 1
+                if attempts > max_attempts:
+                    return None, attempts
+            if si >= len(scores) or scores[si] is None:
+                continue
+            max_val, (x, y), (w, h) = scores[si]
+            if max_val >= conf:
+                if _chatter(log_fn):
+                    log_fn(f"[attempt {attempts:02d}] conf≥{conf:.2f} sc={sc:.2f} → {max_val:.3f}")
+                return (x, y, w, h, max_val), attempts
+
+    return None, attempts
+
+def _walk_attempts(
+    haystack: np.ndarray,
+    template: np.ndarray,
+    order: List[Tuple[float, float]],
+    log_fn: Callable[[str], None],
+    attempts: int,
+    max_attempts: int,
+    pyramid: Optional[Dict[float, np.ndarray]],
+    cancel: Optional[threading.Event],
+    strategy: str,
+    coarse_hays: Optional[Dict[float, np.ndarray]],
+    deadline: Optional[float],
+    scored: Optional[Dict[float, Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]]] = None,
+    free_scales: frozenset = frozenset(),
+) -> Tuple[Optional[Tuple[int,int,int,int,float]], int]:
+    """
+    `_find_in_monitor` over an explicit (conf, scale) order, scoring scales
+    lazily (those not already in `scored`).
+    """
+    if coarse_hays is None:
+        coarse_hays = {}
+    scored = dict(scored or {})
+    for conf, sc in order:
+        if sc not in free_scales:
             attempts += 1
             if attempts > max_attempts:
                 return None, attempts
+        if sc not in scored:
+            if (cancel is not None and cancel.is_set()) or (
+                    deadline is not None and scored and time.time() >= deadline):
+                continue
+            # stop_at > 1: score exactly this scale
+            scored[sc] = (_score_scales(haystack, template, [sc], log_fn, 2.0, pyramid,
+                                        cancel, strategy, coarse_hays) or [None])[0]
+        if scored[sc] is None:
+            continue
+        max_val, (x, y), (w, h) = scored[sc]
+        if max_val >= conf:
+            if _chatter(log_fn):
+                log_fn(f"[attempt {attempts:02d}] conf≥{conf:.2f} sc={sc:.2f} → {max_val:.3f}")
+            return (x, y, w, h, max_val), attempts
+    return None, attempts
 
-            # Resize the template according to the current scale
-            resized = template if sc == 1.0 else cv2.resize(
-                template, (int(tw * sc), int(th * sc)), interpolation=cv2.INTER_AREA
-            )
+# ───────────────────────── orden por historial ─────────────────────────
+_PLAN_MIN_HISTORY = 1     # hits previos necesarios para reordenar los intentos
 
-            # Check that the resized template fits within the haystack image
-            hay_h, hay_w = haystack.shape[:2]
-            templ_h, templ_w = resized.shape[:2]
-            if templ_h > hay_h or templ_w > hay_w:
-                log_fn(f"⚠️ Skipping scale={sc:.2f} because template ({templ_h}×{templ_w}) > haystack ({hay_h}×{hay_w})")
-                continue
+def _plan_attempts(
+    confs: List[float],
+    scales: List[float],
+    history: List[Tuple[float, float]],
+) -> Optional[List[Tuple[float, float]]]:
+    """
+    Order the (conf, scale) pairs by how often past matches — (score,
+    scale) pairs from `image_memory` — would have passed them: P(score ≥
+    conf at that scale). For each scale only its highest conf tier that
+    every past hit there passed is kept up front, so a template that always
+    matches the same way is found on attempt 1; everything else follows in
+    the usual ladder order. None without history (keep the ladder).
+    """
+    if len(history) < _PLAN_MIN_HISTORY:
+        return None
+    total = len(history)
+    likely = []
+    for sc in scales:
+        scores = [score for score, h_sc in history if h_sc == sc]
+        if not scores:
+            continue
+        # Highest ladder tier that the worst past hit at this scale still passes
+        floor = min(scores)
+        conf = next((c for c in confs if c <= floor + 1e-6), None)
+        if conf is not None:
+            likely.append((len(scores) / total, conf, sc))
+    if not likely:
+        return None
+    likely.sort(key=lambda item: (-item[0], -item[1]))
+    head = [(conf, sc) for _, conf, sc in likely]
+    seen = set(head)
+    return head + [(c, sc) for c in confs for sc in scales if (c, sc) not in seen]
 
-            # Perform template matching only if the template fits
-            res = cv2.matchTemplate(haystack, resized, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-            log_fn(f"[attempt {attempts:02d}] conf≥{conf:.2f} sc={sc:.2f} → {max_val:.3f}")
-            if max_val >= conf:
-                x, y = max_loc
-                h, w = resized.shape[:2]
-                return (x, y, w, h), attempts
+def _monitor_attempt_orders(
+    template_path: Path,
+    real_mons: List[dict],
+    confs: List[float],
+    mon_scales: Dict[int, List[float]],
+    memory,
+) -> Dict[int, List[Tuple[float, float]]]:
+    """Attempt order per monitor index, for the monitors with usable history."""
+    orders: Dict[int, List[Tuple[float, float]]] = {}
+    if memory is None:
+        return orders
+    for idx, mon in enumerate(real_mons, start=1):
+        history = memory.history(template_path,
+                                 (mon["left"], mon["top"], mon["width"], mon["height"]))
+        order = _plan_attempts(confs, mon_scales[idx], history)
+        if order is not None:
+            orders[idx] = order
+    return orders
 
-    return None, attempts
+def _describe_order(order: List[Tuple[float, float]], n: int = 3) -> str:
+    return ", ".join(f"conf≥{c:.2f} sc={sc:.2f}" for c, sc in order[:n]) + ", …"
+
+# ────────────────────────── pool de procesos ──────────────────────────
+def _pool_scores(
+    hay: np.ndarray,
+    rect: dict,
+    strategy: str,
+    items: List[Tuple[np.ndarray, Optional[Dict[float, np.ndarray]], List[float], str]],
+    log_fn: Callable[[str], None],
+) -> Optional[List[List[Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]]]]:
+    """
+    Correlate every scale of every (template, pyramid, scales, color) item
+    on the match pool, against the frame-server frame `hay` of `rect`. Returns
+    one `_score_scales`-style list per item, or None when no pool is running,
+    `hay` does not come from the frame server, or the pool could not read
+    that frame (the caller then scores in this process).
+    """
+    pool = get_pool()
+    seq = getattr(hay, "seq", -1)
+    if pool is None or seq < 0:
+        return None
+    hay_h, hay_w = hay.shape[:2]
+    tasks: List[Tuple[np.ndarray, str]] = []
+    slots: List[Tuple[int, int]] = []
+    out: List[List[Optional[Tuple[float, Tuple[int,int], Tuple[int,int]]]]] = []
+    for i, (template, pyramid, scales, color) in enumerate(items):
+        row = []
+        for j, sc in enumerate(scales):
+            resized = pyramid.get(sc) if pyramid else None
+            if resized is None:
+                resized = _resize_template(template, sc)
+            if resized.shape[0] <= hay_h and resized.shape[1] <= hay_w:
+                tasks.append((resized, color))
+                slots.append((i, j))
+            row.append(None)
+        out.append(row)
+
+    try:
+        results = pool.score(tasks, rect, int(seq), strategy)
+    except FrameGone:
+        log_fn("↪ Match pool missed the frame (already recycled); matching in-process")
+        return None
+    except BrokenProcessPool:
+        log_fn("⚠️ Match pool worker died; matching in-process from now on")
+        stop_pool()
+        return None
+    chatter = _chatter(log_fn)
+    for (i, j), score in zip(slots, results):
+        out[i][j] = score
+        if chatter:
+            log_fn(f"[scale {items[i][2][j]:.2f}] best score → {score[0]:.3f} (pool)")
+    return out
+
+def start_match_pool(workers: Optional[int] = None, name: str = FRAME_SERVER_NAME) -> bool:
+    """
+    Spread scale / template correlations over `workers` processes that read
+    frames from the frame server `name` (see match_pool). Needs that server
+    running; connects to it if not connected yet. Returns False, and keeps
+    matching in-process, when it is not available. Start it once per run.
+    """
+    client = _frame_client
+    if (client is None or client.name != name) and not connect_frame_server(name):
+        return False
+    try:
+        start_pool(workers, name)
+    except FileNotFoundError:
+        return False
+    return True
+
+def stop_match_pool() -> None:
+    stop_pool()
+
+# ────────────────────────── búsqueda en paralelo ──────────────────────────
+_MAX_MONITOR_WORKERS = 4
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _monitor_pool() -> ThreadPoolExecutor:
+    """Pool compartido (y acotado) para capturar y buscar en varios monitores a la vez."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_MAX_MONITOR_WORKERS,
+                                       thread_name_prefix="image-engine")
+        return _pool
+
+def _scan_monitor(
+    mon_idx: int,
+    mon: dict,
+    prev_sig: Optional[int],
+    template: np.ndarray,
+    confs: List[float],
+    scales: List[float],
+    log_fn: Callable[[str], None],
+    max_attempts: int,
+    pyramid: Dict[float, np.ndarray],
+    rounds: int,
+    strategy: str = "exhaustive",
+    color: str = "bgr",
+    features: Optional[tuple] = None,
+    order: Optional[List[Tuple[float, float]]] = None,
+    deadline: Optional[float] = None,
+    free_scales: frozenset = frozenset(),
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[int, Optional[Tuple[int,int,int,int,float]]]:
+    """
+    Capture one monitor and match it, unless its frame signature equals
+    `prev_sig`. Returns (signature, (abs_x, abs_y, w, h, score) or None).
+    With `features=(backend, prepared)` the keypoint backend is used instead
+    of the confidence/scale ladder; `order` / `deadline` / `free_scales`
+    are passed on to `_find_in_monitor`. While a match pool is running the scales are
+    correlated there, in parallel, on the frame server's copy of the frame.
+    Safe to run on a worker thread: capture goes through that thread's own
+    CaptureSession.
+    """
+    left, top = mon["left"], mon["top"]
+    right, bottom = left + mon["width"], top + mon["height"]
+
+    # Capture this monitor as BGR or gray into the thread's reused buffer;
+    # nothing below keeps a reference to `hay` after returning.
+    hay = _capture_monitor(mon, color, reuse=True)
+    sig = _frame_signature(hay)
+    if sig == prev_sig or (cancel is not None and cancel.is_set()):
+        return sig, None
+
+    if _chatter(log_fn):
+        log_fn(f"🔍 Looking in monitor {mon_idx} bounds=({left},{top})..({right},{bottom})"
+               + (f" round={rounds}" if rounds > 1 else ""))
+
+    # Search within this single monitor
+    if features is not None:
+        backend, prepared = features
+        hit = backend.match(hay, prepared)
+        if hit is not None and _chatter(log_fn):
+            log_fn(f"[{backend.name}] inliers={hit[4]:.2f} sc≈{hit[2] / prepared.width:.2f}")
+        found = hit
+    else:
+        pooled = _pool_scores(hay, mon, strategy, [(template, pyramid, scales, color)], log_fn)
+        found, _ = _find_in_monitor(
+            hay, template, confs, scales, log_fn, 0, max_attempts, pyramid, cancel, strategy,
+            order=order, deadline=deadline, scores=pooled[0] if pooled else None,
+            free_scales=free_scales,
+        )
+    if found and not _frame_intact(hay):
+        # The frame server reused this slot mid-match: match again next round
+        log_fn(f"↪ Frame of monitor {mon_idx} was overwritten while matching; retrying")
+        return None, None
+    if not found:
+        return sig, None
+    x_rel, y_rel, w, h, score = found
+    return sig, (left + x_rel, top + y_rel, w, h, score)
+
+def _ordered_results(futures: List[Future], cancel: threading.Event):
+    """
+    Yield each future's result in submission order. Stops the remaining
+    work (cancel flag + Future.cancel) as soon as one of them is a hit, or
+    when the consumer stops iterating.
+    """
+    def _stop() -> None:
+        cancel.set()
+        for fut in futures:
+            fut.cancel()
+
+    try:
+        for fut in futures:
+            sig, found = fut.result()
+            if found:
+                _stop()
+            yield sig, found
+    finally:
+        _stop()
+
+# ────────────────────────── regiones (ROI) ──────────────────────────
+_ROI_MIN_PAD = 48    # px alrededor del último hit, como mínimo
+
+def _clip_rect(rect: Tuple[int,int,int,int], mon: dict) -> Optional[dict]:
+    """Intersección de un rect absoluto (x, y, w, h) con un monitor, como dict MSS (o None)."""
+    x, y, w, h = rect
+    left, top = max(x, mon["left"]), max(y, mon["top"])
+    right = min(x + w, mon["left"] + mon["width"])
+    bottom = min(y + h, mon["top"] + mon["height"])
+    if right <= left or bottom <= top:
+        return None
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+def _hint_area(
+    hint: dict, real_mons: List[dict], region: Optional[Tuple[int,int,int,int]]
+) -> Optional[Tuple[int, dict]]:
+    """
+    ROI acolchada alrededor del último hit, recortada a su monitor (y a
+    `region` si la hay). None si ese monitor ya no existe con la misma
+    geometría.
+    """
+    for idx, mon in enumerate(real_mons, start=1):
+        if [mon["left"], mon["top"], mon["width"], mon["height"]] == list(hint["monitor"]):
+            break
+    else:
+        return None
+    pad_x = max(_ROI_MIN_PAD, hint["w"])
+    pad_y = max(_ROI_MIN_PAD, hint["h"])
+    rect = _clip_rect((hint["x"] - pad_x, hint["y"] - pad_y,
+                       hint["w"] + 2 * pad_x, hint["h"] + 2 * pad_y), mon)
+    if rect is not None and region:
+        rect = _clip_rect(region, rect)
+    return None if rect is None else (idx, rect)
+
+_HINT_SCORE_MARGIN = 0.05   # bajo el score recordado, aún se acepta en la ROI
+
+def _hint_confs(confs: List[float], hint: dict) -> List[float]:
+    """
+    Confidence tiers accepted inside the last-hit ROI: the top tier, plus
+    those within `_HINT_SCORE_MARGIN` of the score the template last had on
+    that monitor. Lower tiers are left to the full scan, so a look-alike
+    near the old spot cannot beat a better match elsewhere.
+    """
+    mon_key = ",".join(str(int(v)) for v in hint["monitor"])
+    scores = [score for score, _, mk in hint.get("history", []) if mk == mon_key]
+    floor = scores[-1] - _HINT_SCORE_MARGIN if scores else confs[0]
+    return [c for i, c in enumerate(confs) if i == 0 or c >= floor - 1e-6]
+
+def _closest_scale(ratio: float, scales: List[float]) -> float:
+    return min(scales, key=lambda sc: abs(sc - ratio))
+
+# ────────────────────────── escala por monitor ──────────────────────────
+_PREDICTED_SCALE_RANGE = (0.25, 4.0)
+
+def _monitor_scale_order(
+    template_path: Path,
+    real_mons: List[dict],
+    scales: List[float],
+    memory,
+) -> Tuple[Dict[int, List[float]], List[float]]:
+    """
+    Orden de escalas por monitor: primero la aprendida para (template,
+    monitor), luego la esperada por DPI (escala UI del monitor / densidad
+    del template) y después el resto de la escalera. Sin densidad aprendida
+    se asume que el template se capturó en el primer monitor.
+    Returns ({monitor_index: scales}, [UI scale of each monitor]).
+    """
+    densities = [_monitor_scale(mon) for mon in real_mons]
+    tpl_density = ((memory.density(template_path) if memory else None)
+                   or (densities[0] if densities else 1.0))
+    order: Dict[int, List[float]] = {}
+    for idx, (mon, density) in enumerate(zip(real_mons, densities), start=1):
+        predicted = []
+        learned = memory.learned_scale(
+            template_path, (mon["left"], mon["top"], mon["width"], mon["height"])
+        ) if memory else None
+        if learned:
+            predicted.append(learned)
+        expected = round(density / tpl_density, 2)
+        if _PREDICTED_SCALE_RANGE[0] <= expected <= _PREDICTED_SCALE_RANGE[1]:
+            predicted.append(expected)
+        order[idx] = list(dict.fromkeys(predicted + scales))
+    return order, densities
+
+def _scan_areas(
+    areas: List[Tuple[int, dict]],
+    last_sig: Dict[Tuple[int,int,int,int], int],
+    rounds: int,
+    parallel: bool,
+    strategy: str,
+    color: str,
+    scan_args: tuple,
+    area_scales: Optional[Dict[int, List[float]]] = None,
+    area_orders: Optional[Dict[int, List[Tuple[float, float]]]] = None,
+    deadline: Optional[float] = None,
+    ladder: Optional[List[float]] = None,
+) -> Optional[Tuple[int, Tuple[int,int,int,int,float]]]:
+    """
+    Capture + match each (monitor_index, rect) area, in parallel when asked.
+    `area_scales` / `area_orders` override the scale order / the (conf,
+    scale) attempt order per monitor index. Scales not in `ladder` (by
+    default the scan_args scales) are predictions and cost no attempts.
+    Updates `last_sig` and returns (monitor_index, (abs_x, abs_y, w, h,
+    score)) for the first area in order that matched, or None.
+    """
+    template, confs, scales, log_fn, max_attempts, pyramid, features = scan_args
+    area_scales = area_scales or {}
+    area_orders = area_orders or {}
+    bounds = [(r["left"], r["top"], r["left"] + r["width"], r["top"] + r["height"])
+              for _, r in areas]
+    ladder = set(ladder if ladder is not None else scales)
+    jobs = []
+    for i, (idx, rect) in enumerate(areas):
+        job_scales = area_scales.get(idx, scales)
+        jobs.append((idx, rect, last_sig.get(bounds[i]), template, confs, job_scales,
+                     log_fn, max_attempts, pyramid, rounds, strategy, color, features,
+                     area_orders.get(idx), deadline, frozenset(job_scales) - ladder))
+
+    if parallel and len(jobs) > 1:
+        # Capture + match every area at once; results are consumed in
+        # order so the winner is the same as in a serial scan.
+        cancel = threading.Event()
+        futures = [_monitor_pool().submit(_scan_monitor, *job, cancel) for job in jobs]
+        results = _ordered_results(futures, cancel)
+    else:
+        results = (_scan_monitor(*job) for job in jobs)
+
+    for i, (sig, found) in enumerate(results):
+        last_sig[bounds[i]] = sig
+        if found:
+            return areas[i][0], found
+    return None
+
+# ────────────────────────── backends de matching ──────────────────────────
+# "template" = escalera confianza × escala (matchTemplate); el resto son
+# backends de puntos clave de feature_matcher (invariantes a la escala).
+MATCHERS = ("template",) + FEATURE_BACKENDS
+
+def _prepare_features(
+    matcher: str, template_path: Path, color: str, template: np.ndarray,
+    log_fn: Callable[[str], None],
+) -> Optional[tuple]:
+    """(backend, prepared) for a keypoint matcher, or None → template matching."""
+    if matcher == "template":
+        return None
+    backend = get_backend(matcher)
+    prepared = TEMPLATE_CACHE.features(template_path, color, template, backend)
+    if prepared is None:
+        log_fn(f"↪ Template has too little texture for {matcher}; using template matching")
+        return None
+    return backend, prepared
 
 # ───────────────────────────── find_image() ──────────────────────────────
 def find_image(
@@ -123,6 +1021,12 @@ def find_image(
     min_scale: float = 0.80,
     max_scale: float = 1.20,
     scale_step: float = 0.10,
+    parallel: bool = True,
+    strategy: str = "exhaustive",
+    color_mode: str = "bgr",
+    region: Optional[Tuple[int,int,int,int]] = None,
+    remember: bool = True,
+    matcher: str = "template",
     log_fn: Callable[[str], None] = _default_log,
 ) -> Optional[Tuple[int,int,int,int,int]]:
     """
@@ -133,68 +1037,642 @@ def find_image(
       at that value and decrement by `confidence_step` down to `min_confidence`.
     - If no confidence is provided (uses default 1.0), start at 1.0 and
       step down by `confidence_step` down to `min_confidence`.
+    - Monitors are re-captured every `poll_every` seconds until a match or
+      until `timeout` expires (`None` = wait forever). A monitor whose frame
+      has not changed since the previous round is not matched again, so
+      waiting on a static screen costs only the capture.
+    - With `parallel=True` all monitors are captured and matched at the same
+      time on a small shared thread pool; the result is identical to the
+      serial scan (lower monitor index wins).
+    - `strategy="pyramid"` matches a downsampled capture first and refines
+      only around the best candidates at full resolution, falling back to
+      the exhaustive correlation when the coarse pass is ambiguous.
+    - `color_mode` selects what is correlated: "bgr" (3 channels), "gray"
+      (1 channel, ~3× cheaper) or "auto" (gray unless the template is
+      clearly coloured). Captures are converted straight from BGRA.
+    - `region=(x, y, w, h)` (absolute coordinates) limits the search to
+      that rectangle; only the part that falls on each monitor is captured.
+    - With `remember=True` the last hit of each template is kept in the
+      process-wide `image_memory` (persisted next to run.json by the
+      runner). Each round first tries a padded ROI around that spot at the
+      remembered scale, then falls back to the full monitors. In the ROI
+      only the top confidence tier, or those within `_HINT_SCORE_MARGIN`
+      of the remembered score, count as a hit: anything weaker is left to
+      the full scan, so a look-alike near the old spot cannot beat a
+      better match elsewhere.
+    - `matcher="orb"` / `"akaze"` locates the template by keypoints plus a
+      RANSAC homography, at any scale in one pass (e.g. 125 %/150 % DPI),
+      instead of walking the confidence × scale ladder; `base_confidence`,
+      `max_attempts` and the scale range are then unused. Templates with
+      too few keypoints (flat, low-texture) fall back to "template".
+    - On each monitor the predicted scales are tried before the ladder:
+      the one learned for this (template, monitor) in `image_memory`, then
+      the one expected from the monitor's UI scale (Retina / Windows DPI)
+      relative to the density the template was captured at. Predicted
+      scales that are not on the ladder do not count against
+      `max_attempts`. A keypoint hit is remembered at the nearest ladder
+      scale.
+    - Once a template has matched before, the (conf, scale) attempts are
+      ordered by how likely they are to succeed given its past match
+      scores (logged as "🧭 … attempt order"), so a template that always
+      matches the same way needs one attempt; scales are correlated only
+      when an attempt needs them, and no new scale once `timeout` is up.
     """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color_mode {color_mode!r}; expected one of {COLOR_MODES}")
+    if matcher not in MATCHERS:
+        raise ValueError(f"Unknown matcher {matcher!r}; expected one of {MATCHERS}")
+
+    _last_search.rounds = 0
     template_path = Path(template_path)
     if not template_path.exists():
         log_fn(f"❌ Template not found: {template_path}")
         return None
 
-    template = cv2.imread(str(template_path))
-    if template is None:
+    # Build scale list [1.0, 0.9, 1.1, 0.8, 1.2, …]
+    scales = _build_scales(min_scale, max_scale, scale_step)
+
+    # Decoded template + scaled variants come from the process-wide cache
+    color = _resolve_color_mode(template_path, color_mode)
+    cached = None if color is None else TEMPLATE_CACHE.get(template_path, scales, color)
+    if cached is None:
         log_fn(f"❌ OpenCV failed to read {template_path}")
         return None
+    template, pyramid = cached
 
-    # Build confidence ladder starting at base_confidence, decrementing by confidence_step
-    confs: List[float] = []
-    cur_conf = base_confidence
-    while cur_conf >= min_confidence - 1e-6:
-        confs.append(round(cur_conf, 2))
-        cur_conf -= confidence_step
+    confs = _build_confs(base_confidence, min_confidence, confidence_step)
 
-    # Ensure unique and sorted (descending)
-    confs = sorted(set(confs), reverse=True)
+    # Keypoints work on gray captures, whatever colour mode was asked for
+    features = _prepare_features(matcher, template_path, color, template, log_fn)
+    if features is not None:
+        color = "gray"
 
-    # Build scale list [1.0, 0.9, 1.1, 0.8, 1.2, …]
-    scales = _build_scales(min_scale, max_scale, scale_step)
+    memory = get_memory() if remember else None
+    hint = memory.last_hit(template_path) if memory else None
 
     real_mons = _list_real_monitors()
     log_fn(f"🔍 Starting search | base_conf={base_confidence:.2f} "
-           f"timeout={'∞' if timeout is None else timeout}s monitors={len(real_mons)}")
+           f"timeout={'∞' if timeout is None else timeout}s monitors={len(real_mons)} "
+           f"color={color}" + (" (auto)" if color_mode == "auto" else "")
+           + (f" matcher={matcher}" if features is not None else "")
+           + (f" region={tuple(region)}" if region else "")
+           + (f" last_hit=({hint['x']},{hint['y']})" if hint else ""))
 
     t0 = time.time()
+    deadline = None if timeout is None else t0 + timeout
+    last_sig: Dict[Tuple[int,int,int,int], int] = {}   # bounds → firma del último frame
+    rounds = 0
+    logged_order: Dict[int, List[float]] = {}
+    logged_attempts: Dict[int, List[Tuple[float, float]]] = {}
 
-    for mon_idx, mon in enumerate(real_mons, start=1):
-        attempts = 0
-
-        # Check overall timeout before processing this monitor
-        if timeout is not None and (time.time() - t0) >= timeout:
-            log_fn("⏱ Timeout reached before scanning all monitors.")
+    while True:
+        rounds += 1
+        # Check overall timeout before starting a capture round
+        if deadline is not None and time.time() >= deadline:
+            log_fn(f"⏱ Timeout reached after {rounds - 1} capture round(s).")
             return None
+        _last_search.rounds = rounds
 
-        left, top = mon["left"], mon["top"]
-        right, bottom = left + mon["width"], top + mon["height"]
-        log_fn(f"🔍 Looking in monitor {mon_idx} bounds=({left},{top})..({right},{bottom})")
+        # Predicted scales first on each monitor (cheap: cached per layout)
+        mon_scales, densities = _monitor_scale_order(template_path, real_mons, scales, memory)
+        for idx, order in mon_scales.items():
+            if order != scales and logged_order.get(idx) != order:
+                log_fn(f"📐 Monitor {idx} (UI scale {densities[idx - 1]:.2f}): scale order "
+                       + ", ".join(f"{sc:.2f}" for sc in order[:3]) + ", …")
+        logged_order = mon_scales
+        extra = [sc for order in mon_scales.values() for sc in order if sc not in pyramid]
+        if extra and features is None:
+            pyramid = TEMPLATE_CACHE.get(template_path, scales + extra, color)[1]
+        scan_args = (template, confs, scales, log_fn, max_attempts, pyramid, features)
 
-        hay = _capture_monitor(mon)  # Capture BGR image of this monitor
+        # Most likely (conf, scale) attempts first, from past matches
+        mon_orders = ({} if features is not None else
+                      _monitor_attempt_orders(template_path, real_mons, confs, mon_scales, memory))
+        for idx, order in mon_orders.items():
+            if logged_attempts.get(idx) != order:
+                log_fn(f"🧭 Monitor {idx} attempt order (from past matches): {_describe_order(order)}")
+        logged_attempts = mon_orders
 
-        # Search within this single monitor
-        found, attempts = _find_in_monitor(
-            hay, template, confs, scales, log_fn, 0, max_attempts
-        )
-        if found:
-            x_rel, y_rel, w, h = found
-            abs_x = left + x_rel
-            abs_y = top + y_rel
-            log_fn(f"✅ FOUND in monitor {mon_idx} at absolute ({abs_x},{abs_y}) "
-                   f"size=({w}×{h})")
-            return abs_x, abs_y, w, h, mon_idx
+        # Areas to scan: whole monitors, or their intersection with `region`
+        areas = [(idx, _clip_rect(region, mon) if region else dict(mon))
+                 for idx, mon in enumerate(real_mons, start=1)]
+        areas = [(idx, rect) for idx, rect in areas if rect is not None]
+
+        try:
+            # 1) Padded ROI around the last hit, at the scale that matched then,
+            #    only at the tiers that hit (or the top one) would reach
+            roi = _hint_area(hint, real_mons, region) if hint else None
+            hit = None
+            if roi is not None:
+                roi_idx, roi_rect = roi
+                hint_scales = list(dict.fromkeys([hint["scale"]] + mon_scales[roi_idx]))
+                roi_confs = _hint_confs(confs, hint)
+                roi_orders = {idx: [(c, sc) for c, sc in order if c in roi_confs]
+                              for idx, order in mon_orders.items()}
+                hit = _scan_areas([roi], last_sig, rounds, False, strategy, color,
+                                  (template, roi_confs, hint_scales, log_fn, max_attempts, pyramid,
+                                   features), area_orders=roi_orders, deadline=deadline,
+                                  ladder=scales)
+                if hit is None and rounds == 1:
+                    log_fn(f"↪ Not near last hit on monitor {roi_idx}; searching full area")
 
-        # Small pause before next monitor
-        time.sleep(poll_every)
+            # 2) Full monitors (or the caller's region)
+            if hit is None:
+                hit = _scan_areas(areas, last_sig, rounds, parallel, strategy, color, scan_args,
+                                  mon_scales, mon_orders, deadline)
+
+            if hit is not None:
+                mon_idx, (abs_x, abs_y, w, h, score) = hit
+                log_fn(f"✅ FOUND in monitor {mon_idx} at absolute ({abs_x},{abs_y}) "
+                       f"size=({w}×{h})")
+                if memory is not None:
+                    mon = real_mons[mon_idx - 1]
+                    # Keypoint hits can be any size: snap to the ladder so the
+                    # learned scale is one template matching also tries
+                    scale = _closest_scale(w / template.shape[1],
+                                           scales if features is not None else mon_scales[mon_idx])
+                    memory.record_hit(
+                        template_path, (abs_x, abs_y, w, h),
+                        (mon["left"], mon["top"], mon["width"], mon["height"]),
+                        scale, densities[mon_idx - 1] / scale,
+                        score=None if features is not None else score,
+                    )
+                return abs_x, abs_y, w, h, mon_idx
+        except ScreenShotError as e:
+            log_fn(f"⚠️ Capture failed ({e}); re-reading monitor layout")
+
+        # Wait one capture interval (never past the deadline) and capture again
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(poll_every, remaining))
+        else:
+            time.sleep(poll_every)
+        real_mons = _list_real_monitors()
 
     log_fn("❌ No match found in any monitor.")
     return None
 
+# ─────────────────────────── find_images() ───────────────────────────
+BATCH_MODES = ("any", "all")
+
+def _scan_monitor_batch(
+    mon_idx: int,
+    mon: dict,
+    prev_sig: Optional[int],
+    targets: List[dict],
+    capture_color: str,
+    confs: List[float],
+    log_fn: Callable[[str], None],
+    max_attempts: int,
+    rounds: int,
+    strategy: str,
+) -> Tuple[int, Dict[str, Tuple[int,int,int,int,float]]]:
+    """
+    Capture one monitor once and match every target against that frame.
+    The BGR→gray conversion and the coarse (downsampled) haystacks are
+    computed once and shared by all targets. Targets remembered on this
+    monitor are first tried on a crop around their last hit (no extra
+    capture), only at the tiers `_hint_confs` allows; the rest go to the
+    match pool together, when one is running.
+    Returns (signature, {key: (abs_x, abs_y, w, h, score)}).
+    """
+    left, top = mon["left"], mon["top"]
+    right, bottom = left + mon["width"], top + mon["height"]
+
+    hay = _capture_monitor(mon, capture_color, reuse=True)
+    sig = _frame_signature(hay)
+    if sig == prev_sig:
+        return sig, {}
+
+    if _chatter(log_fn):
+        log_fn(f"🔍 Looking for {len(targets)} template(s) in monitor {mon_idx} "
+               f"bounds=({left},{top})..({right},{bottom})" + (f" round={rounds}" if rounds > 1 else ""))
+
+    hays = {capture_color: hay}
+    if capture_color == "bgr" and any(t["color"] == "gray" for t in targets):
+        hays["gray"] = cv2.cvtColor(hay, cv2.COLOR_BGR2GRAY)
+    coarse = {c: {} for c in hays}
+
+    hits: Dict[str, Tuple[int,int,int,int,float]] = {}
+    found_in_roi: Dict[str, Tuple[int,int,int,int,float]] = {}
+    for t in targets:
+        roi = _hint_area(t["hint"], [mon], None) if t["hint"] else None
+        if roi is None:
+            continue
+        r = roi[1]
+        ox, oy = r["left"] - left, r["top"] - top
+        crop = hays[t["color"]][oy:oy + r["height"], ox:ox + r["width"]]
+        # Only tiers the last hit (or the top one) would reach, as in find_image
+        roi_confs = _hint_confs(confs, t["hint"])
+        order = t["orders"].get(mon_idx)
+        if order is not None:
+            order = [(c, sc) for c, sc in order if c in roi_confs]
+        t_scales = t["mon_scales"].get(mon_idx, t["scales"])
+        found, _ = _find_in_monitor(crop, t["template"], roi_confs, t_scales, log_fn,
+                                    0, max_attempts, t["pyramid"], None, strategy,
+                                    order=order, free_scales=frozenset(t_scales) - set(t["scales"]))
+        if found:
+            found_in_roi[t["key"]] = (found[0] + ox, found[1] + oy) + found[2:]
+
+    # Full frame for the rest; with a match pool every (template, scale) at once
+    rest = [t for t in targets if t["key"] not in found_in_roi]
+    rest_idx = {t["key"]: i for i, t in enumerate(rest)}
+    pooled = _pool_scores(hay, mon, strategy,
+                          [(t["template"], t["pyramid"], t["mon_scales"].get(mon_idx, t["scales"]),
+                            t["color"]) for t in rest], log_fn) if rest else None
+
+    for t in targets:
+        found = found_in_roi.get(t["key"])
+        if not found:
+            i = rest_idx[t["key"]]
+            t_scales = t["mon_scales"].get(mon_idx, t["scales"])
+            found, _ = _find_in_monitor(hays[t["color"]], t["template"], confs, t_scales, log_fn,
+                                        0, max_attempts, t["pyramid"], None, strategy,
+                                        coarse[t["color"]], order=t["orders"].get(mon_idx),
+                                        scores=pooled[i] if pooled else None,
+                                        free_scales=frozenset(t_scales) - set(t["scales"]))
+        if found:
+            x_rel, y_rel, w, h, score = found
+            hits[t["key"]] = (left + x_rel, top + y_rel, w, h, score)
+            log_fn(f"✅ FOUND {Path(t['key']).name} in monitor {mon_idx} at absolute "
+                   f"({left + x_rel},{top + y_rel}) size=({w}×{h})")
+    if hits and not _frame_intact(hay):
+        log_fn(f"↪ Frame of monitor {mon_idx} was overwritten while matching; retrying")
+        return None, {}
+    return sig, hits
+
+def find_images(
+    template_paths: Sequence[str | Path],
+    *,
+    mode: str = "any",
+    base_confidence: float = 1.0,
+    timeout: Optional[float] = 10.0,
+    poll_every: float = 0.50,
+    max_attempts: int = 20,
+    min_confidence: float = 0.30,
+    confidence_step: float = 0.05,
+    min_scale: float = 0.80,
+    max_scale: float = 1.20,
+    scale_step: float = 0.10,
+    parallel: bool = True,
+    strategy: str = "exhaustive",
+    color_mode: str = "bgr",
+    region: Optional[Tuple[int,int,int,int]] = None,
+    remember: bool = True,
+    log_fn: Callable[[str], None] = _default_log,
+) -> Dict[str, Optional[Tuple[int,int,int,int,int]]]:
+    """
+    Search several templates at once. Each monitor is captured once per
+    round and every pending template is matched against that same frame.
+
+    Returns {str(template_path): (abs_x, abs_y, w, h, monitor_index) or None}
+    in the order the paths were given.
+
+    - mode="any": return as soon as a round finds at least one template
+      (e.g. "whichever of these dialogs appears"). Lower monitors win, as
+      in find_image().
+    - mode="all": keep polling for the missing ones until all are found or
+      `timeout` expires.
+
+    The other keyword arguments mean the same as in find_image().
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {BATCH_MODES}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color_mode {color_mode!r}; expected one of {COLOR_MODES}")
+
+    _last_search.rounds = 0
+    results: Dict[str, Optional[Tuple[int,int,int,int,int]]] = {}
+    scales = _build_scales(min_scale, max_scale, scale_step)
+    memory = get_memory() if remember else None
+    targets: List[dict] = []
+    for raw in template_paths:
+        key = str(raw)
+        results[key] = None
+        path = Path(raw)
+        if not path.exists():
+            log_fn(f"❌ Template not found: {path}")
+            continue
+        color = _resolve_color_mode(path, color_mode)
+        cached = None if color is None else TEMPLATE_CACHE.get(path, scales, color)
+        if cached is None:
+            log_fn(f"❌ OpenCV failed to read {path}")
+            continue
+        hint = memory.last_hit(path) if memory else None
+        t_scales = scales
+        if hint and hint["scale"] in scales:
+            t_scales = [hint["scale"]] + [sc for sc in scales if sc != hint["scale"]]
+        targets.append({"key": key, "path": path, "color": color, "template": cached[0],
+                        "pyramid": cached[1], "scales": t_scales, "hint": hint,
+                        "mon_scales": {}, "densities": [], "orders": {}})
+    if not targets:
+        return results
+
+    confs = _build_confs(base_confidence, min_confidence, confidence_step)
+    # One capture per monitor: BGR if any target needs colour (gray is derived from it)
+    capture_color = "bgr" if any(t["color"] == "bgr" for t in targets) else "gray"
+
+    real_mons = _list_real_monitors()
+    log_fn(f"🔍 Starting batch search ({mode}) | templates={len(targets)} "
+           f"base_conf={base_confidence:.2f} timeout={'∞' if timeout is None else timeout}s "
+           f"monitors={len(real_mons)} capture={capture_color}")
+
+    deadline = None if timeout is None else time.time() + timeout
+    last_sig: Dict[Tuple[int,int,int,int], int] = {}
+    pending = list(targets)
+    rounds = 0
+
+    while pending:
+        rounds += 1
+        if deadline is not None and time.time() >= deadline:
+            log_fn(f"⏱ Timeout reached after {rounds - 1} capture round(s); "
+                   f"{len(pending)} template(s) not found.")
+            break
+        _last_search.rounds = rounds
+
+        # Predicted scales first, per template and monitor
+        for t in pending:
+            t["mon_scales"], t["densities"] = _monitor_scale_order(
+                t["path"], real_mons, t["scales"], memory)
+            extra = [sc for order in t["mon_scales"].values() for sc in order
+                     if sc not in t["pyramid"]]
+            if extra:
+                t["pyramid"] = TEMPLATE_CACHE.get(t["path"], t["scales"] + extra, t["color"])[1]
+            orders = _monitor_attempt_orders(t["path"], real_mons, confs, t["mon_scales"], memory)
+            for idx, order in orders.items():
+                if t["orders"].get(idx) != order:
+                    log_fn(f"🧭 {t['path'].name} on monitor {idx} attempt order "
+                           f"(from past matches): {_describe_order(order)}")
+            t["orders"] = orders
+
+        areas = [(idx, _clip_rect(region, mon) if region else dict(mon))
+                 for idx, mon in enumerate(real_mons, start=1)]
+        areas = [(idx, rect) for idx, rect in areas if rect is not None]
+        bounds = [(r["left"], r["top"], r["left"] + r["width"], r["top"] + r["height"])
+                  for _, r in areas]
+        # Workers get their own copy: `pending` shrinks while results come in
+        jobs = [(idx, rect, last_sig.get(bounds[i]), list(pending), capture_color, confs,
+                 log_fn, max_attempts, rounds, strategy)
+                for i, (idx, rect) in enumerate(areas)]
+
+        found_any = False
+        try:
+            if parallel and len(jobs) > 1:
+                futures = [_monitor_pool().submit(_scan_monitor_batch, *job) for job in jobs]
+                scanned = (fut.result() for fut in futures)
+            else:
+                scanned = (_scan_monitor_batch(*job) for job in jobs)
+
+            for i, (sig, hits) in enumerate(scanned):
+                last_sig[bounds[i]] = sig
+                mon_idx = areas[i][0]
+                for t in list(pending):
+                    if t["key"] in hits and results[t["key"]] is None:
+                        x, y, w, h, score = hits[t["key"]]
+                        results[t["key"]] = (x, y, w, h, mon_idx)
+                        pending.remove(t)
+                        found_any = True
+                        if memory is not None:
+                            mon = real_mons[mon_idx - 1]
+                            scale = _closest_scale(w / t["template"].shape[1],
+                                                   t["mon_scales"].get(mon_idx, scales))
+                            memory.record_hit(
+                                t["path"], (x, y, w, h),
+                                (mon["left"], mon["top"], mon["width"], mon["height"]),
+                                scale, t["densities"][mon_idx - 1] / scale, score=score,
+                            )
+        except ScreenShotError as e:
+            log_fn(f"⚠️ Capture failed ({e}); re-reading monitor layout")
+
+        if found_any and mode == "any":
+            break
+        if not pending:
+            break
+
+        # Wait one capture interval (never past the deadline) and capture again
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                continue
+            time.sleep(min(poll_every, remaining))
+        else:
+            time.sleep(poll_every)
+        real_mons = _list_real_monitors()
+
+    if mode == "all" and pending:
+        log_fn("❌ Not all templates were found: "
+               + ", ".join(Path(t["key"]).name for t in pending))
+    elif mode == "any" and len(pending) == len(targets):
+        log_fn("❌ None of the templates were found.")
+    return results
+
+# ─────────────────────────── find_all_images() ───────────────────────────
+MATCH_ORDERS = ("score", "reading")
+
+_MAX_CANDIDATES_PER_SCALE = 5000   # tope de píxeles sobre el umbral que pasan a NMS
+_SCORE_TOLERANCE = 1e-3            # copias exactas puntúan 0.99999…, no 1.0
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, overlap: float) -> np.ndarray:
+    """
+    Greedy non-maximum suppression (IoU), vectorised over the remaining
+    boxes. `boxes` is N×4 (x, y, w, h). Returns the kept indices, best first.
+    """
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-scores, kind="stable")
+    keep: List[int] = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= overlap]
+    return np.asarray(keep, dtype=np.intp)
+
+def _all_matches_in_frame(
+    haystack: np.ndarray,
+    pyramid: Dict[float, np.ndarray],
+    template: np.ndarray,
+    scales: List[float],
+    confs: List[float],
+    overlap: float,
+) -> Tuple[Optional[float], List[Tuple[int,int,int,int,float]]]:
+    """
+    Correlate each scale once and walk the confidence ladder `confs` (as
+    find_image does) down to the first tier with hits; that tier's
+    candidates of every scale are merged with NMS. Returns (tier, [(x, y,
+    w, h, score)]) relative to the haystack, best score first, or
+    (None, []) when no tier is reached.
+    """
+    hay_h, hay_w = haystack.shape[:2]
+    per_scale = []          # (scale tier, xs, ys, scores, w, h)
+    for sc in scales:
+        resized = pyramid.get(sc)
+        if resized is None:
+            resized = _resize_template(template, sc)
+        th, tw = resized.shape[:2]
+        if th > hay_h or tw > hay_w:
+            continue
+        with perf_trace.span("matchTemplate", "match", {"scale": sc}):
+            res = cv2.matchTemplate(haystack, resized, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, _ = cv2.minMaxLoc(res)
+        # Best tier this scale reaches; only its candidates can survive
+        tier = next((c for c in confs if max_val >= c - _SCORE_TOLERANCE), None)
+        if tier is None:
+            continue
+        ys, xs = np.nonzero(res >= tier - _SCORE_TOLERANCE)
+        vals = res[ys, xs]
+        if vals.size > _MAX_CANDIDATES_PER_SCALE:
+            top = np.argpartition(-vals, _MAX_CANDIDATES_PER_SCALE)[:_MAX_CANDIDATES_PER_SCALE]
+            ys, xs, vals = ys[top], xs[top], vals[top]
+        per_scale.append((tier, xs, ys, vals, tw, th))
+    if not per_scale:
+        return None, []
+    best = max(p[0] for p in per_scale)
+    all_boxes, all_scores = [], []
+    for _, xs, ys, vals, tw, th in per_scale:
+        keep = vals >= best - _SCORE_TOLERANCE
+        if keep.any():
+            xs, ys = xs[keep], ys[keep]
+            all_boxes.append(np.stack([xs, ys, np.full_like(xs, tw), np.full_like(xs, th)], axis=1))
+            all_scores.append(vals[keep])
+    boxes = np.concatenate(all_boxes).astype(np.float32)
+    scores = np.concatenate(all_scores)
+    keep = _nms(boxes, scores, overlap)
+    return best, [(int(boxes[i, 0]), int(boxes[i, 1]), int(boxes[i, 2]), int(boxes[i, 3]),
+                   float(scores[i])) for i in keep]
+
+def _reading_order(matches: List[Tuple[int,int,int,int,int,float]]) -> List[Tuple[int,int,int,int,int,float]]:
+    """Ordena por monitor y luego en filas (arriba→abajo), de izquierda a derecha."""
+    out = []
+    for mon_idx in sorted({m[4] for m in matches}):
+        mon_matches = sorted((m for m in matches if m[4] == mon_idx), key=lambda m: m[1])
+        row_tol = float(np.median([m[3] for m in mon_matches])) / 2
+        rows: List[list] = []
+        for m in mon_matches:
+            if rows and m[1] - rows[-1][0][1] <= row_tol:
+                rows[-1].append(m)
+            else:
+                rows.append([m])
+        for row in rows:
+            out.extend(sorted(row, key=lambda m: m[0]))
+    return out
+
+def find_all_images(
+    template_path: str | Path,
+    *,
+    base_confidence: float = 0.90,
+    timeout: Optional[float] = 10.0,
+    poll_every: float = 0.50,
+    min_confidence: float = 0.30,
+    confidence_step: float = 0.05,
+    min_scale: float = 0.80,
+    max_scale: float = 1.20,
+    scale_step: float = 0.10,
+    overlap: float = 0.30,
+    order: str = "score",
+    max_results: Optional[int] = None,
+    color_mode: str = "bgr",
+    region: Optional[Tuple[int,int,int,int]] = None,
+    log_fn: Callable[[str], None] = _default_log,
+) -> List[Tuple[int,int,int,int,int]]:
+    """
+    Find every instance of `template_path` (checkboxes, row icons…). Each
+    correlation map is computed once and overlapping hits (IoU >
+    `overlap`, across scales) are merged by NMS.
+
+    The confidence ladder is the one of find_image() (`base_confidence`
+    down to `min_confidence` by `confidence_step`), but only the highest
+    tier with any hit is kept: every instance returned scored at least that
+    tier, so look-alikes below it are left out. Tiers are compared with a
+    small tolerance (`_SCORE_TOLERANCE`): TM_CCOEFF_NORMED gives 0.99999…
+    on a pixel-exact copy, which still counts for a base of 1.00.
+
+    Returns [(abs_x, abs_y, w, h, monitor_index), …] ordered by score
+    (`order="score"`) or by monitor then top→bottom, left→right
+    (`order="reading"`); empty if nothing appears before `timeout`.
+    """
+    if order not in MATCH_ORDERS:
+        raise ValueError(f"Unknown order {order!r}; expected one of {MATCH_ORDERS}")
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color_mode {color_mode!r}; expected one of {COLOR_MODES}")
+
+    _last_search.rounds = 0
+    template_path = Path(template_path)
+    if not template_path.exists():
+        log_fn(f"❌ Template not found: {template_path}")
+        return []
+    scales = _build_scales(min_scale, max_scale, scale_step)
+    color = _resolve_color_mode(template_path, color_mode)
+    cached = None if color is None else TEMPLATE_CACHE.get(template_path, scales, color)
+    if cached is None:
+        log_fn(f"❌ OpenCV failed to read {template_path}")
+        return []
+    template, pyramid = cached
+    confs = _build_confs(base_confidence, min_confidence, confidence_step)
+
+    log_fn(f"🔍 Finding all matches | base_conf={base_confidence:.2f} order={order} "
+           f"timeout={'∞' if timeout is None else timeout}s color={color}")
+
+    deadline = None if timeout is None else time.time() + timeout
+    last_sig: Dict[Tuple[int,int,int,int], int] = {}
+    while True:
+        _last_search.rounds += 1
+        matches: List[Tuple[int,int,int,int,int,float]] = []
+        tiers: List[float] = []
+        try:
+            for idx, mon in enumerate(_list_real_monitors(), start=1):
+                rect = _clip_rect(region, mon) if region else dict(mon)
+                if rect is None:
+                    continue
+                bounds = (rect["left"], rect["top"], rect["width"], rect["height"])
+                hay = _capture_monitor(rect, color, reuse=True)
+                sig = _frame_signature(hay)
+                if last_sig.get(bounds) == sig:
+                    continue
+                tier, found = _all_matches_in_frame(hay, pyramid, template, scales,
+                                                    confs, overlap)
+                if not _frame_intact(hay):
+                    continue        # frame server reused the slot; redo next round
+                last_sig[bounds] = sig
+                for x, y, w, h, score in found:
+                    matches.append((rect["left"] + x, rect["top"] + y, w, h, idx, score))
+                    tiers.append(tier)
+        except ScreenShotError as e:
+            log_fn(f"⚠️ Capture failed ({e}); re-reading monitor layout")
+
+        if matches:
+            # Same tier on every monitor: the best one any monitor reached
+            best = max(tiers)
+            matches = [m for m, t in zip(matches, tiers) if t >= best]
+            matches = (_reading_order(matches) if order == "reading"
+                       else sorted(matches, key=lambda m: -m[5]))
+            if max_results is not None:
+                matches = matches[:max_results]
+            log_fn(f"✅ FOUND {len(matches)} match(es) at conf≥{best:.2f}: "
+                   + ", ".join(f"({m[0]},{m[1]})→{m[5]:.3f}" for m in matches[:10])
+                   + (" …" if len(matches) > 10 else ""))
+            return [m[:5] for m in matches]
+
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                log_fn("❌ No match found in any monitor.")
+                return []
+            time.sleep(min(poll_every, remaining))
+        else:
+            time.sleep(poll_every)
+
 # ──────────────────────────── CLI helper ────────────────────────────────
 def _cli() -> None:
     p = argparse.ArgumentParser(
@@ -204,18 +1682,58 @@ def _cli() -> None:
     p.add_argument("template",    help="Path to the template image")
     p.add_argument("--conf",      type=float, default=0.80, help="base confidence")
     p.add_argument("--timeout",   type=float, default=10,   help="seconds (0=∞)")
-    p.add_argument("--poll",      type=float, default=0.50, help="sleep between monitors")
+    p.add_argument("--poll",      type=float, default=0.50, help="seconds between capture rounds")
     p.add_argument("--max-attempts", type=int, default=20, help="max template attempts")
+    p.add_argument("--strategy",  choices=STRATEGIES, default="exhaustive",
+                   help="exhaustive full-res match or coarse-to-fine pyramid")
+    p.add_argument("--color",     choices=COLOR_MODES, default="bgr",
+                   help="match in BGR, grayscale, or auto-detect from the template")
+    p.add_argument("--matcher",   choices=MATCHERS, default="template",
+                   help="scale-ladder template matching or a keypoint backend")
+    p.add_argument("--region",    type=int, nargs=4, metavar=("X", "Y", "W", "H"),
+                   help="only search this absolute rectangle")
+    p.add_argument("--memory",    help="last-hit index (JSON) to read/update, e.g. image_hits.json")
+    p.add_argument("--capture-fps", type=float, default=0,
+                   help="capture continuously in the background at this rate (0 = on demand)")
+    p.add_argument("--frame-server", nargs="?", const=FRAME_SERVER_NAME, metavar="NAME",
+                   help="read frames from a running frame_server.py instead of capturing")
+    p.add_argument("--match-workers", type=int, default=0, metavar="N",
+                   help="correlate scales on N worker processes (needs --frame-server)")
+    p.add_argument("--replay",    metavar="PATH",
+                   help="search recorded frames (screenshot directory or video) instead of the screen")
+    p.add_argument("--replay-fps", type=float, default=None,
+                   help="frames per second to replay at (default: as recorded)")
     args = p.parse_args()
 
-    # **DEBUG**: grab screenshots de cada monitor
-    with mss.mss() as sct:
-        for idx, mon in enumerate(sct.monitors[1:], start=1):
-            img = np.array(sct.grab(mon))
-            bgr = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    if args.replay:
+        try:
+            source = use_replay(args.replay, fps=args.replay_fps)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(2)
+        print(f"🎞 Replaying {args.replay}: {len(source)} frame(s) at {source.fps:g} fps, "
+              f"{len(source.monitors())} monitor(s)")
+
+    if args.frame_server and not connect_frame_server(args.frame_server):
+        print(f"⚠️ No frame server {args.frame_server!r} running; capturing locally")
+    if args.match_workers > 0:
+        if not args.frame_server or not start_match_pool(args.match_workers, args.frame_server):
+            print("⚠️ --match-workers needs a running frame server; matching in-process")
+
+    if args.memory:
+        set_memory_path(Path(args.memory))
+    if args.capture_fps > 0:
+        start_service(fps=args.capture_fps)
+
+    # **DEBUG**: grab screenshots de cada monitor (+ su geometría, para --replay .)
+    if not args.replay:
+        monitors = _list_real_monitors()
+        for idx, mon in enumerate(monitors, start=1):
             dbg = f"screen{idx}.png"
-            cv2.imwrite(dbg, bgr)
+            cv2.imwrite(dbg, _capture_monitor(mon))
             print(f"🖥 Saved debug screenshot → {dbg}")
+        meta = save_metadata(Path("."), monitors, [_monitor_scale(m) for m in monitors])
+        print(f"🖥 Saved monitor layout → {meta}")
 
     # buscar
     res = find_image(
@@ -223,8 +1741,14 @@ def _cli() -> None:
         base_confidence=args.conf,
         timeout=None if args.timeout<=0 else args.timeout,
         poll_every=args.poll,
-        max_attempts=args.max_attempts
+        max_attempts=args.max_attempts,
+        strategy=args.strategy,
+        color_mode=args.color,
+        region=tuple(args.region) if args.region else None,
+        remember=bool(args.memory),
+        matcher=args.matcher,
     )
+    stop_match_pool()
 
     if res:
         x, y, w, h, mon_idx = res
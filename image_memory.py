@@ -0,0 +1,213 @@
+"""
+image_memory.py
+────────────────────────────────────────────────────────────────────────────
+Memoria persistente de dónde se encontró cada template la última vez.
+
+Los objetivos casi siempre reaparecen a pocos píxeles de su última
+posición, así que image_engine prueba primero una región (ROI) alrededor
+del último hit antes de buscar en el monitor completo.
+
+También guarda la escala que funcionó en cada monitor y la densidad de
+píxeles a la que se capturó el template (escala UI del monitor / escala
+del hit), para predecir la escala en monitores donde aún no se ha visto,
+y un historial corto de (score, escala) por monitor con el que image_engine
+ordena los intentos (confianza, escala) por probabilidad de éxito.
+
+El índice es un JSON pequeño (`image_hits.json`) que vive junto a run.json.
+Los hits sólo se apuntan en memoria: el fichero se escribe con `save()`
+(run_module lo llama al final de cada ejecución, y siempre al salir del
+proceso), no en cada búsqueda.
+
+
+{
+  "version": 1,
+  "templates": {
+    "/abs/path/boton.png": {
+      "x": 812, "y": 430, "w": 96, "h": 32,
+      "monitor": [0, 0, 1920, 1080],       # left, top, width, height
+      "scale": 1.0,
+      "scales": {"0,0,1920,1080": 1.0},    # escala aprendida por monitor
+      "density": 1.0,                      # opcional
+      "history": [[0.97, 1.0, "0,0,1920,1080"]],   # score, escala, monitor
+      "ts": 1760000000.0
+    }
+  }
+}
+
+Uso
+───
+from image_memory import set_memory_path
+set_memory_path(Path(run_json).with_name("image_hits.json"))
+…
+get_memory().save()                        # al terminar la ejecución
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import run_log
+
+MEMORY_FILENAME = "image_hits.json"
+_VERSION = 1
+_HISTORY_LEN = 20     # hits recordados por template (todos los monitores)
+
+class ImageMemory:
+    """
+    Last-hit index per template. Thread-safe; recorded hits only mark it
+    dirty, and save() writes it to `path` (atomically, via a temp file)
+    when a path is set, so the memory survives across runs. Without a path
+    it lives only in RAM.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._templates: dict = {}
+        self._dirty = False
+        if self.path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            run_log.log(f"⚠️ Ignoring unreadable image memory {self.path}: {e}", run_log.WARNING)
+            return
+        if isinstance(data, dict) and data.get("version") == _VERSION:
+            self._templates = dict(data.get("templates", {}))
+
+    def save(self) -> None:
+        """Write the hits recorded since the last save (no-op if none, or without a path)."""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            text = json.dumps({"version": _VERSION, "templates": self._templates},
+                              ensure_ascii=False, indent=2, sort_keys=True)
+            self._dirty = False
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            with self._lock:
+                self._dirty = True
+            run_log.log(f"⚠️ Could not save image memory {self.path}: {e}", run_log.WARNING)
+
+    @staticmethod
+    def key(template_path: Path) -> str:
+        return str(Path(template_path).resolve())
+
+    def last_hit(self, template_path: Path) -> Optional[dict]:
+        """Último hit registrado para el template (copia), o None."""
+        with self._lock:
+            hit = self._templates.get(self.key(template_path))
+            return dict(hit) if hit else None
+
+    def record_hit(
+        self,
+        template_path: Path,
+        box: Tuple[int, int, int, int],
+        monitor: Tuple[int, int, int, int],
+        scale: float,
+        density: Optional[float] = None,
+        score: Optional[float] = None,
+    ) -> None:
+        """
+        Guarda (x, y, w, h) absolutos, el monitor (left, top, width, height) y
+        la escala, que además queda aprendida para ese monitor. `density` es
+        la densidad de píxeles del template (escala UI del monitor / escala);
+        `score` (correlación del hit) se añade al historial.
+        """
+        x, y, w, h = (int(v) for v in box)
+        key = self.key(template_path)
+        scale = round(float(scale), 2)
+        with self._lock:
+            old = self._templates.get(key) or {}
+            scales = dict(old.get("scales", {}))
+            scales[self.monitor_key(monitor)] = scale
+            history = list(old.get("history", []))
+            if score is not None:
+                history = (history + [[round(float(score), 3), scale,
+                                       self.monitor_key(monitor)]])[-_HISTORY_LEN:]
+            entry = {
+                "x": x, "y": y, "w": w, "h": h,
+                "monitor": [int(v) for v in monitor],
+                "scale": scale,
+                "scales": scales,
+                "history": history,
+                "ts": time.time(),
+            }
+            if density is not None:
+                entry["density"] = round(float(density), 3)
+            elif "density" in old:
+                entry["density"] = old["density"]
+            self._templates[key] = entry
+            self._dirty = True
+
+    @staticmethod
+    def monitor_key(monitor: Tuple[int, int, int, int]) -> str:
+        return ",".join(str(int(v)) for v in monitor)
+
+    def learned_scale(self, template_path: Path, monitor: Tuple[int, int, int, int]) -> Optional[float]:
+        """Escala con la que el template apareció por última vez en ese monitor, o None."""
+        with self._lock:
+            hit = self._templates.get(self.key(template_path)) or {}
+            return hit.get("scales", {}).get(self.monitor_key(monitor))
+
+    def history(
+        self, template_path: Path, monitor: Tuple[int, int, int, int]
+    ) -> List[Tuple[float, float]]:
+        """(score, escala) de los últimos hits del template en ese monitor, del más antiguo al último."""
+        mon_key = self.monitor_key(monitor)
+        with self._lock:
+            hit = self._templates.get(self.key(template_path)) or {}
+            return [(score, scale) for score, scale, mk in hit.get("history", []) if mk == mon_key]
+
+    def density(self, template_path: Path) -> Optional[float]:
+        """Densidad de píxeles a la que se capturó el template, si ya se conoce."""
+        with self._lock:
+            hit = self._templates.get(self.key(template_path)) or {}
+            return hit.get("density")
+
+    def forget(self, template_path: Path) -> None:
+        with self._lock:
+            if self._templates.pop(self.key(template_path), None) is not None:
+                self._dirty = True
+
+# ───────────────────────── instancia del proceso ─────────────────────────
+_memory = ImageMemory()
+_memory_lock = threading.Lock()
+
+def get_memory() -> ImageMemory:
+    """Memoria compartida por todas las búsquedas del proceso."""
+    return _memory
+
+def set_memory_path(path: Optional[Path]) -> ImageMemory:
+    """
+    Point the process-wide memory at `path` (loading what is there), or
+    back to RAM-only with None. Typically called once per run with the
+    file next to run.json. Unsaved hits of the previous file are saved
+    first.
+    """
+    global _memory
+    with _memory_lock:
+        new_path = Path(path) if path else None
+        if _memory.path != new_path:
+            _memory.save()
+            _memory = ImageMemory(new_path)
+        return _memory
+
+def _save_at_exit() -> None:
+    _memory.save()
+
+atexit.register(_save_at_exit)
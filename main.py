@@ -17,8 +17,17 @@ import sys
 import datetime
 import os
 import time
+import multiprocessing
+import perf_trace
+import run_log
 import run_module
 
+if __name__ == "__main__":
+    # Frozen builds: image_engine's match pool workers start here, before any UI
+    multiprocessing.freeze_support()
+    # One buffered run-log.txt for the UI and run_module (flushed on exit)
+    run_log.configure()
+
 
 
 
@@ -33,18 +42,10 @@ if sys.stdout:
 
 def _get_output_dir():
     """
-    Return the directory where run.json and run-log.txt should be saved.
-    - On macOS, when running as a PyInstaller “onefile” bundle, return the folder containing the executable.
-    - Otherwise (Windows or development), return the current working directory.
+    Return the directory where run.json and run-log.txt should be saved
+    (shared with run_module through run_log.output_dir()).
     """
-    if sys.platform == "darwin" and getattr(sys, "frozen", False):
-        # On macOS “frozen” (PyInstaller), sys.executable points to:
-        #   MyApp.app/Contents/MacOS/MyApp
-        # We want the directory …/MyApp.app/Contents/MacOS/
-        return os.path.dirname(sys.executable)
-    else:
-        # In Windows (and during normal “python main.py” development), use cwd
-        return os.getcwd()
+    return run_log.output_dir()
 
 
 
@@ -432,8 +433,12 @@ _default_input = {
 
 _default_image = {
     "image_click":      False,
+    "image_click_all":  False,
     "image_click_LR":   "Left",
+    "image_color_mode": "auto",
     "image_confidence": "1.00",
+    "image_match_index": "0",
+    "image_matcher":    "template",
     "image_path":       "",
     "image_sleep":      "0",
     "image_timeout":    "0",
@@ -568,24 +573,8 @@ def update_steps_view():
 
 
 def log_action(message):
-    """Append a log message with timestamp to run-log.txt and also print it to stdout."""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
-    log_line = f"{timestamp} | {message}"
-
-    # Determine where to write run-log.txt
-    out_dir = _get_output_dir()
-    log_path = os.path.join(out_dir, "run-log.txt")
-
-    try:
-        # Open in append mode; create the file if it doesn’t exist
-        with open(log_path, "a", encoding="utf-8") as log_file:
-            log_file.write(log_line + "\n")
-    except Exception as e:
-        # If writing fails, output an error message to the console
-        print(f"ERROR writing to {log_path}: {e}")
-
-    # Always print the log line to stdout as well
-    print(log_line)
+    """Log a message with timestamp to run-log.txt (next to run.json) and stdout."""
+    run_log.log(message)
 
 
 def run_script():
@@ -623,8 +612,10 @@ def run_script():
 
     # ── 3) Launch run_module.run_from_json(run.json) ───────────────────────────
     log_action("RUN: Calling run_module.run_from_json(run.json) …")
-    run_module.run_from_json(run_filename)
-    log_action("RUN: run_module.run_from_json returned.")
+    if run_module.run_from_json(run_filename):
+        log_action("RUN: run_module.run_from_json returned.")
+    else:
+        log_action("RUN: run.json has errors (see above); nothing was run.")
 
     # ── 4) Restore the main window when done ───────────────────────────────────
     root.deiconify()
@@ -877,18 +868,29 @@ if __name__ == "__main__":
     import subprocess
     import os
 
-    # If exactly one CLI argument is provided, run run_module.py with it and exit
-    if len(sys.argv) == 2:
-        config_path = sys.argv[1]
+    # If a run.json is provided, run run_module.py with it and exit;
+    # "--perf-trace [PATH]" also records a Perfetto trace (see perf_trace.py)
+    cli_args = sys.argv[1:]
+    if "--perf-trace" in cli_args:
+        i = cli_args.index("--perf-trace")
+        perf_path = None
+        # "main.py --perf-trace run.json": run.json is the config, not the trace PATH
+        if len(cli_args) > 2 and i + 1 < len(cli_args) and not cli_args[i + 1].startswith("-"):
+            perf_path = cli_args.pop(i + 1)
+        cli_args.pop(i)
+        perf_trace.enable(perf_path)
+
+    if len(cli_args) == 1:
+        config_path = cli_args[0]
         if not os.path.isfile(config_path):
             print(f"Error: JSON file not found: {config_path}")
             sys.exit(1)
         try:
-            run_module.run_from_json(config_path)
-            sys.exit(0)
+            ran = run_module.run_from_json(config_path)
         except Exception as e:
             print(f"Error running automation: {e}")
             sys.exit(1)
+        sys.exit(0 if ran else 1)
 
 
     # Otherwise (no arguments), open the GUI
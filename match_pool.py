@@ -0,0 +1,203 @@
+"""
+match_pool.py
+────────────────────────────────────────────────────────────────────────────
+Modo opcional de matching en varios procesos para image_engine.
+
+Con el pool de hilos de image_engine una búsqueda usa, como mucho, un hilo
+por monitor: las escalas y los templates de un monitor se correlacionan uno
+detrás de otro. Aquí un pool de procesos (arrancado una vez por ejecución)
+se reparte esas correlaciones: cada tarea es un template ya escalado, y el
+worker lee el fotograma de la memoria compartida del frame_server — el
+mismo fotograma, identificado por su número de secuencia — y devuelve sólo
+el mejor candidato (score, posición, tamaño). Ningún fotograma pasa por
+el pipe del pool: cada worker copia el recorte una sola vez desde la
+memoria compartida y lo reutiliza en todas sus tareas sobre ese fotograma.
+
+• Requiere un frame_server: sin él (o si el fotograma ya se ha reciclado
+  cuando llega la tarea) image_engine correlaciona en su propio proceso
+  como siempre.
+• Los workers se lanzan con "spawn" y sin re-importar el script principal
+  (main.py crea la ventana al importarse).
+• Cada worker usa un único hilo de OpenCV: el paralelismo lo da el pool.
+
+Uso
+───
+from match_pool import start_pool, stop_pool
+
+start_pool(workers=8)          # una vez por ejecución (con un frame_server activo)
+# … image_engine.find_image() reparte ahora las escalas entre los workers …
+stop_pool()
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from frame_server import DEFAULT_NAME, FrameClient
+import perf_trace
+
+# (max_val, max_loc, (w, h)) como en image_engine._score_scales
+Score = Tuple[float, Tuple[int, int], Tuple[int, int]]
+
+class FrameGone(Exception):
+    """El fotograma pedido ya no está en la memoria compartida."""
+
+# ───────────────────────── arranque de workers ─────────────────────────
+@contextmanager
+def _main_hidden():
+    """
+    Hide the main script from multiprocessing's preparation data, so spawned
+    workers do not import it (main.py builds the Tk window at import time).
+    Workers only need this module, which they import by name.
+    """
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    if path is None or getattr(main, "__spec__", None) is not None or getattr(sys, "frozen", False):
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = path
+
+class _WorkerProcess(SpawnProcess):
+    def start(self) -> None:
+        with _main_hidden():
+            super().start()
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+# ───────────────────────── lado del worker ─────────────────────────
+_client: Optional[FrameClient] = None
+# (rect, color, seq) → (haystack, coarse_hays) de los últimos fotogramas vistos
+_hays: "OrderedDict[tuple, Tuple[np.ndarray, Dict[float, np.ndarray]]]" = OrderedDict()
+_HAYS_KEPT = 4
+
+def _noop_tracking(name: str, rtype: str) -> None:
+    pass
+
+def _init_worker(server: str) -> None:
+    global _client
+    cv2.setNumThreads(1)
+    # Spans are only collected (and saved) by the runner process
+    perf_trace.disable()
+    # Workers share the parent's resource tracker and never own a block:
+    # attaching must not add or drop registrations there
+    resource_tracker.register = resource_tracker.unregister = _noop_tracking
+    _client = FrameClient(server)
+    import image_engine     # noqa: F401 — pay the import at startup, not on the first step
+
+def _ready() -> int:
+    return os.getpid()
+
+def _haystack(rect: dict, color: str, seq: int) -> Tuple[np.ndarray, Dict[float, np.ndarray]]:
+    key = (rect["left"], rect["top"], rect["width"], rect["height"], color, seq)
+    entry = _hays.get(key)
+    if entry is None:
+        view = _client.read(rect, color, seq=seq)
+        if view is None:
+            raise FrameGone(seq)
+        # A private copy, so the remaining tasks on this frame do not race
+        # the server's ring (and the client's gray buffer is reused per read)
+        frame = np.array(view)
+        if not view.intact():
+            raise FrameGone(seq)
+        entry = _hays[key] = (frame, {})
+        while len(_hays) > _HAYS_KEPT:
+            _hays.popitem(last=False)
+    else:
+        _hays.move_to_end(key)
+    return entry
+
+def _score_task(template: np.ndarray, color: str, rect: dict, seq: int, strategy: str) -> Score:
+    """Mejor posición de un template (ya escalado) en el fotograma `seq` de `rect`."""
+    # image_engine imports this module: import it lazily (already loaded by _init_worker)
+    from image_engine import _match_coarse_to_fine
+
+    hay, coarse_hays = _haystack(rect, color, seq)
+    coarse = _match_coarse_to_fine(hay, template, coarse_hays) if strategy == "pyramid" else None
+    if coarse is not None:
+        max_val, max_loc = coarse
+    else:
+        res = cv2.matchTemplate(hay, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+    h, w = template.shape[:2]
+    return float(max_val), (int(max_loc[0]), int(max_loc[1])), (w, h)
+
+# ───────────────────────── lado del proceso principal ─────────────────────────
+class MatchPool:
+    """
+    Worker processes attached to the frame server `server`. `score()`
+    correlates a batch of scaled templates against one published frame.
+    """
+
+    def __init__(self, workers: Optional[int] = None, server: str = DEFAULT_NAME) -> None:
+        self.workers = max(1, int(workers or (os.cpu_count() or 2) - 1))
+        self.server = server
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=_WorkerContext(),
+                                             initializer=_init_worker, initargs=(server,))
+        # Start (and attach) every worker now rather than on the first step
+        for fut in [self._executor.submit(_ready) for _ in range(self.workers)]:
+            fut.result()
+
+    def score(
+        self, tasks: List[Tuple[np.ndarray, str]], rect: dict, seq: int, strategy: str
+    ) -> List[Score]:
+        """
+        One Score per (template, color) task, matched against frame `seq` of
+        `rect`, in task order. Raises FrameGone if a worker could not read
+        that frame, BrokenProcessPool if a worker died.
+        """
+        futures = [self._executor.submit(_score_task, tpl, color, rect, seq, strategy)
+                   for tpl, color in tasks]
+        try:
+            return [fut.result() for fut in futures]
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+_pool: Optional[MatchPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> Optional[MatchPool]:
+    """Pool activo, o None si el matching es en proceso."""
+    return _pool
+
+def start_pool(workers: Optional[int] = None, server: str = DEFAULT_NAME) -> MatchPool:
+    """
+    Start the process-wide pool (`workers` defaults to all cores but one)
+    against the frame server `server`, replacing a previous one. Call once
+    per run; FileNotFoundError if no such frame server is running.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+        FrameClient(server).close()     # fail here rather than in every worker
+        _pool = MatchPool(workers, server)
+        return _pool
+
+def stop_pool() -> None:
+    """Vuelve al matching en proceso."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
@@ -32,9 +32,9 @@ def open_image_modal(step_id, callback, existing_data=None):
     
     if sys.platform == "win32":
     # En Windows, le sumamos 130 píxeles extra de alto
-        modal.geometry("600x630")
+        modal.geometry("600x770")
     else:
-        modal.geometry("600x500")
+        modal.geometry("600x640")
 
 
 
@@ -185,6 +185,49 @@ def open_image_modal(step_id, callback, existing_data=None):
     sleep_next_spin.pack(side="left", padx=5)
     sleep_next_spin.component_id = f"image_modal_sleep_spinbox_{step_id}"
 
+    # Row 8b: Color Mode (Auto = gray unless the template is clearly coloured)
+    row8b_frame = ctk.CTkFrame(main_frame)
+    row8b_frame.pack(fill="x", pady=5)
+    color_mode_label = ctk.CTkLabel(row8b_frame, text="Color Mode:")
+    color_mode_label.pack(side="left", padx=5)
+    color_mode_label.component_id = f"image_modal_color_mode_label_{step_id}"
+    color_switch = CustomSwitch(row8b_frame, options=["Auto", "Gray", "BGR"])
+    color_switch.pack(side="left", padx=5)
+    color_switch.component_id = f"image_modal_color_mode_switch_{step_id}"
+    if existing_data:
+        saved_mode = str(existing_data.get("image_color_mode", "bgr")).lower()
+        color_switch.var.set({"auto": "Auto", "gray": "Gray"}.get(saved_mode, "BGR"))
+        color_switch.update_button_styles()
+
+    # Row 8c: Multiple matches (click all, or only the Nth in reading order)
+    row8c_frame = ctk.CTkFrame(main_frame)
+    row8c_frame.pack(fill="x", pady=5)
+    click_all_checkbox = LabelCheckbox(row8c_frame, text="Click All Matches")
+    click_all_checkbox.pack(side="left", padx=5)
+    click_all_checkbox.component_id = f"image_modal_click_all_checkbox_{step_id}"
+    match_index_label = ctk.CTkLabel(row8c_frame, text="Match # (0 = best):")
+    match_index_label.pack(side="left", padx=5)
+    match_index_label.component_id = f"image_modal_match_index_label_{step_id}"
+    match_index_spin = tk.Spinbox(row8c_frame, from_=0, to=50, increment=1, width=8)
+    match_index_spin.delete(0, "end")
+    match_index_spin.insert(0, "0")
+    match_index_spin.pack(side="left", padx=5)
+    match_index_spin.component_id = f"image_modal_match_index_spinbox_{step_id}"
+
+    # Row 8d: Matcher backend (ORB/AKAZE find the image at any scale)
+    row8d_frame = ctk.CTkFrame(main_frame)
+    row8d_frame.pack(fill="x", pady=5)
+    matcher_label = ctk.CTkLabel(row8d_frame, text="Matcher:")
+    matcher_label.pack(side="left", padx=5)
+    matcher_label.component_id = f"image_modal_matcher_label_{step_id}"
+    matcher_switch = CustomSwitch(row8d_frame, options=["Template", "ORB", "AKAZE"])
+    matcher_switch.pack(side="left", padx=5)
+    matcher_switch.component_id = f"image_modal_matcher_switch_{step_id}"
+    if existing_data:
+        saved_matcher = str(existing_data.get("image_matcher", "template")).lower()
+        matcher_switch.var.set({"orb": "ORB", "akaze": "AKAZE"}.get(saved_matcher, "Template"))
+        matcher_switch.update_button_styles()
+
     # --- Prefill existing data if provided ---
     if existing_data:
         image_path_value.configure(text=existing_data.get("image_path", ""))
@@ -211,6 +254,15 @@ def open_image_modal(step_id, callback, existing_data=None):
         timeout_spin.insert(0, existing_data.get("image_timeout", "0"))
         sleep_next_spin.delete(0, "end")
         sleep_next_spin.insert(0, existing_data.get("image_sleep", "0"))
+        try:
+            if existing_data.get("image_click_all", False):
+                click_all_checkbox.chk.select()
+            else:
+                click_all_checkbox.chk.deselect()
+        except Exception as e:
+            print("Error preloading image_click_all:", e)
+        match_index_spin.delete(0, "end")
+        match_index_spin.insert(0, existing_data.get("image_match_index", "0"))
 
     # Row 9: OK Button – collect and return the image configuration.
     row9_frame = ctk.CTkFrame(main_frame)
@@ -219,7 +271,8 @@ def open_image_modal(step_id, callback, existing_data=None):
         # Debug: print raw checkbox values.
         print("Raw image_wait value:", image_wait_checkbox.chk.get())
         print("Raw image_click value:", image_click_checkbox.chk.get())
-        data = {}
+        # Keep keys this modal does not edit (e.g. image_alternatives set in the JSON)
+        data = dict(existing_data) if existing_data else {}
         data["image_path"] = image_path_value.cget("text")
         data["image_confidence"] = confidence_spin.get()
         try:
@@ -234,6 +287,13 @@ def open_image_modal(step_id, callback, existing_data=None):
         data["image_click_LR"] = click_switch.get_value()
         data["image_timeout"] = timeout_spin.get()
         data["image_sleep"] = sleep_next_spin.get()
+        data["image_color_mode"] = color_switch.get_value().lower()
+        try:
+            data["image_click_all"] = bool(int(click_all_checkbox.chk.get()))
+        except Exception:
+            data["image_click_all"] = False
+        data["image_match_index"] = match_index_spin.get()
+        data["image_matcher"] = matcher_switch.get_value().lower()
         print("Collected image data for step", step_id, ":", data)
         callback(step_id, data)
         modal.destroy()
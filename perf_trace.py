@@ -0,0 +1,135 @@
+"""
+perf_trace.py
+────────────────────────────────────────────────────────────────────────────
+Spans opcionales de perfilado en formato Chrome Trace Event (JSON), para
+abrir en Perfetto (https://ui.perfetto.dev) o chrome://tracing y ver en qué
+se va el tiempo de una ejecución: run, tab, step, capture, resize,
+matchTemplate, sleep, input y Excel.
+
+• Desactivado por defecto: `span()` devuelve entonces un único objeto
+  vacío, sin medir ni guardar nada (coste: una llamada y una comprobación).
+• Se activa con la variable de entorno `RUN_PERF_TRACE` ("1" o la ruta del
+  fichero) o con `python main.py run.json --perf-trace [RUTA]`.
+• Los eventos se guardan en memoria (hasta `_MAX_EVENTS`) y `save()` los
+  escribe al final de cada ejecución: en la ruta dada o, sin ruta, en
+  `perf-<run_id>.json` junto a run-log.txt.
+• Cada hilo es una pista propia (el pool de monitores de image_engine
+  aparece en paralelo). Los procesos del match_pool no se trazan: su
+  trabajo aparece como la espera del hilo que los llama.
+
+Uso
+───
+$ RUN_PERF_TRACE=1 python main.py run.json
+$ python main.py run.json --perf-trace perfil.json
+
+import perf_trace
+with perf_trace.span("matchTemplate", "match", {"scale": 1.1}):
+    …
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import run_log
+
+ENV = "RUN_PERF_TRACE"
+_MAX_EVENTS = 2_000_000
+
+enabled = False
+_path: Optional[str] = None
+_events: List[dict] = []
+_threads: Dict[int, str] = {}
+_t0 = time.perf_counter_ns()
+_dropped = 0
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: Optional[dict]) -> None:
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        global _dropped
+        end = time.perf_counter_ns()
+        if len(_events) >= _MAX_EVENTS:
+            _dropped += 1
+            return False
+        tid = threading.get_ident()
+        if tid not in _threads:
+            _threads[tid] = threading.current_thread().name
+        event = {"name": self.name, "cat": self.cat, "ph": "X", "pid": os.getpid(), "tid": tid,
+                 "ts": (self.start - _t0) / 1000, "dur": (end - self.start) / 1000}
+        if self.args or exc_type is not None:
+            event["args"] = dict(self.args or {})
+            if exc_type is not None:
+                event["args"]["error"] = exc_type.__name__
+        _events.append(event)        # list.append is atomic: no lock on the hot path
+        return False
+
+def span(name: str, cat: str = "run", args: Optional[dict] = None):
+    """Context manager timing `name`; a shared no-op while tracing is off."""
+    if not enabled:
+        return _NULL
+    return _Span(name, cat, args)
+
+def enable(path: Optional[str] = None) -> None:
+    """
+    Start collecting spans. `path` is where save() writes; None (or "1")
+    means perf-<run_id>.json in run_log's output directory.
+    """
+    global enabled, _path
+    _path = None if path in (None, "", "1", "true", "yes") else os.path.abspath(path)
+    enabled = True
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+def save(run_id: str = "") -> Optional[str]:
+    """
+    Write the spans collected so far as Chrome Trace Event JSON and start a
+    new collection. Returns the file path, or None when tracing is off.
+    """
+    global _events, _dropped
+    if not enabled:
+        return None
+    events, _events = _events, []
+    dropped, _dropped = _dropped, 0
+    pid = os.getpid()
+    meta = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+             "args": {"name": "run_module"}}]
+    meta += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+             for tid, name in list(_threads.items())]
+    trace = {"traceEvents": meta + events, "displayTimeUnit": "ms",
+             "otherData": {"run_id": run_id, "dropped_spans": dropped}}
+    if _path:
+        path = _path
+    else:
+        path = os.path.join(run_log.output_dir(), f"perf-{run_id or int(time.time())}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, separators=(",", ":"))
+    return path
+
+if os.environ.get(ENV, "").strip().lower() not in ("", "0", "false", "no"):
+    enable(os.environ[ENV].strip())
@@ -0,0 +1,268 @@
+"""
+replay_capture.py
+────────────────────────────────────────────────────────────────────────────
+Backend de captura sin pantalla para image_engine: reproduce fotogramas
+grabados (un directorio de capturas o un vídeo) en lugar de capturar los
+monitores, para ajustar confianza y escalas, medir y hacer tests de
+regresión en CI.
+
+Formatos
+────────
+• Directorio con `screen1.png`, `screen2.png`, … (lo que vuelca el CLI de
+  image_engine): un único fotograma por monitor.
+• Directorio con subdirectorios ordenados (`0001/`, `0002/`, …), cada uno
+  con sus `screenN.png`: una secuencia de fotogramas.
+• Un vídeo (o `"video"` en los metadatos) con el escritorio completo; cada
+  monitor se recorta según su geometría.
+
+Los metadatos (`monitors.json` en el directorio, o `<vídeo>.json` junto al
+vídeo) guardan la geometría lógica de cada monitor, su escala UI y los fps
+de la grabación:
+
+    {"fps": 2, "monitors": [{"left": 0, "top": 0, "width": 1920,
+      "height": 1080, "scale": 1.0, "file": "screen1.png"}, …]}
+
+Sin metadatos, los monitores de un directorio se colocan de izquierda a
+derecha con el tamaño de sus imágenes, y un vídeo es un único monitor.
+
+El fotograma activo avanza con el reloj a los fps grabados (y se queda en
+el último, salvo con `loop=True`), así que los timeouts y el sondeo de
+find_image se comportan como en vivo.
+
+Uso
+───
+$ python image_engine.py boton.png --replay capturas/
+
+from image_engine import use_replay
+use_replay("capturas/")              # find_image() lee ahora de la grabación
+"""
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+METADATA_FILENAME = "monitors.json"
+_SCREEN_RE = re.compile(r"^screen(\d+)\.png$", re.IGNORECASE)
+_DEFAULT_FPS = 1.0
+
+def save_metadata(
+    directory: Path,
+    monitors: Sequence[dict],
+    scales: Optional[Sequence[float]] = None,
+    fps: Optional[float] = None,
+) -> Path:
+    """
+    Write `monitors.json` next to `screen1.png`, `screen2.png`, … so the
+    directory can be replayed with the same geometry. Returns its path.
+    """
+    entries = []
+    for idx, mon in enumerate(monitors, start=1):
+        entry = {k: int(mon[k]) for k in ("left", "top", "width", "height")}
+        entry["file"] = f"screen{idx}.png"
+        if scales is not None:
+            entry["scale"] = round(float(scales[idx - 1]), 4)
+        entries.append(entry)
+    meta: dict = {"monitors": entries}
+    if fps:
+        meta["fps"] = fps
+    path = Path(directory) / METADATA_FILENAME
+    path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return path
+
+class ReplaySource:
+    """
+    Recorded frames served like live captures. `monitors()` returns the
+    recorded layout; `read(rect, color)` the current frame cropped to
+    `rect`, which must lie inside one monitor (None otherwise).
+    Raises ValueError up front when the recording and its metadata do not
+    agree (missing files, unreadable video, …).
+    """
+
+    def __init__(self, path: str | Path, fps: Optional[float] = None, loop: bool = False) -> None:
+        self.path = Path(path)
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._video: Optional[cv2.VideoCapture] = None
+        self._video_pos = -1
+        self._frames: List[List[Path]] = []        # por fotograma: una imagen por monitor
+        self._current: Tuple[int, List[np.ndarray]] = (-1, [])
+        self._t0: Optional[float] = None
+
+        if self.path.is_dir():
+            meta = self._read_metadata(self.path / METADATA_FILENAME)
+            video = meta.get("video")
+            if video:
+                self._open_video(self.path / video, meta)
+            else:
+                self._scan_directory(meta)
+        elif self.path.is_file():
+            meta = self._read_metadata(Path(f"{self.path}.json"))
+            self._open_video(self.path, meta)
+        else:
+            raise ValueError(f"Replay source not found: {self.path}")
+
+        self.fps = float(fps or meta.get("fps") or self._recorded_fps or _DEFAULT_FPS)
+        if self.fps <= 0:
+            raise ValueError("replay fps must be > 0")
+
+    # ───────────────────── carga ─────────────────────
+    @staticmethod
+    def _read_metadata(path: Path) -> dict:
+        if not path.exists():
+            return {}
+        try:
+            meta = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Invalid replay metadata {path}: {e}") from None
+        for m in meta.get("monitors", []):
+            if not all(isinstance(m.get(k), int) for k in ("left", "top", "width", "height")):
+                raise ValueError(f"Invalid monitor entry in {path}: {m}")
+        return meta
+
+    @staticmethod
+    def _screens(directory: Path) -> List[Path]:
+        found = []
+        for p in directory.iterdir():
+            m = _SCREEN_RE.match(p.name)
+            if m:
+                found.append((int(m.group(1)), p))
+        return [p for _, p in sorted(found)]
+
+    def _scan_directory(self, meta: dict) -> None:
+        self._recorded_fps = None
+        snapshots = sorted(p for p in self.path.iterdir() if p.is_dir() and self._screens(p))
+        folders = snapshots or [self.path]
+        recorded = meta.get("monitors")
+        names = ([m.get("file", f"screen{i}.png") for i, m in enumerate(recorded, start=1)]
+                 if recorded else [p.name for p in self._screens(folders[0])])
+        if not names:
+            raise ValueError(f"No screenN.png frames in {self.path}")
+        for folder in folders:
+            files = [folder / name for name in names]
+            missing = [f.name for f in files if not f.exists()]
+            if missing:
+                raise ValueError(f"Replay frame {folder} is missing {', '.join(missing)}")
+            self._frames.append(files)
+
+        first = self._load(0)
+        self._current = (0, first)
+        if recorded:
+            self._set_monitors(recorded, [img.shape[1] / m["width"] for img, m in zip(first, recorded)])
+        else:
+            # No geometry recorded: monitors side by side, one pixel per logical pixel
+            left, monitors = 0, []
+            for img in first:
+                h, w = img.shape[:2]
+                monitors.append({"left": left, "top": 0, "width": w, "height": h})
+                left += w
+            self._set_monitors(monitors, [1.0] * len(monitors))
+
+    def _open_video(self, path: Path, meta: dict) -> None:
+        video = cv2.VideoCapture(str(path))
+        ok, frame = video.read() if video.isOpened() else (False, None)
+        if not ok:
+            raise ValueError(f"Cannot read replay video {path}")
+        self._video, self._video_pos = video, 0
+        self._frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT)) or 1
+        self._recorded_fps = video.get(cv2.CAP_PROP_FPS) or None
+        h, w = frame.shape[:2]
+        recorded = meta.get("monitors") or [{"left": 0, "top": 0, "width": w, "height": h}]
+        # The video frame spans the bounding box of all recorded monitors
+        x0 = min(m["left"] for m in recorded)
+        y0 = min(m["top"] for m in recorded)
+        fx = w / (max(m["left"] + m["width"] for m in recorded) - x0)
+        fy = h / (max(m["top"] + m["height"] for m in recorded) - y0)
+        self._boxes = [(int((m["left"] - x0) * fx), int((m["top"] - y0) * fy),
+                        int(m["width"] * fx), int(m["height"] * fy)) for m in recorded]
+        self._set_monitors(recorded, [fx] * len(recorded))
+        self._current = (0, self._split(frame))
+
+    def _set_monitors(self, recorded: List[dict], pixel_ratios: List[float]) -> None:
+        self._monitors = tuple({k: int(m[k]) for k in ("left", "top", "width", "height")}
+                               for m in recorded)
+        self._scales = [float(m.get("scale", ratio)) for m, ratio in zip(recorded, pixel_ratios)]
+
+    # ───────────────────── fotogramas ─────────────────────
+    def __len__(self) -> int:
+        return self._frame_count if self._video is not None else len(self._frames)
+
+    def _split(self, frame: np.ndarray) -> List[np.ndarray]:
+        return [frame[y:y + h, x:x + w] for x, y, w, h in self._boxes]
+
+    def _load(self, index: int) -> List[np.ndarray]:
+        if self._video is not None:
+            if index != self._video_pos + 1:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = self._video.read()
+            if not ok:
+                return self._current[1]     # short read at the end: keep the last frame
+            self._video_pos = index
+            return self._split(frame)
+        images = []
+        for f in self._frames[index]:
+            img = cv2.imread(str(f), cv2.IMREAD_COLOR)
+            if img is None:
+                raise ValueError(f"Cannot read replay frame {f}")
+            images.append(img)
+        return images
+
+    def frame_index(self) -> int:
+        """Fotograma activo según el tiempo transcurrido desde la primera lectura."""
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        index = int((time.monotonic() - self._t0) * self.fps)
+        n = len(self)
+        return index % n if self.loop else min(index, n - 1)
+
+    def rewind(self) -> None:
+        """Vuelve al primer fotograma (el reloj arranca con la siguiente lectura)."""
+        self._t0 = None
+
+    # ───────────────────── interfaz de captura ─────────────────────
+    def monitors(self) -> Tuple[dict, ...]:
+        return self._monitors
+
+    def monitor_scale(self, mon: dict) -> float:
+        """Escala UI grabada del monitor que contiene `mon` (1.0 si no hay ninguno)."""
+        for m, scale in zip(self._monitors, self._scales):
+            if m["left"] <= mon["left"] < m["left"] + m["width"] and \
+                    m["top"] <= mon["top"] < m["top"] + m["height"]:
+                return scale
+        return 1.0
+
+    def read(self, rect: dict, color: str = "bgr") -> Optional[np.ndarray]:
+        """
+        Current frame of the monitor containing `rect`, cropped to it, as BGR
+        or gray. BGR crops are views of the decoded frame: do not write to
+        them. None if no recorded monitor contains `rect`.
+        """
+        for mi, m in enumerate(self._monitors):
+            if (m["left"] <= rect["left"] and m["top"] <= rect["top"]
+                    and rect["left"] + rect["width"] <= m["left"] + m["width"]
+                    and rect["top"] + rect["height"] <= m["top"] + m["height"]):
+                break
+        else:
+            return None
+        index = self.frame_index()
+        with self._lock:
+            if self._current[0] != index:
+                self._current = (index, self._load(index))
+            frame = self._current[1][mi]
+        # Logical rect → frame pixels (differs on Retina-style recordings)
+        fx, fy = frame.shape[1] / m["width"], frame.shape[0] / m["height"]
+        x0, y0 = int((rect["left"] - m["left"]) * fx), int((rect["top"] - m["top"]) * fy)
+        crop = frame[y0:y0 + int(rect["height"] * fy), x0:x0 + int(rect["width"] * fx)]
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if color == "gray" else crop
+
+    def close(self) -> None:
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+        self._current = (-1, [])
@@ -0,0 +1,352 @@
+"""
+run_log.py
+────────────────────────────────────────────────────────────────────────────
+Log compartido de main.py, run_module e image_engine (run-log.txt).
+
+Antes cada `log_action` abría run-log.txt, escribía una línea y lo cerraba
+en el hilo que ejecuta los pasos, y main.py y run_module no coincidían en
+dónde estaba el fichero (directorio de salida vs. cwd). Aquí:
+
+• Un único fichero, `output_dir()/run-log.txt` (junto al ejecutable en la
+  app empaquetada de macOS, el cwd en el resto de casos).
+• `log()` sólo formatea la línea y la encola: un hilo escritor junta las
+  líneas durante `_FLUSH_EVERY` segundos (o hasta `_BATCH_LINES`) y las
+  vuelca a consola y fichero con un solo write + flush, con el fichero
+  abierto durante toda la ejecución. `flush()` y las excepciones no
+  capturadas vacían el lote en el acto.
+• La cola está acotada: si el escritor se queda atrás, `log()` espera
+  hasta `_PUT_TIMEOUT` segundos en lugar de acumular memoria; si sigue
+  llena, o el hilo escritor ha muerto, la línea sale sólo por consola (y
+  `event()` la descarta) en vez de bloquear la ejecución.
+• Todo lo encolado se escribe al salir (atexit) y ante una excepción no
+  capturada, en el hilo principal o en cualquier otro, que además queda
+  registrada en el log.
+• Rotación por tamaño: al superar `max_bytes`, run-log.txt pasa a
+  run-log.txt.1 (… hasta `backups`).
+• Niveles: "debug" (detalle de cada intento de image_engine), "info",
+  "warning", "error". Nivel por defecto "debug" (todo, como antes); en
+  producción `RUN_LOG_LEVEL=info` o `"logging": {"level": "info"}` en
+  run.json quitan el detalle por intento.
+
+Sin `configure()` (p. ej. el CLI de image_engine) las líneas sólo van a
+consola.
+
+Con `configure_trace()`, `event()` escribe registros estructurados (una
+línea JSON cada uno, p. ej. la traza por paso de run_trace.py) en
+run-trace.jsonl, con otro escritor igual pero sin eco en consola.
+
+Uso
+───
+import run_log
+
+run_log.configure()                          # una vez, al arrancar
+run_log.log("RUN: Starting execution.")
+run_log.log("[attempt 03] …", run_log.DEBUG)
+"""
+from __future__ import annotations
+
+import atexit
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from typing import List, Optional
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LOG_FILENAME = "run-log.txt"
+TRACE_FILENAME = "run-trace.jsonl"
+LEVEL_ENV = "RUN_LOG_LEVEL"
+
+_QUEUE_MAX = 10_000          # líneas pendientes antes de que log() espere
+_FLUSH_EVERY = 0.5           # s que el escritor junta líneas antes de escribir
+_BATCH_LINES = 1_000         # … o hasta tantas líneas
+_PUT_TIMEOUT = 1.0           # s que log() espera con la cola llena
+_MAX_BYTES = 10 * 1024 * 1024
+_BACKUPS = 3
+_TRACE_MAX_BYTES = 50 * 1024 * 1024
+
+def output_dir() -> str:
+    """
+    Return the directory where run.json and run-log.txt should be saved.
+    - On macOS, when running as a PyInstaller “onefile” bundle, return the folder containing the executable.
+    - Otherwise (Windows or development), return the current working directory.
+    """
+    if sys.platform == "darwin" and getattr(sys, "frozen", False):
+        # On macOS “frozen” (PyInstaller), sys.executable points to:
+        #   MyApp.app/Contents/MacOS/MyApp
+        # We want the directory …/MyApp.app/Contents/MacOS/
+        return os.path.dirname(sys.executable)
+    # In Windows (and during normal “python main.py” development), use cwd
+    return os.getcwd()
+
+def _parse_level(value, default: int) -> int:
+    if value is None or value == "":
+        return default
+    if isinstance(value, int):
+        return value
+    return LEVELS.get(str(value).strip().lower(), default)
+
+# ───────────────────────────── escritor ─────────────────────────────
+class _Writer(threading.Thread):
+    """Hilo que vacía la cola a consola y fichero, por lotes."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int, console: bool = True) -> None:
+        super().__init__(name=f"run-log-writer:{os.path.basename(path)}", daemon=True)
+        self.path = path
+        self.console = console
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue: "queue.Queue" = queue.Queue(maxsize=_QUEUE_MAX)
+        self._file = None
+        self._failed = False
+
+    def _open(self) -> None:
+        try:
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._failed = False
+        except OSError as e:
+            if not self._failed:
+                print(f"ERROR writing to {self.path}: {e}", file=sys.stderr)
+            self._failed = True
+            self._file = None
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+        except OSError as e:
+            print(f"ERROR rotating {self.path}: {e}", file=sys.stderr)
+        self._open()
+
+    def _write(self, lines: List[str]) -> None:
+        text = "\n".join(lines) + "\n"
+        out = sys.stdout if self.console else None
+        if out is not None:      # None under --windowed bundles
+            try:
+                out.write(text)
+                out.flush()
+            except (OSError, ValueError):
+                pass
+        if self._file is None:
+            self._open()
+        if self._file is None:
+            return
+        try:
+            self._file.write(text)
+            self._file.flush()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"ERROR writing to {self.path}: {e}", file=sys.stderr)
+            self._file.close()
+            self._file = None
+
+    def run(self) -> None:
+        stop = False
+        while not stop:
+            lines: List[str] = []
+            waiters: List[threading.Event] = []
+            item = self.queue.get()
+            # Collect for up to _FLUSH_EVERY s (or _BATCH_LINES lines) from the
+            # first line: one write + flush per batch. flush()/stop() end it early.
+            batch_end = time.monotonic() + _FLUSH_EVERY
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, dict):
+                    # Trace events are serialised here, off the caller's thread
+                    lines.append(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+                else:
+                    lines.append(item)
+                if stop or waiters or len(lines) >= _BATCH_LINES:
+                    break
+                remaining = batch_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if lines:
+                self._write(lines)
+            for event in waiters:
+                event.set()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def put(self, item, timeout: float = _PUT_TIMEOUT) -> bool:
+        """Queue `item`; False if this thread is dead or the queue stayed full."""
+        if not self.is_alive():
+            return False
+        try:
+            self.queue.put(item, timeout=timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def flush(self, timeout: float) -> None:
+        done = threading.Event()
+        if self.put(done, timeout):
+            done.wait(timeout)
+
+    def stop(self, timeout: float) -> None:
+        if self.put(None, timeout):
+            self.join(timeout)
+
+# ───────────────────────────── API ─────────────────────────────
+_lock = threading.Lock()
+_writer: Optional[_Writer] = None
+_trace_writer: Optional[_Writer] = None
+_level = _parse_level(os.environ.get(LEVEL_ENV), DEBUG)
+_hooks_installed = False
+
+def enabled(level: int) -> bool:
+    """True si las líneas de `level` se registran (para no formatearlas en vano)."""
+    return level >= _level
+
+def set_level(level) -> None:
+    """Nivel mínimo: DEBUG/INFO/… o su nombre ("info"). RUN_LOG_LEVEL tiene prioridad."""
+    global _level
+    _level = _parse_level(os.environ.get(LEVEL_ENV), _parse_level(level, _level))
+
+def log(message: str, level: int = INFO) -> None:
+    """Queue `message` with a timestamp, for the console and run-log.txt."""
+    if level < _level:
+        return
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
+    line = f"{timestamp} | {message}"
+    writer = _writer
+    if writer is None or not writer.put(line):
+        print(line, flush=True)
+
+def configure(
+    path: Optional[str] = None,
+    level=None,
+    max_bytes: Optional[int] = None,
+    backups: Optional[int] = None,
+) -> str:
+    """
+    Start (or retarget) the file writer. `path` defaults to
+    output_dir()/run-log.txt; `level`, `max_bytes` and `backups` keep their
+    current values when omitted. Safe to call more than once. Returns the
+    log path.
+    """
+    global _writer
+    path = os.path.abspath(path or os.path.join(output_dir(), LOG_FILENAME))
+    if level is not None:
+        set_level(level)
+    with _lock:
+        old = _writer
+        if old is not None and old.path == path and old.is_alive():
+            if max_bytes is not None:
+                old.max_bytes = max_bytes
+            if backups is not None:
+                old.backups = backups
+            return path
+        _writer = _Writer(path,
+                          _MAX_BYTES if max_bytes is None else max_bytes,
+                          _BACKUPS if backups is None else backups)
+        _writer.start()
+        _ensure_hooks()
+    if old is not None:
+        old.stop(timeout=5.0)
+    return path
+
+def configure_trace(path: Optional[str] = None, enabled: bool = True) -> Optional[str]:
+    """
+    Start (or retarget / stop) the JSONL trace written by event(), on its
+    own buffered writer (no console echo). `path` defaults to
+    output_dir()/run-trace.jsonl. Returns the trace path, or None when
+    disabled.
+    """
+    global _trace_writer
+    path = os.path.abspath(path or os.path.join(output_dir(), TRACE_FILENAME)) if enabled else None
+    with _lock:
+        old = _trace_writer
+        if old is not None and old.path == path and old.is_alive():
+            return path
+        _trace_writer = None if path is None else _Writer(path, _TRACE_MAX_BYTES, _BACKUPS,
+                                                          console=False)
+        if _trace_writer is not None:
+            _trace_writer.start()
+            _ensure_hooks()
+    if old is not None:
+        old.stop(timeout=5.0)
+    return path
+
+def tracing() -> bool:
+    """True si hay un fichero de traza configurado."""
+    return _trace_writer is not None
+
+def event(record: dict) -> None:
+    """
+    Queue one trace record (one JSON line). The dict is serialised on the
+    writer thread: do not modify it afterwards. No-op without a trace;
+    dropped if the trace writer is dead or stays backed up.
+    """
+    writer = _trace_writer
+    if writer is not None:
+        writer.put(record)
+
+def flush(timeout: float = 5.0) -> None:
+    """Espera a que todo lo encolado hasta ahora (log y traza) esté escrito."""
+    for writer in (_writer, _trace_writer):
+        if writer is not None and writer.is_alive():
+            writer.flush(timeout)
+
+def shutdown(timeout: float = 5.0) -> None:
+    """Escribe lo pendiente y cierra los ficheros; log() vuelve a sólo consola."""
+    global _writer, _trace_writer
+    with _lock:
+        writers = (_writer, _trace_writer)
+        _writer = _trace_writer = None
+    for writer in writers:
+        if writer is not None and writer.is_alive():
+            writer.stop(timeout)
+
+def _ensure_hooks() -> None:
+    """Flush at exit and on crashes, once per process (called under _lock)."""
+    global _hooks_installed
+    if not _hooks_installed:
+        atexit.register(shutdown)
+        _install_crash_hooks()
+        _hooks_installed = True
+
+def _install_crash_hooks() -> None:
+    """Log uncaught exceptions (any thread) and flush before the process dies."""
+    previous_hook = sys.excepthook
+    previous_thread_hook = threading.excepthook
+
+    def excepthook(exc_type, exc, tb):
+        log("💥 Uncaught exception:\n" + "".join(traceback.format_exception(exc_type, exc, tb)).rstrip(),
+            ERROR)
+        flush()
+        previous_hook(exc_type, exc, tb)
+
+    def thread_excepthook(args):
+        if args.exc_type is not SystemExit:
+            name = args.thread.name if args.thread else "?"
+            log(f"💥 Uncaught exception in thread {name}:\n"
+                + "".join(traceback.format_exception(args.exc_type, args.exc_value,
+                                                     args.exc_traceback)).rstrip(), ERROR)
+            flush()
+        previous_thread_hook(args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
@@ -44,7 +44,17 @@ from modals import recursivity_modal
 from modals.modal_input import open_input_modal 
 from modals.image_modal import open_image_modal
 from modals.data_modal import open_data_modal
-from image_engine import find_image
+from image_engine import (connect_frame_server, disconnect_frame_server, find_all_images,
+                          find_image, find_images, last_search_rounds, start_match_pool,
+                          stop_match_pool)
+from image_memory import MEMORY_FILENAME, get_memory, set_memory_path
+from screen_capture import monitor_at
+from capture_service import start_service, stop_service
+from frame_server import DEFAULT_NAME as FRAME_SERVER_NAME, FrameServer
+from run_plan import Loop, PlanError, load_plan
+import perf_trace
+import run_log
+import run_trace
 
 import logging
 logging.getLogger("PIL").setLevel(logging.WARNING)
@@ -54,59 +64,48 @@ logging.getLogger("PIL.PngImagePlugin").setLevel(logging.WARNING)
 # Global configuration (will be loaded from run.json if it exists)
 # -----------------------------
 global_config = {}
+# Compiled (validated) form of global_config, see run_plan.py
+current_plan = None
+# Id of the run in progress, shared by its run-trace.jsonl events
+current_run_id = ""
 
 # -----------------------------
-# Logging function: prints and appends to run-log.txt
+# Logging function: prints and appends to run-log.txt (buffered, see run_log.py)
 # -----------------------------
-def log_action(message):
-    """Append a log message with timestamp to run-log.txt and print it."""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
-    log_line = f"{timestamp} | {message}"
-    with open("run-log.txt", "a", encoding="utf-8") as log_file:
-        log_file.write(log_line + "\n")
-    print(log_line,flush=True)
+def log_action(message, level=run_log.INFO):
+    """Log a message with timestamp to run-log.txt and print it."""
+    run_log.log(message, level)
+
+def _configure_logging(cfg=None):
+    """
+    Shared run-log.txt next to run.json's output directory, from run.json:
+    "logging": {"level": "info", "max_mb": 10, "backups": 3, "trace": true}
+    ("debug", the default, also logs every image_engine attempt.) With
+    "trace" (the default) every step also goes to run-trace.jsonl.
+    """
+    if not isinstance(cfg, dict):
+        cfg = {}
+    try:
+        max_bytes = int(float(cfg["max_mb"]) * 1024 * 1024) if "max_mb" in cfg else None
+        backups = int(cfg["backups"]) if "backups" in cfg else None
+    except (TypeError, ValueError) as e:
+        log_action(f"⚠️ Invalid logging settings {cfg}: {e}; using defaults")
+        max_bytes = backups = None
+    level = cfg.get("level")
+    if level is not None and str(level).strip().lower() not in run_log.LEVELS:
+        log_action(f"⚠️ Invalid logging level '{level}'; keeping the current one")
+        level = None
+    run_log.configure(level=level, max_bytes=max_bytes, backups=backups)
+    run_log.configure_trace(enabled=bool(cfg.get("trace", True)))
 
 # -----------------------------
 # Processing functions for steps
 # -----------------------------
 
-def get_clicks(value_str):
-    """Convert a numeric string or word to an integer."""
-    try:
-        # Try to convert directly if it's a numeric string
-        return int(value_str)
-    except ValueError:
-        # Otherwise, map known number words to integers
-        mapping = {
-            "one": 1,
-            "two": 2,
-            "three": 3,
-            "four": 4,
-            "five": 5,
-            "six": 6,
-            "seven": 7,
-            "eight": 8,
-            "nine": 9,
-            "ten": 10
-        }
-        return mapping.get(value_str.lower(), 1)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-def process_input_step(step_config, step_number, tab_name):
+def process_input_step(step):
     """
-    Processes an input step for either mouse or keyboard actions.
+    Processes the compiled input action of `step` (see run_plan.InputAction),
+    for either mouse or keyboard actions.
     
     For mouse input:
       • Uses `position` ("100x200") or falls back to current pointer.
@@ -212,54 +211,32 @@ def process_input_step(step_config, step_number, tab_name):
 
 
 
-    action = step_config.get("input", {})
-    log_action(f"[Tab {tab_name} | Step {step_number}] Processing input: {action}")
-    src = action.get("input_from", "").strip().lower()
+    action = step.input
+    log_action(f"[Tab {step.tab} | Step {step.number}] Processing input: {action.summary}")
 
     # ─── MOUSE ───────────────────────────────────────────────────────────────
-    if src == "mouse":
-        pos = step_config.get("position", "").strip()
-        if pos:
-            try:
-                x_str, y_str = pos.split("x")
-                x, y = int(x_str), int(y_str)
-            except:
-                x, y = pyautogui.position()
-                log_action(f"⚠️ Bad position '{pos}', using current mouse ({x},{y})")
-        else:
+    if action.mouse:
+        m = action.mouse
+        if m.point is None:
             x, y = pyautogui.position()
             log_action(f"⚠️ No position specified – using current mouse ({x},{y})")
+        elif monitor_at(*m.point) is None:
+            x, y = pyautogui.position()
+            log_action(f"⚠️ Position '{m.raw_position}' is not on any connected monitor, "
+                       f"using current mouse ({x},{y})")
+        else:
+            x, y = m.point
 
         # optional movement offset "dx×dy"
-        mv = action.get("mouse_movement", "").strip()
-        if mv:
-            try:
-                if "×" in mv:
-                    dx, dy = map(int, mv.split("×"))
-                elif "x" in mv:
-                    dx, dy = map(int, mv.split("x"))
-                else:
-                    # no separator → horizontal move only
-                    dx, dy = int(mv), 0
-
-                x += dx
-                y += dy
-                log_action(f"Moved by offset ({dx},{dy}) → ({x},{y})")
-            except Exception:
-                log_action(f"⚠️ Invalid mouse_movement '{mv}' – skipping offset")
-
-        btn = action.get("mouse_event", "Left").strip().lower()
-        if btn not in ("left", "right", "middle"):
-            log_action(f"⚠️ Invalid mouse button '{btn}', defaulting to 'left'")
-            btn = "left"
-
-        clicks = get_clicks(action.get("mouse_click_qty", "1"))
-
-        # 5) Leer intervalo entre clics (por defecto 0.2 s)
-        try:
-            intervalo = float(action.get("click_interval", "0.2") or 0.2)
-        except:
-            intervalo = 0.2
+        if m.offset:
+            dx, dy = m.offset
+            x += dx
+            y += dy
+            log_action(f"Moved by offset ({dx},{dy}) → ({x},{y})")
+
+        btn = m.button
+        clicks = m.clicks
+        intervalo = m.interval
 
         # 6) Definición de las funciones “double_click” y “triple_click” localmente,
         #    pero sólo importamos/llamamos a Quartz si estamos en macOS:
@@ -341,194 +318,241 @@ def process_input_step(step_config, step_number, tab_name):
                 pyautogui.click(x=x0, y=y0, clicks=3, interval=interval, button=button)
 
         # 7) Llamada al método correcto según número de clics:
+        with perf_trace.span("input", "input", {"mouse": btn, "clicks": clicks}):
+            if clicks == 2:
+                double_click(x, y, interval=intervalo, button=btn)
+            elif clicks == 3:
+                triple_click(x, y, interval=intervalo, button=btn)
+            else:
+                pyautogui.click(x=x, y=y, clicks=clicks, interval=intervalo, button=btn)
         if clicks == 2:
-            double_click(x, y, interval=intervalo, button=btn)
             log_action(f"Mouse double‐clicked at ({x},{y}) interval={intervalo}s")
         elif clicks == 3:
-            triple_click(x, y, interval=intervalo, button=btn)
             log_action(f"Mouse triple‐clicked at ({x},{y}) interval={intervalo}s")
         else:
-            pyautogui.click(x=x, y=y, clicks=clicks, interval=intervalo, button=btn)
             log_action(f"Mouse clicked at ({x},{y}) {clicks}× {btn} interval={intervalo}s")
 
 
     # ─── KEYBOARD ────────────────────────────────────────────────────────────
-    elif src == "keyboard":
-        text = action.get("keyboard_ascii", "").strip()
-
-        # clamp repeat to ≥1
-        try:
-            repeat = int(action.get("keyboard_repeat", "") or 1)
-        except:
-            repeat = 1
-        if repeat < 1:
-            repeat = 1
-
-        if " + " in text:
-            parts = [k.strip() for k in text.split(" + ")]
-            modifiers, keys = [], []
-            for k in parts:
-                kl = k.lower()
-                if kl in ("shift","ctrl","alt","command","meta"):
-                    modifiers.append("command" if kl in ("command","meta") else kl)
-                else:
-                    keys.append(kl)
-
-            log_action(f"Key combo {text} ×{repeat}")
-            for _ in range(repeat):
-                for mod in modifiers:
-                    pyautogui.keyDown(mod)
-                for k in keys:
-                    pyautogui.press(k)
-                    time.sleep(0.2)
-                for mod in modifiers:
-                    pyautogui.keyUp(mod)
+    elif action.keyboard:
+        k = action.keyboard
+        if k.combo:
+            log_action(f"Key combo {k.text} ×{k.repeat}")
+            with perf_trace.span("input", "input", {"keys": k.text, "repeat": k.repeat}):
+                for _ in range(k.repeat):
+                    for mod in k.modifiers:
+                        pyautogui.keyDown(mod)
+                    for key in k.keys:
+                        pyautogui.press(key)
+                        time.sleep(0.2)
+                    for mod in k.modifiers:
+                        pyautogui.keyUp(mod)
 
         else:
-            key = text.lower()
-            log_action(f"Key press {key} ×{repeat}")
-            for _ in range(repeat):
-                pyautogui.press(key)
+            key = k.keys[0]
+            log_action(f"Key press {key} ×{k.repeat}")
+            with perf_trace.span("input", "input", {"keys": key, "repeat": k.repeat}):
+                for _ in range(k.repeat):
+                    pyautogui.press(key)
 
     else:
         log_action("Input step: Unknown input_from, skipping.")
+        run_trace.set_outcome("skipped")
 
     # ─── SLEEP ────────────────────────────────────────────────────────────────
-    try:
-        sleep_after = float(action.get("input_sleep", "0") or 0)
-    except:
-        sleep_after = 0
-    if sleep_after > 0:
-        log_action(f"Waiting {sleep_after}s after input.")
-        time.sleep(sleep_after)
+    if action.sleep_after > 0:
+        log_action(f"Waiting {action.sleep_after}s after input.")
+        run_trace.sleep(action.sleep_after)
 
 
-def process_image_step(step_config, step_number, tab_name):
+def process_image_step(step):
     """
-    Executes one “image” step using our new image_engine:
+    Executes the compiled “image” action of `step` (run_plan.ImageAction)
+    using our new image_engine:
       • Captures a debug screenshot via PyAutoGUI (all-monitors stitch).
       • Calls find_image() to locate the template on any monitor.
       • Optionally waits before clicking, then moves & clicks.
       • Sleeps afterwards if requested.
+
+    With `image_alternatives` (a list of {"image_path": ..., "then_steps":
+    "12,13"}) the step waits for whichever of image_path / the alternatives
+    appears first (one capture per monitor for all of them, via
+    find_images), acts on it, and then runs that alternative's
+    `then_steps` before continuing.
+
+    With `image_click_all` every instance on screen is clicked (one capture,
+    via find_all_images); with `image_match_index` = N only the Nth one.
+    Instances are numbered in `image_match_order` ("reading" by default:
+    top→bottom, left→right; or "score").
+
+    `image_matcher` picks the backend for a single-image search: "template"
+    (default, confidence × scale ladder) or "orb" / "akaze" (keypoints,
+    any scale).
     """
     # 1) debug screenshot
     # dbg = pyautogui.screenshot()
     # dbg.save("debug_screenshot.png")
 
-    action = step_config.get("image", {})
-    log_action(f"[Tab {tab_name} | Step {step_number}] IMAGE → {action}")
-
-    img_path = action.get("image_path", "")
-    if not img_path:
-        log_action("⚠️ Image step: No image_path specified.")
-        return
-
-    # parse params
-    try:
-        conf = float(action.get("image_confidence", 1.0))
-    except:
-        log_action("⚠️ Invalid image_confidence; defaulting to 1.0")
-        conf = 1.0
-
-    try:
-        to = float(action.get("image_timeout", 0))
-    except:
-        log_action("⚠️ Invalid image_timeout; defaulting to 0")
-        to = 0
-
-    # 2) locate via our engine
-    loc = find_image(
-        img_path,
-        base_confidence=conf,
-        timeout=None if to <= 0 else to,
-        poll_every=0.5,
-        max_attempts=20
-    )
+    action = step.image
+    log_action(f"[Tab {step.tab} | Step {step.number}] IMAGE → {action.summary}")
+
+    img_path = action.image_path
+    alternatives = action.alternatives
+    conf = action.confidence
+    to = action.timeout_s
+    match_index = action.match_index
+
+    # 2) locate via our engine (time spent searching counts as waiting)
+    branch = None
+    targets = None
+    t_search = time.perf_counter()
+    if (action.click_all or match_index > 0) and img_path:
+        matches = find_all_images(
+            img_path,
+            base_confidence=conf,
+            timeout=action.timeout,
+            poll_every=0.5,
+            order=action.match_order,
+            color_mode=action.color_mode,
+        )
+        if action.click_all:
+            targets = matches
+        elif match_index <= len(matches):
+            targets = [matches[match_index - 1]]
+        else:
+            log_action(f"⚠️ Only {len(matches)} match(es) found; no match #{match_index}")
+            targets = []
+        loc = targets[0] if targets else None
+    elif alternatives:
+        candidates = ([img_path] if img_path else []) + [a.image_path for a in alternatives]
+        found = find_images(
+            candidates,
+            mode="any",
+            base_confidence=conf,
+            timeout=action.timeout,
+            poll_every=0.5,
+            max_attempts=20,
+            color_mode=action.color_mode,
+        )
+        matched = next((c for c in candidates if found.get(c)), None)
+        loc = found[matched] if matched else None
+        branch = next((a for a in alternatives if a.image_path == matched), None)
+        if matched:
+            log_action(f"🔀 Matched '{matched}'" + (" (alternative)" if branch else ""))
+    else:
+        loc = find_image(
+            img_path,
+            base_confidence=conf,
+            timeout=action.timeout,
+            poll_every=0.5,
+            max_attempts=20,
+            color_mode=action.color_mode,
+            matcher=action.matcher,
+        )
+    run_trace.add_wait(time.perf_counter() - t_search, last_search_rounds())
     if not loc:
         log_action(f"⚠️ Image not found within timeout ({to}s) at confidence≥{conf}")
+        run_trace.set_outcome("not_found")
         return
 
-    x, y, w, h, mon_idx = loc
-    log_action(f"✅ Found on monitor {mon_idx} → logical=({x},{y}) size=({w}×{h})")
+    if targets is None:
+        targets = [loc]
+    for x, y, w, h, mon_idx in targets:
+        log_action(f"✅ Found on monitor {mon_idx} → logical=({x},{y}) size=({w}×{h})")
 
     # 3) optional pre-click wait
-    if action.get("image_wait", False):
-        try:
-            ws = float(action.get("image_wait_sleep", 0))
-        except:
-            ws = 0
-        log_action(f"Waiting {ws}s before click…")
-        time.sleep(ws)
-
-    # 4) move & click
-    center_x = x + w//2
-    center_y = y + h//2
-    pyautogui.moveTo(center_x, center_y)
-    log_action(f"Moved mouse to ({center_x},{center_y})")
-
-    if action.get("image_click", False):
-        btn = action.get("image_click_LR", "Left").lower()
-        btn = "left" if btn == "left" else "right"
-        try:
-            clicks = int(action.get("mouse_click_qty", 1))
-        except:
-            clicks = get_clicks(action.get("mouse_click_qty", "1"))
-        pyautogui.click(clicks=clicks, button=btn)
-        log_action(f"Clicked {clicks}× {btn} at ({center_x},{center_y})")
-    else:
-        log_action("❎ image_click flag is False — no click performed.")
+    if action.wait_before is not None:
+        log_action(f"Waiting {action.wait_before}s before click…")
+        run_trace.sleep(action.wait_before)
+
+    # 4) move & click (every selected match, in order)
+    for x, y, w, h, mon_idx in targets:
+        center_x = x + w//2
+        center_y = y + h//2
+        with perf_trace.span("input", "input", {"move": (center_x, center_y)}):
+            pyautogui.moveTo(center_x, center_y)
+        log_action(f"Moved mouse to ({center_x},{center_y})")
+
+        if action.click:
+            with perf_trace.span("input", "input", {"mouse": action.button, "clicks": action.clicks}):
+                pyautogui.click(clicks=action.clicks, button=action.button)
+            log_action(f"Clicked {action.clicks}× {action.button} at ({center_x},{center_y})")
+        else:
+            log_action("❎ image_click flag is False — no click performed.")
 
     # 5) post-click sleep
+    if action.sleep_after > 0:
+        log_action(f"Sleeping {action.sleep_after}s after click…")
+        run_trace.sleep(action.sleep_after)
+
+    # 6) branch: run the steps attached to the alternative that matched
+    if branch and branch.then_steps:
+        run_branch_steps(branch.then_steps, f"[Tab {step.tab} | Step {step.number}]")
+
+_MAX_BRANCH_DEPTH = 10
+_branch_depth = 0
+
+def run_branch_steps(wanted, origin):
+    """Run the step numbers in `wanted` ("12", "13") in numeric order, as a branch of `origin`."""
+    global _branch_depth
+    if _branch_depth >= _MAX_BRANCH_DEPTH:
+        log_action(f"⚠️ {origin} Branch depth {_MAX_BRANCH_DEPTH} reached; not running steps {', '.join(wanted)}")
+        return
+
+    log_action(f"{origin} Branch → steps {', '.join(wanted)}")
+    _branch_depth += 1
     try:
-        ss = float(action.get("image_sleep", 0))
-    except:
-        ss = 0
-    if ss > 0:
-        log_action(f"Sleeping {ss}s after click…")
-        time.sleep(ss)
-
-def process_data_step(step_config, step_number, tab_name):
+        # then_steps were checked against the plan when it was compiled
+        for num in sorted(wanted, key=int):
+            process_step(current_plan.steps[str(int(num))])
+    finally:
+        _branch_depth -= 1
+
+def process_data_step(step):
     """
-    Process a 'data' step by operating on an Excel file.
-    Expected configuration keys:
+    Process the compiled 'data' action of `step` (run_plan.DataAction) by
+    operating on an Excel file. Configuration keys:
       - data_path: The Excel file path.
       - data_cell: The cell (e.g., "A3") to operate on.
       - data_copy_paste: "Paste To" or "Copy From".
       - data_select_all: Boolean; if True, simulate a 'select all' keystroke.
       - Optionally, data_sheet to specify the sheet name.
     """
-    action = step_config.get("data", {})
+    action = step.data
+    tab_name, step_number = step.tab, step.number
     # Log the incoming configuration for this data step:
-    log_action(f"[Tab {tab_name} | Step {step_number}] Processing data: {action}")
+    log_action(f"[Tab {tab_name} | Step {step_number}] Processing data: {action.summary}")
 
-    # 1) Extract fields from action:
-    file_path = action.get("data_path", "").strip()
-    cell = action.get("data_cell", "").strip()
-    copy_paste_action = action.get("data_copy_paste", "").strip()
-    select_all = action.get("data_select_all", False)
-    sheet_name = action.get("data_sheet", None)
+    file_path = action.path
+    cell = action.cell
+    sheet_name = action.sheet
 
     # 2) If no data_path → skip immediately
     if not file_path:
         log_action(f"[Tab {tab_name} | Step {step_number}] Skipping data: no data_path provided.")
+        run_trace.set_outcome("skipped")
         return
 
     # 3) If the file_path does not exist on disk → skip and log
     if not os.path.exists(file_path):
         log_action(f"[Tab {tab_name} | Step {step_number}] Skipping data: file not found → {file_path}")
+        run_trace.set_outcome("skipped")
         return
 
     # 4) Attempt to open the workbook. If it's locked/open in Excel on Windows,
     #    load_workbook(...) may raise PermissionError or a generic OSError(errno=13).
     try:
-        wb = load_workbook(file_path)
+        with perf_trace.span("excel load", "excel", {"path": file_path}):
+            wb = load_workbook(file_path)
     except Exception as e:
         # If it's a permission‐denied error (errno 13), treat as “file open/locked”:
         if isinstance(e, PermissionError) or (isinstance(e, OSError) and getattr(e, "errno", None) == 13):
             log_action(f"[Tab {tab_name} | Step {step_number}] ERROR XLSX FILE OPEN: {file_path}")
+            run_trace.set_outcome("error")
             return
         # Any other error opening the workbook:
         log_action(f"[Tab {tab_name} | Step {step_number}] Error processing data step: {e}")
+        run_trace.set_outcome("error")
         return
 
     # 5) If we reached here, the workbook opened successfully.
@@ -538,21 +562,28 @@ def process_data_step(step_config, step_number, tab_name):
             sheet_name = wb.sheetnames[0]
         if sheet_name not in wb.sheetnames:
             log_action(f"[Tab {tab_name} | Step {step_number}] Sheet '{sheet_name}' not found in {file_path}.")
+            run_trace.set_outcome("error")
             return
 
         sheet = wb[sheet_name]
 
         # 5.b) Perform “Paste To” or “Copy From”
-        if copy_paste_action.lower() == "paste to":
+        if action.mode not in ("paste to", "copy from"):
+            log_action(f"[Tab {tab_name} | Step {step_number}] Data step: Unknown data_copy_paste "
+                       f"action '{action.mode}'.")
+            run_trace.set_outcome("skipped")
+            return
+        if action.mode == "paste to":
             clipboard_value = pyperclip.paste()
             sheet[cell].value = clipboard_value
-            wb.save(file_path)
+            with perf_trace.span("excel save", "excel", {"path": file_path}):
+                wb.save(file_path)
             log_action(
                 f"[Tab {tab_name} | Step {step_number}] Pasted clipboard value '{clipboard_value}' "
                 f"into cell {cell} on '{sheet_name}' of {file_path}."
             )
 
-        elif copy_paste_action.lower() == "copy from":
+        else:
             cell_value = sheet[cell].value
             pyperclip.copy(str(cell_value))
             log_action(
@@ -560,14 +591,8 @@ def process_data_step(step_config, step_number, tab_name):
                 f"on '{sheet_name}' of {file_path} to clipboard."
             )
 
-        else:
-            # If the user provided an unrecognized action, log and skip
-            log_action(
-                f"[Tab {tab_name} | Step {step_number}] Data step: Unknown data_copy_paste action '{copy_paste_action}'."
-            )
-
         # 5.c) If data_select_all is True, simulate a “select all” keystroke
-        if select_all:
+        if action.select_all:
             if sys.platform == "darwin":
                 pyautogui.hotkey("command", "a")
             else:
@@ -577,92 +602,263 @@ def process_data_step(step_config, step_number, tab_name):
     except Exception as e:
         # If any error occurs while reading/writing cells or saving, log it here:
         log_action(f"[Tab {tab_name} | Step {step_number}] Error processing data step: {e}")
+        run_trace.set_outcome("error")
         return
 
-def process_position_step(step_config, step_number, tab_name):
-    pos = step_config.get("position", "")
-    log_action(f"[Tab {tab_name} | Step {step_number}] Processing position: {pos}")
-    if pos:
-        try:
-            x_str, y_str = pos.split("x")
-            x, y = int(x_str), int(y_str)
+def process_position_step(step):
+    pos = step.position
+    log_action(f"[Tab {step.tab} | Step {step.number}] Processing position: {pos.raw}")
+    if pos.point:
+        x, y = pos.point
+        mon_idx = monitor_at(x, y)
+        if mon_idx is None:
+            log_action(f"⚠️ Position ({x}, {y}) is not on any connected monitor; not moving.")
+            return
+        with perf_trace.span("input", "input", {"move": (x, y)}):
             pyautogui.moveTo(x, y)
-            log_action(f"Moved mouse to ({x}, {y}).")
-        except Exception as e:
-            log_action(f"Error processing position: {e}")
+        log_action(f"Moved mouse to ({x}, {y}) on monitor {mon_idx}.")
     else:
         log_action("Position step: No position provided.")
 
-def process_step(tab_name, step_number, step_config):
-    if "position" in step_config:
-        process_position_step(step_config, step_number, tab_name)
-    if "input" in step_config:
-        process_input_step(step_config, step_number, tab_name)
-    if "image" in step_config:
-        process_image_step(step_config, step_number, tab_name)
-    if "data" in step_config:
-        data_conf = step_config["data"]
-        data_path = data_conf.get("data_path", "").strip()
-        if data_path:
-            process_data_step(step_config, step_number, tab_name)
-        else:
-            log_action(f"[{tab_name} | Step {step_number}] Skipping data: no data_path provided.")
-
-def process_recursivity(rec_config):
-    r_steps_str = rec_config.get("r_steps", "")
-    r_repeat = rec_config.get("r_repeat", 1)
-    if not r_steps_str:
-        log_action("Recursivity: No steps specified.")
-        return
-    steps_to_repeat = [s.strip() for s in r_steps_str.split(",") if s.strip()]
-    log_action(f"Recursivity: Repeating steps {', '.join(steps_to_repeat)} {r_repeat} times")
-    for rep in range(1, r_repeat + 1):
-        log_action(f"Recursivity iteration {rep} started.")
-        for tab_name, steps in global_config.get("tab_n", {}).items():
-            for step_key, step_config in steps.items():
-                step_num = step_key.split("_")[1]
-                if step_num in steps_to_repeat:
-                    process_step(tab_name, step_num, step_config)
-        log_action(f"Recursivity iteration {rep} completed.")
+def process_step(step):
+    """
+    Run one compiled run_plan.Step: position, input, image and data, in that
+    order, as one "step" event of the run trace (run_trace.py).
+    """
+    with run_trace.step_span(current_run_id, step.tab, step.number, step.kind), \
+            perf_trace.span(f"step {step.number}", "step", {"tab": step.tab, "type": step.kind}):
+        if step.position:
+            process_position_step(step)
+        if step.input:
+            process_input_step(step)
+        if step.image:
+            if step.image.image_path or step.image.alternatives:
+                process_image_step(step)
+            else:
+                log_action(f"[{step.tab} | Step {step.number}] Skipping image: no image_path provided.")
+                run_trace.set_outcome("skipped")
+        if step.data:
+            if step.data.path:
+                process_data_step(step)
+            else:
+                log_action(f"[{step.tab} | Step {step.number}] Skipping data: no data_path provided.")
+                run_trace.set_outcome("skipped")
+
+# (loop label, iteration, seconds) of every recursivity iteration of the last run
+recursivity_timings = []
+
+def _run_loop(loop, depth=0):
+    indent = "  " * depth
+    durations = []
+    for rep in range(1, loop.repeat + 1):
+        log_action(f"{indent}Recursivity {loop.label} iteration {rep}/{loop.repeat} started.")
+        t0 = time.perf_counter()
+        for item in loop.body:
+            if isinstance(item, Loop):
+                _run_loop(item, depth + 1)
+            else:
+                process_step(item)
+        elapsed = time.perf_counter() - t0
+        durations.append(elapsed)
+        recursivity_timings.append((loop.label, rep, elapsed))
+        log_action(f"{indent}Recursivity {loop.label} iteration {rep}/{loop.repeat} "
+                   f"completed in {elapsed:.2f}s.")
+    if len(durations) > 1:
+        log_action(f"{indent}Recursivity {loop.label}: {len(durations)} iterations, "
+                   f"min {min(durations):.2f}s / avg {sum(durations) / len(durations):.2f}s / "
+                   f"max {max(durations):.2f}s")
+
+def process_recursivity(rec):
+    """
+    Run the compiled recursivity loop (run_plan.Loop): its steps in numeric
+    order `rec.repeat` times, nested loops included. Each iteration's wall
+    time is logged and kept in `recursivity_timings`.
+    """
+    recursivity_timings.clear()
+    log_action(f"Recursivity: Repeating steps {', '.join(rec.step_numbers())} {rec.repeat} times")
+    _run_loop(rec)
 
 # -----------------------------
 # Main processing function (run the script)
 # -----------------------------
 
-def run_from_json(config_path: str):
-    """
-    Load the JSON at config_path into global_config,
-    then call run_script() exactly as if this module were run as a subprocess.
+def _use_image_memory_next_to(config_path: str):
+    """Keep image_engine's last-hit index (image_hits.json) next to run.json."""
+    memory_path = os.path.join(os.path.dirname(os.path.abspath(config_path)), MEMORY_FILENAME)
+    set_memory_path(memory_path)
+    log_action(f"Image memory: {memory_path}")
 
-    This replace the origina subprocess due to pyinstaller problem
+def _start_capture_service(cfg):
+    """
+    Optional background capture for image steps, from run.json:
+    "capture_service": {"fps": 10, "max_mb": 512, "idle_s": 10, "slots": 3}
     """
+    if not isinstance(cfg, dict) or not cfg.get("enabled", True):
+        return False
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-        # Replace or update the module‐level global_config:
-        global global_config
-        global_config = cfg
-        log_action(f"Loaded configuration from {config_path}")
+        start_service(
+            fps=float(cfg.get("fps", 10)),
+            slots=int(cfg.get("slots", 3)),
+            max_bytes=int(float(cfg.get("max_mb", 512)) * 1024 * 1024),
+            idle_s=float(cfg.get("idle_s", 10)),
+        )
+    except (TypeError, ValueError) as e:
+        log_action(f"⚠️ Invalid capture_service settings {cfg}: {e}; capturing on demand")
+        return False
+    log_action(f"Capture service: {cfg}")
+    return True
+
+def _start_frame_server(cfg):
+    """
+    Shared-memory frames for image steps, from run.json:
+    "frame_server": {"name": "ie-frames", "serve": true, "fps": 10, "slots": 4}
+    With "serve" this run publishes the frames itself (so image_engine CLIs
+    can attach too); otherwise it attaches to an already running server.
+    Returns the FrameServer started here, True if only attached, or None.
+    """
+    if not isinstance(cfg, dict) or not cfg.get("enabled", True):
+        return None
+    name = str(cfg.get("name", FRAME_SERVER_NAME))
+    server = None
+    if cfg.get("serve", False):
+        try:
+            server = FrameServer(name, float(cfg.get("fps", 10)), int(cfg.get("slots", 4))).start()
+        except (TypeError, ValueError) as e:
+            log_action(f"⚠️ Invalid frame_server settings {cfg}: {e}; capturing locally")
+            return None
+        # Give the server a moment to publish the layout and first frames
+        for _ in range(20):
+            if connect_frame_server(name):
+                break
+            time.sleep(0.05)
+        else:
+            log_action(f"⚠️ Frame server '{name}' did not start; capturing locally")
+            server.stop()
+            return None
+    elif not connect_frame_server(name):
+        log_action(f"⚠️ No frame server '{name}' running; capturing locally")
+        return None
+    log_action(f"Frame server: {name}" + (" (serving)" if server else " (attached)"))
+    return server or True
+
+def _start_match_pool(cfg, frame_cfg, frames):
+    """
+    Optional process-pool matching for image steps, from run.json:
+    "match_pool": {"workers": 8}
+    Workers read frames from the frame server; without a "frame_server"
+    block this run serves one itself ("fps" here sets its rate). The pool
+    starts once, here, and serves every step of the run.
+    Returns (pool_started, frames) with `frames` as from _start_frame_server.
+    """
+    if not isinstance(cfg, dict) or not cfg.get("enabled", True):
+        return False, frames
+    if not frames:
+        frame_cfg = {"serve": True, "fps": cfg.get("fps", 10)}
+        frames = _start_frame_server(frame_cfg)
+        if not frames:
+            log_action("⚠️ Match pool needs a frame server; matching in-process")
+            return False, frames
+    name = str((frame_cfg or {}).get("name", FRAME_SERVER_NAME))
+    try:
+        workers = int(cfg["workers"]) if cfg.get("workers") else None
+    except (TypeError, ValueError) as e:
+        log_action(f"⚠️ Invalid match_pool settings {cfg}: {e}; matching in-process")
+        return False, frames
+    if not start_match_pool(workers, name):
+        log_action(f"⚠️ Match pool could not attach to frame server '{name}'; matching in-process")
+        return False, frames
+    log_action(f"Match pool: {cfg}")
+    return True, frames
+
+def _load_plan(config_path: str):
+    """
+    Load and compile the run.json at config_path into global_config /
+    current_plan. Returns False, after logging every problem, if the
+    configuration does not compile; exits on an unreadable file.
+    """
+    global global_config, current_plan
+    _configure_logging()
+    try:
+        cfg, plan, reused = load_plan(config_path)
+    except PlanError as e:
+        log_action(f"❌ {config_path} has {len(e.errors)} error(s); nothing was run:")
+        for err in e.errors:
+            log_action(f"   • {err}")
+        return False
     except Exception as e:
         log_action(f"Error loading configuration from {config_path}: {e}")
         sys.exit(1)
+    # Replace or update the module‐level global_config:
+    global_config, current_plan = cfg, plan
+    _configure_logging(cfg.get("logging"))
+    log_action(f"Loaded configuration from {config_path}"
+               + (" (compiled plan reused)" if reused else ""))
+    for warning in plan.warnings:
+        log_action(f"⚠️ {warning}")
+    _use_image_memory_next_to(config_path)
+    return True
+
+def run_from_json(config_path: str):
+    """
+    Load the JSON at config_path into global_config, compile it,
+    then call run_script() exactly as if this module were run as a subprocess.
+    Returns False, without running anything, if the configuration does not
+    compile (the errors are in the log); True once the run has finished.
 
+    This replace the origina subprocess due to pyinstaller problem
+    """
+    if not _load_plan(config_path):
+        return False
     # Now invoke the same runner you already have:
-    run_script()    
+    run_script()
+    return True
+
 
 
+def _save_perf_trace():
+    """Write this run's spans (see perf_trace.py) when span tracing is on."""
+    try:
+        path = perf_trace.save(current_run_id)
+    except OSError as e:
+        log_action(f"⚠️ Could not write the performance trace: {e}")
+        return
+    if path:
+        log_action(f"Performance trace (open in ui.perfetto.dev): {path}")
 
 def run_script():
-    log_action("RUN: Starting execution.")
-    for tab_name in sorted(global_config.get("tab_n", {}).keys(), key=lambda t: int(t.split()[1])):
-        log_action(f"RUN: Processing {tab_name}")
-        steps = global_config["tab_n"][tab_name]
-        for step_key in sorted(steps.keys(), key=lambda x: int(x.split('_')[1])):
-            step_num = step_key.split("_")[1]
-            step_config = steps[step_key]
-            process_step(tab_name, step_num, step_config)
-    if "recursivity" in global_config:
-        process_recursivity(global_config["recursivity"])
+    global current_run_id
+    current_run_id = run_trace.new_run_id()
+    run_start, outcome = time.time(), "error"
+    log_action(f"RUN: Starting execution. (run {current_run_id})")
+    service = _start_capture_service(global_config.get("capture_service"))
+    frames = _start_frame_server(global_config.get("frame_server"))
+    pool, frames = _start_match_pool(global_config.get("match_pool"),
+                                     global_config.get("frame_server"), frames)
+    try:
+        with perf_trace.span("run", "run", {"run_id": current_run_id}):
+            for tab_name, steps in current_plan.tabs:
+                log_action(f"RUN: Processing {tab_name}")
+                with perf_trace.span(tab_name, "tab"):
+                    for step in steps:
+                        process_step(step)
+            if current_plan.recursivity:
+                with perf_trace.span("recursivity", "tab"):
+                    process_recursivity(current_plan.recursivity)
+            elif "recursivity" in global_config:
+                log_action("Recursivity: No steps specified.")
+        outcome = "ok"
+    finally:
+        run_trace.run_event(current_run_id, run_start, outcome)
+        _save_perf_trace()
+        get_memory().save()     # hits are only kept in RAM while the steps run
+        if pool:
+            stop_match_pool()
+        if frames:
+            disconnect_frame_server()
+            if isinstance(frames, FrameServer):
+                frames.stop()
+        if service:
+            stop_service()
     log_action("RUN: Execution completed.")
 
 # -----------------------------
@@ -688,15 +884,18 @@ def run_and_rename():
         log_action(f"RUN: Error executing run_module.py: {e}")
         return
 
+    config_path = run_filename
     try:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         new_filename = f"run_{timestamp}.json"
         os.rename(run_filename, new_filename)
+        config_path = new_filename
         log_action(f"RUN: Configuration file renamed to {new_filename}.")
     except Exception as e:
         log_action(f"RUN: Failed to rename run.json: {e}")
 
-    run_script()
+    if _load_plan(config_path):
+        run_script()
 
 # -----------------------------
 # Main entry point (for the run module)
@@ -708,16 +907,9 @@ def main():
     else:
         config_file = sys.argv[1]
         
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config = json.load(f)
-            global global_config
-            global_config = config
-        log_action(f"Loaded configuration from {config_file}")
-    except Exception as e:
-        log_action(f"Error loading configuration from {config_file}: {e}")
+    if not _load_plan(config_file):
         sys.exit(1)
-    
+
     # Now call the processing function to execute the steps.
     run_script()
 
@@ -0,0 +1,560 @@
+"""
+run_plan.py
+────────────────────────────────────────────────────────────────────────────
+Compila la configuración de run.json en un plan de ejecución tipado e
+inmutable, en una sola pasada y antes de mover el ratón.
+
+Sin el plan, run_module ordenaba pestañas y pasos en cada ejecución y cada
+`process_*_step` volvía a interpretar cadenas ("100x200", "dx×dy",
+confianza, timeouts, número de clics…) justo antes de actuar: un valor mal
+escrito sólo aparecía a mitad de la ejecución. Aquí:
+
+• Cada paso se convierte en un `Step` con sus acciones ya interpretadas
+  (`PositionAction`, `InputAction`, `ImageAction`, `DataAction`): el bucle
+  de ejecución no interpreta nada.
+• Se recogen todos los errores de la configuración y se lanzan juntos en un
+  `PlanError` (p. ej. "Tab 1 / step 3: image_confidence 'x' is not a
+  number"). Un campo vacío toma el valor por defecto de siempre; un valor
+  que no se puede interpretar es un error. Una acción sin rellenar (modal
+  aceptado sin imagen ni fichero) o una opción desconocida no lo son: el
+  paso se salta o usa la opción por defecto, con un aviso, como antes.
+• Los avisos (no impiden ejecutar) quedan en `Plan.warnings`.
+• `recursivity` se compila en un `Loop`: la lista ordenada de pasos a
+  repetir, con rangos ("3-7") y bucles anidados ("1,(3-5)x4").
+• `load_plan(path)` guarda el último plan compilado: las repeticiones de un
+  mismo run.json (mismo contenido) lo reutilizan sin volver a compilar.
+
+Uso
+───
+from run_plan import PlanError, load_plan
+
+try:
+    config, plan, reused = load_plan("run.json")
+except PlanError as e:
+    for err in e.errors: print(err)
+for tab, steps in plan.tabs:
+    for step in steps: …
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from types import MappingProxyType
+from typing import Iterator, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from image_engine import COLOR_MODES, MATCH_ORDERS, MATCHERS
+
+_CLICK_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_MODIFIERS = ("shift", "ctrl", "alt", "command", "meta")
+_MOUSE_BUTTONS = ("left", "right", "middle")
+_DATA_MODES = ("paste to", "copy from")
+_CELL_RE = re.compile(r"^[A-Za-z]{1,3}[1-9][0-9]*$")
+
+class PlanError(ValueError):
+    """La configuración tiene errores; `errors` los lista todos."""
+
+    def __init__(self, errors: List[str]) -> None:
+        self.errors = list(errors)
+        super().__init__(f"{len(self.errors)} error(s) in run configuration:\n  "
+                         + "\n  ".join(self.errors))
+
+# ───────────────────────────── acciones ─────────────────────────────
+class PositionAction(NamedTuple):
+    point: Optional[Tuple[int, int]]        # None: el paso no trae posición
+    raw: str
+
+class MouseInput(NamedTuple):
+    point: Optional[Tuple[int, int]]        # None: posición actual del puntero
+    raw_position: str
+    offset: Optional[Tuple[int, int]]       # "dx×dy" ya interpretado
+    button: str
+    clicks: int
+    interval: float
+
+class KeyboardInput(NamedTuple):
+    text: str
+    combo: bool                             # "Ctrl + C": modificadores + teclas
+    modifiers: Tuple[str, ...]
+    keys: Tuple[str, ...]
+    repeat: int
+
+class InputAction(NamedTuple):
+    mouse: Optional[MouseInput]
+    keyboard: Optional[KeyboardInput]       # ambos None: input_from desconocido
+    sleep_after: float
+    summary: str                            # para el log, como el dict original
+
+class Alternative(NamedTuple):
+    image_path: str
+    then_steps: Tuple[str, ...]
+
+class ImageAction(NamedTuple):
+    image_path: str                         # "" sin alternativas → el paso se salta
+    alternatives: Tuple[Alternative, ...]
+    confidence: float
+    timeout: Optional[float]                # None: esperar sin límite
+    timeout_s: float                        # valor configurado (0 = sin límite)
+    color_mode: str
+    matcher: str
+    click_all: bool
+    match_index: int
+    match_order: str
+    wait_before: Optional[float]            # None: sin espera previa
+    click: bool
+    button: str
+    clicks: int
+    sleep_after: float
+    summary: str
+
+class DataAction(NamedTuple):
+    path: str                               # "" → el paso se salta
+    cell: str
+    mode: str                               # "paste to" / "copy from"; otro → se salta
+    select_all: bool
+    sheet: Optional[str]
+    summary: str
+
+class Step(NamedTuple):
+    tab: str
+    number: str
+    position: Optional[PositionAction]
+    input: Optional[InputAction]
+    image: Optional[ImageAction]
+    data: Optional[DataAction]
+    kind: str                               # "image+input"…, para la traza
+
+class Loop(NamedTuple):
+    """Un bucle de recursivity: `body` (pasos y bucles anidados) `repeat` veces."""
+    body: Tuple[Union[Step, "Loop"], ...]
+    repeat: int
+    label: str                              # p. ej. "(3-5)x4", para el log
+
+    def step_numbers(self) -> Tuple[str, ...]:
+        return tuple(n for item in self.body
+                     for n in (item.step_numbers() if isinstance(item, Loop) else (item.number,)))
+
+class Plan(NamedTuple):
+    tabs: Tuple[Tuple[str, Tuple[Step, ...]], ...]     # en orden numérico
+    steps: Mapping[str, Step]                           # número de paso → Step
+    recursivity: Optional[Loop]
+    warnings: Tuple[str, ...]
+
+    def iter_steps(self) -> Iterator[Step]:
+        for _, steps in self.tabs:
+            yield from steps
+
+# ───────────────────────────── compilación ─────────────────────────────
+class _Compiler:
+    def __init__(self) -> None:
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.where = ""
+
+    def error(self, msg: str) -> None:
+        self.errors.append(f"{self.where}: {msg}" if self.where else msg)
+
+    def warn(self, msg: str) -> None:
+        self.warnings.append(f"{self.where}: {msg}" if self.where else msg)
+
+    # ── valores sueltos ──
+    @staticmethod
+    def _text(value) -> str:
+        return "" if value is None else str(value).strip()
+
+    def number(self, action: dict, key: str, default: float, minimum: float = 0.0) -> float:
+        raw = self._text(action.get(key))
+        if not raw:
+            return default
+        try:
+            value = float(raw)
+        except ValueError:
+            self.error(f"{key} {raw!r} is not a number")
+            return default
+        if value < minimum:
+            self.error(f"{key} {raw!r} must be ≥ {minimum:g}")
+            return default
+        return value
+
+    def integer(self, action: dict, key: str, default: int) -> int:
+        raw = self._text(action.get(key))
+        if not raw:
+            return default
+        try:
+            return int(raw)
+        except ValueError:
+            self.error(f"{key} {raw!r} is not a whole number")
+            return default
+
+    def clicks(self, action: dict, key: str = "mouse_click_qty") -> int:
+        raw = self._text(action.get(key))
+        if not raw:
+            return 1
+        if raw.isdigit():
+            return int(raw)
+        if raw.lower() in _CLICK_WORDS:
+            return _CLICK_WORDS[raw.lower()]
+        self.error(f"{key} {raw!r} is not a click count")
+        return 1
+
+    def choice(self, action: dict, key: str, default: str, choices: Tuple[str, ...]) -> str:
+        value = self._text(action.get(key)).lower() or default
+        if value not in choices:
+            # Switch values saved by older modals: fall back as the runner always did
+            self.warn(f"{key} {value!r} is not one of {', '.join(choices)}; using {default!r}")
+            return default
+        return value
+
+    def point(self, raw: str, key: str = "position") -> Optional[Tuple[int, int]]:
+        parts = raw.split("x")
+        try:
+            x, y = (int(p) for p in parts)
+        except ValueError:
+            self.error(f"{key} {raw!r} is not 'XxY' (e.g. 100x200)")
+            return None
+        return x, y
+
+    def offset(self, raw: str) -> Optional[Tuple[int, int]]:
+        try:
+            if "×" in raw:
+                dx, dy = map(int, raw.split("×"))
+            elif "x" in raw:
+                dx, dy = map(int, raw.split("x"))
+            else:
+                dx, dy = int(raw), 0       # sin separador → sólo horizontal
+        except ValueError:
+            self.error(f"mouse_movement {raw!r} is not 'dx×dy'")
+            return None
+        return dx, dy
+
+    def section(self, conf: dict, key: str) -> dict:
+        """conf[key] as an action dict ({} for null); an error if it is anything else."""
+        value = conf[key]
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            self.error(f"{key} {value!r} is not an object")
+            return {}
+        return value
+
+    def template(self, path: str, key: str) -> None:
+        if not os.path.isfile(path):
+            self.error(f"{key} {path!r} does not exist")
+
+    # ── acciones ──
+    def position(self, raw) -> PositionAction:
+        raw = self._text(raw)
+        return PositionAction(self.point(raw) if raw else None, raw)
+
+    def input(self, action: dict, position: PositionAction) -> InputAction:
+        src = self._text(action.get("input_from")).lower()
+        mouse = keyboard = None
+        if src == "mouse":
+            mv = self._text(action.get("mouse_movement"))
+            mouse = MouseInput(
+                point=position.point,
+                raw_position=position.raw,
+                offset=self.offset(mv) if mv else None,
+                button=self.choice(action, "mouse_event", "left", _MOUSE_BUTTONS),
+                clicks=self.clicks(action),
+                interval=self.number(action, "click_interval", 0.2),
+            )
+        elif src == "keyboard":
+            text = self._text(action.get("keyboard_ascii"))
+            repeat = max(1, self.integer(action, "keyboard_repeat", 1))
+            if " + " in text:
+                parts = [k.strip().lower() for k in text.split(" + ")]
+                modifiers = tuple("command" if k in ("command", "meta") else k
+                                  for k in parts if k in _MODIFIERS)
+                keys = tuple(k for k in parts if k not in _MODIFIERS)
+                keyboard = KeyboardInput(text, True, modifiers, keys, repeat)
+            else:
+                keyboard = KeyboardInput(text, False, (), (text.lower(),), repeat)
+        else:
+            self.warn(f"unknown input_from {src!r}; the input will be skipped")
+        return InputAction(mouse, keyboard, self.number(action, "input_sleep", 0.0), str(action))
+
+    def image(self, action: dict) -> ImageAction:
+        path = self._text(action.get("image_path"))
+        alternatives = []
+        raw_alts = action.get("image_alternatives") or []
+        if not isinstance(raw_alts, list):
+            self.error(f"image_alternatives {raw_alts!r} is not a list")
+            raw_alts = []
+        for alt in raw_alts:
+            if not isinstance(alt, dict) or not alt.get("image_path"):
+                continue
+            then = tuple(s.strip() for s in str(alt.get("then_steps", "")).split(",") if s.strip())
+            for s in then:
+                if not s.isdigit():
+                    self.error(f"then_steps entry {s!r} is not a step number")
+            alternatives.append(Alternative(str(alt["image_path"]), then))
+        if not path and not alternatives:
+            # An image modal opened and OK'd without choosing a file
+            self.warn("image step has no image_path; it will be skipped")
+        for p in ([path] if path else []) + [a.image_path for a in alternatives]:
+            self.template(p, "image_path")
+
+        timeout_s = self.number(action, "image_timeout", 0.0)
+        click_all = bool(action.get("image_click_all", False))
+        match_index = self.integer(action, "image_match_index", 0)
+        if match_index < 0:
+            self.error(f"image_match_index {match_index} must be ≥ 0 (0 = off, N = Nth match)")
+            match_index = 0
+        matcher = self.choice(action, "image_matcher", "template", MATCHERS)
+        if matcher != "template" and (click_all or match_index > 0 or alternatives):
+            self.warn(f"image_matcher {matcher!r} only applies to single-image search; "
+                      f"template matching will be used")
+        raw_clicks = self._text(action.get("mouse_click_qty"))
+        return ImageAction(
+            image_path=path,
+            alternatives=tuple(alternatives),
+            confidence=self.number(action, "image_confidence", 1.0),
+            timeout=None if timeout_s <= 0 else timeout_s,
+            timeout_s=timeout_s,
+            # Steps saved before image_color_mode existed keep matching in full colour
+            color_mode=self.choice(action, "image_color_mode", "bgr", COLOR_MODES),
+            matcher=matcher,
+            click_all=click_all,
+            match_index=match_index,
+            match_order=self.choice(action, "image_match_order", "reading", MATCH_ORDERS),
+            wait_before=(self.number(action, "image_wait_sleep", 0.0)
+                         if action.get("image_wait", False) else None),
+            click=bool(action.get("image_click", False)),
+            button="left" if self._text(action.get("image_click_LR")).lower() in ("", "left") else "right",
+            clicks=self.clicks(action) if raw_clicks else 1,
+            sleep_after=self.number(action, "image_sleep", 0.0),
+            summary=str(action),
+        )
+
+    def data(self, action: dict) -> DataAction:
+        path = self._text(action.get("data_path"))
+        cell = self._text(action.get("data_cell"))
+        mode = self._text(action.get("data_copy_paste")).lower()
+        if path:
+            if not _CELL_RE.match(cell):
+                self.error(f"data_cell {cell!r} is not a cell reference (e.g. A3)")
+            if mode not in _DATA_MODES:
+                self.warn(f"data_copy_paste {action.get('data_copy_paste')!r} is not "
+                          f"'Paste To' or 'Copy From'; the data step will be skipped")
+            if not os.path.exists(path):
+                # May be produced by an earlier step: checked again when the step runs
+                self.warn(f"data_path {path!r} does not exist yet")
+        sheet = action.get("data_sheet")
+        return DataAction(path, cell, mode, bool(action.get("data_select_all", False)),
+                          None if sheet is None else str(sheet), str(action))
+
+    def step(self, tab: str, number: str, conf: dict) -> Step:
+        self.where = f"{tab} / step {number}"
+        if not isinstance(conf, dict):
+            self.error("step is not an object")
+            conf = {}
+        # Mouse input clicks at the step's `position`: parse it once for both
+        parsed = self.position(conf.get("position"))
+        position = parsed if "position" in conf else None
+        inp = self.input(self.section(conf, "input"), parsed) if "input" in conf else None
+        image = self.image(self.section(conf, "image")) if "image" in conf else None
+        data = self.data(self.section(conf, "data")) if "data" in conf else None
+        self.where = ""
+        kind = "+".join(name for name, action in (("position", position), ("input", inp),
+                                                   ("image", image), ("data", data)) if action)
+        return Step(tab, number, position, inp, image, data, kind or "empty")
+
+    @staticmethod
+    def _key_number(key: str, prefix: str, sep: str) -> Optional[int]:
+        head, _, num = key.partition(sep)
+        if head.lower() != prefix or not num.isdigit():
+            return None
+        return int(num)
+
+    def plan(self, config: dict) -> Plan:
+        tabs = []
+        by_number = {}
+        if not isinstance(config, dict):
+            self.error("the configuration is not a JSON object")
+            config = {}
+        tab_cfg = config.get("tab_n", {}) or {}
+        if not isinstance(tab_cfg, dict):
+            self.error("tab_n is not an object")
+            tab_cfg = {}
+        numbered = []
+        for tab in tab_cfg:
+            n = self._key_number(tab, "tab", " ")
+            if n is None:
+                self.error(f"tab name {tab!r} is not 'Tab N'")
+            else:
+                numbered.append((n, tab))
+        for _, tab in sorted(numbered):
+            steps = []
+            keys = []
+            tab_steps = tab_cfg[tab] or {}
+            if not isinstance(tab_steps, dict):
+                self.error(f"{tab} is not an object")
+                tab_steps = {}
+            for key in tab_steps:
+                if key.lower() == "recursivity":
+                    continue
+                n = self._key_number(key, "step", "_")
+                if n is None:
+                    self.error(f"{tab}: step key {key!r} is not 'step_N'")
+                else:
+                    keys.append((n, key))
+            for n, key in sorted(keys):
+                step = self.step(tab, str(n), tab_steps[key])
+                if step.number in by_number:
+                    self.warn(f"{tab}: step {n} also exists in {by_number[step.number].tab}; "
+                              f"branches and loops use the last one")
+                by_number[step.number] = step
+                steps.append(step)
+            tabs.append((tab, tuple(steps)))
+
+        # Branch targets must exist
+        for step in by_number.values():
+            for alt in step.image.alternatives if step.image else ():
+                for num in alt.then_steps:
+                    if num.isdigit() and str(int(num)) not in by_number:
+                        self.errors.append(f"{step.tab} / step {step.number}: then_steps "
+                                           f"refers to step {num}, which does not exist")
+
+        rec = None
+        rec_cfg = config.get("recursivity")
+        if rec_cfg not in (None, "", {}) and not isinstance(rec_cfg, dict):
+            self.error(f"recursivity {rec_cfg!r} is not an object")
+        if isinstance(rec_cfg, dict) and self._text(rec_cfg.get("r_steps")):
+            self.where = "recursivity"
+            spec = self._text(rec_cfg["r_steps"])
+            repeat = self.integer(rec_cfg, "r_repeat", 1)
+            if repeat < 1:
+                self.error(f"r_repeat {repeat} must be ≥ 1")
+            try:
+                body = _LoopParser(spec, by_number).parse()
+            except ValueError as e:
+                self.error(f"r_steps {spec!r}: {e}")
+            else:
+                rec = Loop(body, max(1, repeat), spec)
+            self.where = ""
+
+        return Plan(tuple(tabs), MappingProxyType(by_number), rec, tuple(self.warnings))
+
+class _LoopParser:
+    """
+    r_steps → cuerpo de un Loop. Gramática (los espacios se ignoran):
+
+        items := item ("," item)*
+        item  := N | N "-" M | "(" items ")" ("x" | "×" | "*") K
+
+    "1,3-5" son los pasos 1, 3, 4 y 5; "1,(3-5)x4,8" repite 3–5 cuatro
+    veces dentro de cada vuelta. Un rango toma los pasos existentes entre
+    N y M; cada nivel se ejecuta en orden numérico (por el primer paso de
+    cada grupo), no en el orden escrito.
+    """
+
+    def __init__(self, spec: str, steps: Mapping[str, Step]) -> None:
+        self.text = "".join(spec.split())
+        self.pos = 0
+        self.steps = steps
+
+    def parse(self) -> Tuple[Union[Step, Loop], ...]:
+        body = self._items()
+        if self.pos != len(self.text):
+            raise ValueError(f"unexpected {self.text[self.pos]!r} at position {self.pos + 1}")
+        return body
+
+    def _peek(self) -> str:
+        return self.text[self.pos:self.pos + 1]
+
+    def _number(self) -> int:
+        start = self.pos
+        while self._peek().isdigit():
+            self.pos += 1
+        if start == self.pos:
+            found = repr(self._peek()) if self._peek() else "end of text"
+            raise ValueError(f"expected a step number at position {start + 1}, found {found}")
+        return int(self.text[start:self.pos])
+
+    def _items(self) -> Tuple[Union[Step, Loop], ...]:
+        items = []
+        while True:
+            # Empty entries ("1,,2", trailing commas) are ignored, as before
+            if self._peek() not in (",", ")", ""):
+                items.append(self._item())
+            if self._peek() != ",":
+                break
+            self.pos += 1
+        if not items:
+            raise ValueError(f"no steps at position {self.pos + 1}")
+        flat = [i for item in items for i in (item if isinstance(item, list) else [item])]
+        seen = set()
+        for item in flat:
+            for n in item.step_numbers() if isinstance(item, Loop) else (item.number,):
+                if n in seen:
+                    raise ValueError(f"step {n} is listed twice in the same loop")
+                seen.add(n)
+        first = lambda item: int((item.step_numbers() if isinstance(item, Loop) else (item.number,))[0])
+        return tuple(sorted(flat, key=first))
+
+    def _item(self):
+        if self._peek() == "(":
+            start = self.pos
+            self.pos += 1
+            body = self._items()
+            if self._peek() != ")":
+                raise ValueError(f"missing ')' for the group at position {start + 1}")
+            self.pos += 1
+            if self._peek() not in ("x", "X", "×", "*"):
+                raise ValueError(f"group at position {start + 1} needs a repeat count, e.g. (3-5)x4")
+            self.pos += 1
+            repeat = self._number()
+            if repeat < 1:
+                raise ValueError(f"repeat count {repeat} must be ≥ 1")
+            return Loop(body, repeat, self.text[start:self.pos])
+        lo = self._number()
+        if self._peek() != "-":
+            if str(lo) not in self.steps:
+                raise ValueError(f"step {lo} does not exist")
+            return self.steps[str(lo)]
+        self.pos += 1
+        hi = self._number()
+        if hi < lo:
+            raise ValueError(f"range {lo}-{hi} is reversed")
+        found = [self.steps[str(n)] for n in range(lo, hi + 1) if str(n) in self.steps]
+        if not found:
+            raise ValueError(f"no steps exist in range {lo}-{hi}")
+        return found
+
+def compile_plan(config: dict) -> Plan:
+    """
+    Compile a run.json dict into a Plan. Raises PlanError listing every
+    problem found, so nothing runs with a half-valid configuration.
+    Relative template / Excel paths are checked against the current
+    directory, as the steps resolve them.
+    """
+    compiler = _Compiler()
+    plan = compiler.plan(config)
+    if compiler.errors:
+        raise PlanError(compiler.errors)
+    return plan
+
+# Último plan compilado: (hash del contenido, config, plan)
+_cached: Optional[Tuple[str, dict, Plan]] = None
+
+def load_plan(path: str) -> Tuple[dict, Plan, bool]:
+    """
+    Read and compile the run.json at `path`. Returns (config, plan, reused)
+    where `reused` says the plan came from the previous call with the same
+    file content (e.g. the next repetition of the same run). Raises OSError
+    / ValueError if the file cannot be read or parsed, PlanError if it does
+    not compile.
+    """
+    global _cached
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    if _cached is not None and _cached[0] == digest:
+        return _cached[1], _cached[2], True
+    config = json.loads(raw.decode("utf-8"))
+    plan = compile_plan(config)
+    _cached = (digest, config, plan)
+    return config, plan, False
@@ -0,0 +1,208 @@
+"""
+run_trace.py
+────────────────────────────────────────────────────────────────────────────
+Traza estructurada por paso de run_module, y un resumen de duraciones por
+paso entre ejecuciones.
+
+run-log.txt es texto libre: para saber qué paso se ha vuelto más lento
+había que escribir regex. Ahora cada paso ejecutado deja un evento JSON
+(una línea) en run-trace.jsonl, a través del escritor con buffer de
+run_log:
+
+    {"event": "step", "run_id": "20261018-101500-3fa2", "tab": "Tab 1",
+     "step": "3", "type": "image+input", "start": 1760000000.123,
+     "end": 1760000001.456, "duration_s": 1.333, "wait_s": 1.1,
+     "action_s": 0.233, "match_rounds": 3, "outcome": "ok", "depth": 0}
+
+• `wait_s`: tiempo esperando (búsquedas de imagen y sleeps configurados);
+  `action_s`: el resto (movimientos, clics, teclas, Excel…).
+• `match_rounds`: rondas de captura de las búsquedas de imagen del paso.
+• `outcome`: "ok", "not_found" (imagen), "skipped" (datos sin fichero…)
+  o "error" (excepción).
+• `depth` > 0: paso lanzado por una rama (then_steps) de otro paso.
+• Al final de cada ejecución, un evento "run" con su duración total.
+
+Uso
+───
+$ python run_trace.py                          # run-trace.jsonl del directorio de salida
+$ python run_trace.py run-trace.jsonl --since 2026-10-11 --runs 20
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import perf_trace
+import run_log
+
+# ───────────────────────────── eventos ─────────────────────────────
+class _StepRecord:
+    __slots__ = ("wait", "rounds", "outcome")
+
+    def __init__(self) -> None:
+        self.wait = 0.0
+        self.rounds = 0
+        self.outcome = "ok"
+
+_local = threading.local()
+
+def _stack() -> List[_StepRecord]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def new_run_id() -> str:
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-") + os.urandom(2).hex()
+
+@contextmanager
+def step_span(run_id: str, tab: str, step: str, step_type: str) -> Iterator[None]:
+    """Time one step and emit its "step" event (also when it raises)."""
+    if not run_log.tracing():
+        yield
+        return
+    stack = _stack()
+    rec = _StepRecord()
+    stack.append(rec)
+    start, t0 = time.time(), time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        rec.outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        stack.pop()
+        wait = min(rec.wait, duration)
+        run_log.event({
+            "event": "step", "run_id": run_id, "tab": tab, "step": step, "type": step_type,
+            "start": round(start, 3), "end": round(start + duration, 3),
+            "duration_s": round(duration, 4), "wait_s": round(wait, 4),
+            "action_s": round(duration - wait, 4), "match_rounds": rec.rounds,
+            "outcome": rec.outcome, "depth": len(stack),
+        })
+
+def run_event(run_id: str, start: float, outcome: str) -> None:
+    """Emit the end-of-run event (`start` from time.time())."""
+    end = time.time()
+    run_log.event({"event": "run", "run_id": run_id, "start": round(start, 3),
+                   "end": round(end, 3), "duration_s": round(end - start, 4),
+                   "outcome": outcome})
+
+def add_wait(seconds: float, rounds: int = 0) -> None:
+    """Count `seconds` (and capture rounds) as waiting in the current step."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].wait += seconds
+        stack[-1].rounds += rounds
+
+def set_outcome(outcome: str) -> None:
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].outcome = outcome
+
+def sleep(seconds: float) -> None:
+    """time.sleep() que cuenta como espera del paso actual."""
+    with perf_trace.span("sleep", "sleep", {"s": seconds}):
+        time.sleep(seconds)
+    add_wait(seconds)
+
+# ───────────────────────────── resumen ─────────────────────────────
+def _percentile(sorted_vals: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if len(sorted_vals) == 1:
+        return sorted_vals[0]
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+def read_events(paths: Sequence[str]) -> Iterator[dict]:
+    """Eventos de los ficheros dados (y sus copias rotadas .1, .2, …), ignorando líneas rotas."""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(f"{glob.escape(path)}.[0-9]*"), reverse=True))
+        files.append(path)
+    for path in files:
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue        # truncated by a crash mid-write
+        except OSError:
+            continue
+
+def summarize(
+    events: Iterator[dict], since: Optional[float] = None, runs: Optional[int] = None
+) -> List[dict]:
+    """
+    One row per (tab, step) with n, p50 / p95 / max duration, p50 wait,
+    mean match rounds and non-"ok" outcomes, over top-level step events
+    newer than `since` (epoch s) and, with `runs`, only the last N runs.
+    """
+    steps = [e for e in events if e.get("event") == "step" and e.get("depth", 0) == 0
+             and (since is None or e.get("start", 0) >= since)]
+    if runs:
+        last_start: Dict[str, float] = {}
+        for e in steps:
+            last_start[e["run_id"]] = max(last_start.get(e["run_id"], 0), e["start"])
+        keep = set(sorted(last_start, key=last_start.get)[-runs:])
+        steps = [e for e in steps if e["run_id"] in keep]
+
+    groups: Dict[tuple, List[dict]] = {}
+    for e in steps:
+        groups.setdefault((e["tab"], e["step"]), []).append(e)
+
+    rows = []
+    for (tab, step), evs in groups.items():
+        durations = sorted(e["duration_s"] for e in evs)
+        waits = sorted(e.get("wait_s", 0.0) for e in evs)
+        rows.append({
+            "tab": tab, "step": step, "type": evs[-1].get("type", ""),
+            "runs": len({e["run_id"] for e in evs}), "n": len(evs),
+            "p50_s": _percentile(durations, 0.50), "p95_s": _percentile(durations, 0.95),
+            "max_s": durations[-1], "wait_p50_s": _percentile(waits, 0.50),
+            "rounds_avg": sum(e.get("match_rounds", 0) for e in evs) / len(evs),
+            "failed": sum(e.get("outcome") != "ok" for e in evs),
+        })
+    rows.sort(key=lambda r: (int(r["tab"].split()[-1]) if r["tab"].split()[-1].isdigit() else 0,
+                             int(r["step"]) if r["step"].isdigit() else 0))
+    return rows
+
+def _cli() -> None:
+    p = argparse.ArgumentParser(description="Summarize per-step durations from run traces.")
+    p.add_argument("paths", nargs="*",
+                   help=f"trace files (default: {run_log.TRACE_FILENAME} in the output directory)")
+    p.add_argument("--since", metavar="YYYY-MM-DD", help="only steps started on or after this date")
+    p.add_argument("--runs", type=int, metavar="N", help="only the last N runs")
+    p.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = p.parse_args()
+
+    paths = args.paths or [os.path.join(run_log.output_dir(), run_log.TRACE_FILENAME)]
+    since = (datetime.datetime.strptime(args.since, "%Y-%m-%d").timestamp()
+             if args.since else None)
+    rows = summarize(read_events(paths), since, args.runs)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        print("No step events found in " + ", ".join(paths))
+        return
+    print(f"{'tab':<8} {'step':>4} {'type':<18} {'runs':>4} {'n':>5} {'p50 s':>8} "
+          f"{'p95 s':>8} {'max s':>8} {'wait p50':>9} {'rounds':>6} {'failed':>6}")
+    for r in rows:
+        print(f"{r['tab']:<8} {r['step']:>4} {r['type']:<18} {r['runs']:>4} {r['n']:>5} "
+              f"{r['p50_s']:>8.3f} {r['p95_s']:>8.3f} {r['max_s']:>8.3f} "
+              f"{r['wait_p50_s']:>9.3f} {r['rounds_avg']:>6.1f} {r['failed']:>6}")
+
+if __name__ == "__main__":
+    _cli()
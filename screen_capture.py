@@ -0,0 +1,385 @@
+"""
+screen_capture.py
+────────────────────────────────────────────────────────────────────────────
+Sesiones de captura de pantalla reutilizables (MSS) para image_engine.
+
+Abrir `mss.mss()` en cada llamada obliga a reconectar con el servidor
+gráfico (X11 / Quartz / GDI) por cada monitor y cada búsqueda. Aquí se
+mantiene una sesión viva por hilo y un único layout de monitores
+compartido por todo el proceso.
+
+Reglas de thread-safety
+───────────────────────
+• Una `CaptureSession` pertenece al hilo que la creó. No se debe pasar a
+  otro hilo: el handle de MSS (Display en X11, DC en Windows) no es
+  thread-safe. Cada hilo obtiene la suya con `get_session()`.
+• El layout de monitores es compartido: se guarda como una tupla de dicts
+  de solo lectura, protegida por un lock. Cualquier hilo puede leerlo con
+  `CaptureSession.monitors()` sin copiarlo.
+• El layout sólo se vuelve a enumerar cuando una captura falla (monitor
+  desconectado / resolución cambiada), cuando se llama a
+  `invalidate_layout()`, o cuando la comprobación periódica (cada
+  `LAYOUT_CHECK_EVERY` s, sólo al consultarlo) detecta un cambio con una
+  firma barata, sin enumerar: GetSystemMetrics en Windows, los timestamps
+  de configuración de RandR en X11 (una conexión propia, sólo para eso) y
+  CGGetActiveDisplayList + CGDisplayBounds en macOS. Sin firma, sólo las
+  capturas fallidas y `invalidate_layout()` re-enumeran.
+  mss guarda la lista de monitores en cada instancia, así que re-enumerar
+  abre una conexión nueva (`mss.mss()`) en lugar de tocar su caché
+  privada; con la firma, eso sólo pasa cuando el layout ha cambiado.
+• `get_layout()`, `monitor_at(x, y)` y `point_on_screen(x, y)` exponen ese
+  mismo layout al resto del programa (p. ej. validar pasos `position`).
+• Los frames devueltos por `grab()` son arrays nuevos, propiedad de quien
+  llama; se pueden compartir entre hilos libremente.
+• La escala de cada monitor (`monitor_scale()`) se mide una vez por
+  layout y se comparte igual que el layout.
+• `grab(..., reuse=True)` devuelve en cambio un buffer preasignado de la
+  sesión (uno por monitor y modo de color): sólo es válido hasta la
+  siguiente captura de ese monitor en el mismo hilo. Es lo que usa el
+  bucle de espera de image_engine para no reservar memoria en cada ronda.
+  Son como mucho `MAX_REUSE_BUFFERS` por hilo (LRU, ver `reuse_buffer`):
+  las ROI y regiones que van cambiando no acumulan memoria.
+
+Uso
+───
+from screen_capture import get_session
+
+sess = get_session()
+for mon in sess.monitors():
+    frame = sess.grab(mon)       # np.ndarray BGR  (grab(mon, "gray") → 1 canal)
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+import cv2
+import mss
+import numpy as np
+from mss.exception import ScreenShotError
+
+Monitor = Mapping[str, int]
+
+# ───────────────────────── layout compartido ─────────────────────────
+_layout_lock = threading.Lock()
+_layout: Optional[Tuple[Monitor, ...]] = None
+_prev_layout: Optional[Tuple[Monitor, ...]] = None
+_layout_generation = 0
+_layout_checked_at = 0.0          # time.monotonic() de la última verificación
+_layout_sig: Optional[tuple] = None
+LAYOUT_CHECK_EVERY = 2.0          # s entre comprobaciones de cambios de monitores
+# (left, top, width, height) → escala UI del monitor, válida para `_scales_generation`
+_scales: Dict[Tuple[int, int, int, int], float] = {}
+_scales_generation = -1
+MAX_REUSE_BUFFERS = 8             # buffers reutilizados por hilo (monitores × color + ROIs)
+
+def reuse_buffer(bufs: "OrderedDict[tuple, np.ndarray]", key: tuple, shape: tuple) -> np.ndarray:
+    """
+    uint8 buffer of `shape` for `key` from a per-thread LRU dict, keeping
+    at most MAX_REUSE_BUFFERS of them: a new ROI or region evicts the least
+    recently used buffer instead of adding one for the life of the process.
+    """
+    buf = bufs.get(key)
+    if buf is None or buf.shape != shape:
+        buf = bufs[key] = np.empty(shape, dtype=np.uint8)
+        while len(bufs) > MAX_REUSE_BUFFERS:
+            bufs.popitem(last=False)
+    bufs.move_to_end(key)
+    return buf
+
+def invalidate_layout() -> None:
+    """Fuerza a re-enumerar los monitores en la próxima consulta."""
+    global _layout
+    with _layout_lock:
+        _layout = None
+
+def layout_generation() -> int:
+    """Contador que se incrementa cada vez que el layout cambia realmente."""
+    return _layout_generation
+
+def _layout_signature() -> Optional[tuple]:
+    """
+    Firma barata de la topología de monitores, o None si la plataforma no
+    tiene una (entonces sólo una captura fallida hace re-enumerar).
+    """
+    if sys.platform == "win32":
+        try:
+            metrics = ctypes.windll.user32.GetSystemMetrics
+            # SM_XVIRTUALSCREEN … SM_CYVIRTUALSCREEN, SM_CMONITORS
+            return tuple(metrics(i) for i in (76, 77, 78, 79, 80))
+        except (AttributeError, OSError):
+            return None
+    if sys.platform == "darwin":
+        return _quartz_signature()
+    return _x11_signature()
+
+def _quartz_signature() -> Optional[tuple]:
+    """Displays activos con sus bounds (puntos) y ancho en píxeles."""
+    try:
+        import Quartz
+
+        err, ids, count = Quartz.CGGetActiveDisplayList(32, None, None)
+        if err:
+            return None
+        sig = []
+        for display in ids[:count]:
+            b = Quartz.CGDisplayBounds(display)
+            sig.append((int(display), b.origin.x, b.origin.y, b.size.width, b.size.height,
+                        Quartz.CGDisplayPixelsWide(display)))
+        return tuple(sig)
+    except Exception:
+        return None
+
+class _XRRScreenResources(ctypes.Structure):
+    _fields_ = [("timestamp", ctypes.c_ulong), ("configTimestamp", ctypes.c_ulong),
+                ("ncrtc", ctypes.c_int), ("crtcs", ctypes.c_void_p),
+                ("noutput", ctypes.c_int), ("outputs", ctypes.c_void_p),
+                ("nmode", ctypes.c_int), ("modes", ctypes.c_void_p)]
+
+_x11_lock = threading.Lock()
+_x11 = None        # (libX11, libXrandr, Display*) ; False si no hay X11 / RandR
+
+def _open_x11():
+    x11_name, xrandr_name = ctypes.util.find_library("X11"), ctypes.util.find_library("Xrandr")
+    if not x11_name or not xrandr_name:
+        return False
+    x11, xrandr = ctypes.cdll.LoadLibrary(x11_name), ctypes.cdll.LoadLibrary(xrandr_name)
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XOpenDisplay.restype = ctypes.c_void_p
+    x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+    x11.XDefaultRootWindow.restype = ctypes.c_ulong
+    xrandr.XRRGetScreenResourcesCurrent.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+    xrandr.XRRGetScreenResourcesCurrent.restype = ctypes.POINTER(_XRRScreenResources)
+    xrandr.XRRFreeScreenResources.argtypes = [ctypes.POINTER(_XRRScreenResources)]
+    display = x11.XOpenDisplay(None)
+    if not display:
+        return False
+    return x11, xrandr, display
+
+def _x11_signature() -> Optional[tuple]:
+    """
+    RandR timestamps of the screen configuration (one round trip on a
+    private connection, no output probing): they change whenever a
+    monitor is added, removed, moved or resized.
+    """
+    global _x11
+    with _x11_lock:
+        try:
+            if _x11 is None:
+                _x11 = _open_x11()
+            if not _x11:
+                return None
+            x11, xrandr, display = _x11
+            res = xrandr.XRRGetScreenResourcesCurrent(display, x11.XDefaultRootWindow(display))
+            if not res:
+                return None
+            try:
+                r = res.contents
+                return r.timestamp, r.configTimestamp, r.ncrtc, r.noutput
+            finally:
+                xrandr.XRRFreeScreenResources(res)
+        except (AttributeError, OSError):
+            _x11 = False
+            return None
+
+# ───────────────────────── sesión por hilo ─────────────────────────
+class CaptureSession:
+    """
+    Conexión MSS de larga duración ligada a un hilo.
+
+    Use `get_session()` instead of constructing it directly so each thread
+    reuses a single session.
+    """
+
+    def __init__(self) -> None:
+        self._owner = threading.get_ident()
+        self._sct = mss.mss()
+        self._enumerated = False       # this mss instance has cached a monitor list
+        # (left, top, width, height, color) → buffer reutilizado por grab(reuse=True)
+        self._buffers: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._buffers_generation = _layout_generation
+
+    def _check_thread(self) -> None:
+        if threading.get_ident() != self._owner:
+            raise RuntimeError("CaptureSession used from a thread that does not own it; "
+                               "call screen_capture.get_session() in that thread instead.")
+
+    def monitors(self) -> Tuple[Monitor, ...]:
+        """
+        Monitores reales (sin monitors[0]), enumerados una vez por layout.
+        At most every LAYOUT_CHECK_EVERY seconds a call compares the
+        platform's layout signature; the monitors are only enumerated again
+        (on a new mss connection) when it changed, after a failed grab or
+        invalidate_layout(). All other calls just return the cache.
+        """
+        global _layout, _prev_layout, _layout_generation, _layout_checked_at, _layout_sig
+        layout = _layout
+        now = time.monotonic()
+        if layout is not None and now - _layout_checked_at < LAYOUT_CHECK_EVERY:
+            return layout
+
+        sig = _layout_signature()
+        if layout is not None and (sig is None or sig == _layout_sig):
+            with _layout_lock:
+                _layout_checked_at = now
+            return layout
+
+        self._check_thread()
+        if self._enumerated:
+            # mss caches the monitor list per instance: a new connection
+            # makes the OS really be queried again
+            self._sct.close()
+            self._sct = mss.mss()
+        fresh = tuple(MappingProxyType(dict(m)) for m in self._sct.monitors[1:])
+        self._enumerated = True
+        with _layout_lock:
+            if _layout is None or _layout != fresh:
+                if fresh != _prev_layout:
+                    _layout_generation += 1
+                _layout = _prev_layout = fresh
+            _layout_checked_at = now
+            _layout_sig = sig
+            return _layout
+
+    def grab(
+        self, mon: Monitor, color: str = "bgr", reuse: bool = False,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Captura un monitor y devuelve un np.ndarray BGR, o de un canal si
+        `color == "gray"` (convertido directamente desde BGRA, sin pasar
+        por una copia BGR intermedia).
+
+        The BGRA pixels are wrapped with `np.frombuffer` (no copy), so the
+        only write is the colour conversion. With `reuse=True` that write
+        goes into a per-monitor buffer owned by the session (see module
+        notes), keeping memory flat across long wait loops. `out` writes
+        into a caller-owned array of the right shape instead (ValueError
+        if the capture does not fit it).
+        """
+        self._check_thread()
+        try:
+            shot = self._sct.grab(dict(mon))       # BGRA
+        except ScreenShotError:
+            # The monitor probably went away: re-enumerate and let the caller retry
+            invalidate_layout()
+            raise
+        width, height = shot.size
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        code = cv2.COLOR_BGRA2GRAY if color == "gray" else cv2.COLOR_BGRA2BGR
+        if out is not None:
+            expected = (height, width) if color == "gray" else (height, width, 3)
+            if out.shape != expected:
+                raise ValueError(f"grab(out=...) expects shape {expected}, got {out.shape}")
+            cv2.cvtColor(bgra, code, dst=out)
+            return out
+        if not reuse:
+            return cv2.cvtColor(bgra, code)
+
+        if self._buffers_generation != _layout_generation:
+            # Monitors changed: drop buffers sized for the old layout
+            self._buffers.clear()
+            self._buffers_generation = _layout_generation
+        shape = (height, width) if color == "gray" else (height, width, 3)
+        buf = reuse_buffer(self._buffers, (mon["left"], mon["top"], width, height, color), shape)
+        cv2.cvtColor(bgra, code, dst=buf)
+        return buf
+
+    def monitor_scale(self, mon: Monitor) -> float:
+        """
+        Factor by which UI elements are enlarged in this monitor's captures:
+        captured (physical) pixels per logical pixel of the monitor rect
+        — 2.0 on a Retina display — times the OS scaling setting on
+        Windows (GetDpiForMonitor / 96, e.g. 1.5 at 150 %). Measured with a
+        tiny grab once per monitor and layout; 1.0 if it cannot be read.
+        """
+        global _scales_generation
+        key = (mon["left"], mon["top"], mon["width"], mon["height"])
+        with _layout_lock:
+            if _scales_generation != _layout_generation:
+                _scales.clear()
+                _scales_generation = _layout_generation
+            if key in _scales:
+                return _scales[key]
+
+        self._check_thread()
+        probe = 8
+        try:
+            shot = self._sct.grab({"left": mon["left"], "top": mon["top"],
+                                   "width": probe, "height": probe})
+            scale = shot.size[0] / probe
+        except ScreenShotError:
+            scale = 1.0
+        scale *= _os_ui_scale(mon)
+        with _layout_lock:
+            _scales[key] = scale
+        return scale
+
+    def close(self) -> None:
+        self._buffers.clear()
+        sct, self._sct = self._sct, None
+        if sct is not None:
+            sct.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def _os_ui_scale(mon: Monitor) -> float:
+    """Escalado del sistema (Windows: DPI efectivo del monitor / 96); 1.0 en el resto."""
+    if sys.platform != "win32":
+        return 1.0
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        pt = wintypes.POINT(mon["left"] + mon["width"] // 2, mon["top"] + mon["height"] // 2)
+        hmon = ctypes.windll.user32.MonitorFromPoint(pt, 2)    # MONITOR_DEFAULTTONEAREST
+        dpi_x, dpi_y = ctypes.c_uint(), ctypes.c_uint()
+        # MDT_EFFECTIVE_DPI = 0; needs the per-monitor DPI awareness set by run_module
+        if ctypes.windll.shcore.GetDpiForMonitor(hmon, 0, ctypes.byref(dpi_x), ctypes.byref(dpi_y)) != 0:
+            return 1.0
+        return dpi_x.value / 96.0
+    except (AttributeError, OSError):
+        return 1.0
+
+_local = threading.local()
+
+def get_layout() -> Tuple[Monitor, ...]:
+    """Layout de monitores compartido (consultado desde la sesión del hilo actual)."""
+    return get_session().monitors()
+
+def monitor_at(x: int, y: int) -> Optional[int]:
+    """Índice (1-based, como en image_engine) del monitor que contiene (x, y), o None."""
+    for idx, mon in enumerate(get_layout(), start=1):
+        if (mon["left"] <= x < mon["left"] + mon["width"]
+                and mon["top"] <= y < mon["top"] + mon["height"]):
+            return idx
+    return None
+
+def point_on_screen(x: int, y: int) -> bool:
+    """True si la coordenada absoluta (x, y) cae en algún monitor conectado."""
+    return monitor_at(x, y) is not None
+
+def get_session() -> CaptureSession:
+    """Devuelve la `CaptureSession` del hilo actual (la crea si no existe)."""
+    sess = getattr(_local, "session", None)
+    if sess is None or sess._sct is None:
+        sess = CaptureSession()
+        _local.session = sess
+    return sess
+
+def close_session() -> None:
+    """Cierra la sesión del hilo actual (p. ej. al terminar un worker)."""
+    sess = getattr(_local, "session", None)
+    if sess is not None:
+        sess.close()
+        _local.session = None
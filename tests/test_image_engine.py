@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+import image_engine
+from feature_matcher import get_backend
+
+
+def _template(seed):
+    return np.random.default_rng(seed).integers(0, 256, size=(20, 30, 3), dtype=np.uint8)
+
+
+def _haystack(*patches):
+    hay = np.full((200, 300, 3), 128, dtype=np.uint8)
+    for patch, (x, y) in patches:
+        h, w = patch.shape[:2]
+        hay[y:y + h, x:x + w] = patch
+    return hay
+
+
+def _positions(found):
+    return sorted((x, y) for x, y, *_ in found)
+
+
+def test_all_matches_exact_copies_at_confidence_one():
+    # TM_CCOEFF_NORMED scores a pixel-exact copy 0.99999…: the GUI default
+    # confidence of 1.00 must still find every copy.
+    tpl = _template(1)
+    hay = _haystack((tpl, (10, 15)), (tpl, (200, 120)))
+    confs = image_engine._build_confs(1.0, 0.30, 0.05)
+
+    tier, found = image_engine._all_matches_in_frame(hay, {1.0: tpl}, tpl, [1.0], confs, 0.3)
+
+    assert tier == 1.0
+    assert _positions(found) == [(10, 15), (200, 120)]
+
+
+def test_all_matches_walks_down_the_ladder():
+    tpl = _template(2)
+    noisy = np.clip(tpl.astype(int) + np.random.default_rng(3).integers(-40, 41, tpl.shape),
+                    0, 255).astype(np.uint8)
+    hay = _haystack((noisy, (10, 15)), (noisy, (200, 120)))
+    confs = image_engine._build_confs(1.0, 0.30, 0.05)
+
+    tier, found = image_engine._all_matches_in_frame(hay, {1.0: tpl}, tpl, [1.0], confs, 0.3)
+
+    assert tier is not None and tier < 1.0
+    assert _positions(found) == [(10, 15), (200, 120)]
+
+
+def test_all_matches_keeps_only_the_best_tier():
+    tpl = _template(4)
+    look_alike = tpl.copy()
+    look_alike[:, :12] = 128
+    hay = _haystack((tpl, (10, 15)), (look_alike, (200, 120)))
+    confs = image_engine._build_confs(1.0, 0.30, 0.05)
+
+    tier, found = image_engine._all_matches_in_frame(hay, {1.0: tpl}, tpl, [1.0], confs, 0.3)
+
+    assert tier == 1.0
+    assert _positions(found) == [(10, 15)]
+
+
+def test_hint_confs_stop_near_the_remembered_score():
+    confs = image_engine._build_confs(1.0, 0.30, 0.05)
+    hint = {"monitor": [0, 0, 1920, 1080],
+            "history": [[0.65, 1.0, "0,0,1920,1080"], [0.97, 1.0, "0,0,1920,1080"]]}
+
+    assert image_engine._hint_confs(confs, hint) == [1.0, 0.95]
+    assert image_engine._hint_confs(confs, {"monitor": [0, 0, 1920, 1080]}) == [1.0]
+
+
+def test_batch_roi_ignores_a_weak_look_alike_near_the_last_hit(monkeypatch):
+    tpl = _template(5)
+    look_alike = tpl.copy()
+    look_alike[:, :12] = 128
+    hay = _haystack((look_alike, (10, 15)), (tpl, (200, 120)))
+    monkeypatch.setattr(image_engine, "_capture_monitor", lambda mon, color, reuse=False: hay)
+    mon = {"left": 0, "top": 0, "width": 300, "height": 200}
+    hint = {"x": 10, "y": 15, "w": 30, "h": 20, "scale": 1.0, "monitor": [0, 0, 300, 200],
+            "history": [[1.0, 1.0, "0,0,300,200"]]}
+    target = {"key": "tpl.png", "color": "bgr", "template": tpl, "pyramid": {1.0: tpl},
+              "scales": [1.0], "hint": hint, "mon_scales": {1: [1.0]}, "orders": {}}
+    confs = image_engine._build_confs(1.0, 0.30, 0.05)
+
+    _, hits = image_engine._scan_monitor_batch(1, mon, None, [target], "bgr", confs,
+                                               lambda msg: None, 20, 1, "exhaustive")
+
+    assert hits["tpl.png"][:2] == (200, 120)
+
+
+def test_predicted_scales_do_not_use_up_the_attempt_budget():
+    tpl = _template(6)
+    noisy = np.clip(tpl.astype(int) + np.random.default_rng(7).integers(-40, 41, tpl.shape),
+                    0, 255).astype(np.uint8)
+    hay = _haystack((noisy, (50, 40)))
+    confs = [0.99, 0.98, 0.97, 0.80]
+    scales = [1.3, 1.2, 1.0]          # two predicted scales in front of a one-scale ladder
+
+    def search(free):
+        found, _ = image_engine._find_in_monitor(hay, tpl, confs, scales, lambda msg: None, 0, 4,
+                                                 free_scales=free)
+        return found
+
+    assert search(frozenset()) is None
+    assert search(frozenset({1.3, 1.2}))[:2] == (50, 40)
+
+def test_feature_keypoints_are_cached_with_their_template(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    paths = []
+    for i in range(2):
+        paths.append(tmp_path / f"t{i}.png")
+        cv2.imwrite(str(paths[-1]), rng.integers(0, 256, (80, 80, 3), dtype=np.uint8))
+    backend = get_backend("orb")
+    calls = []
+    real_prepare = backend.prepare
+    monkeypatch.setattr(backend, "prepare", lambda t: calls.append(1) or real_prepare(t))
+
+    cache = image_engine.TemplateCache(max_entries=1)
+    template, _ = cache.get(paths[0], [1.0])
+    first = cache.features(paths[0], "bgr", template, backend)
+    assert first is not None
+    assert cache.features(paths[0], "bgr", template, backend) is first
+    assert len(calls) == 1
+
+    # Evicting the template drops its keypoints too
+    cache.get(paths[1], [1.0])
+    assert cache.stats()["entries"] == 1
+    template, _ = cache.get(paths[0], [1.0])
+    cache.features(paths[0], "bgr", template, backend)
+    assert len(calls) == 2
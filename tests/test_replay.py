@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+import pytest
+
+import image_engine
+from replay_capture import save_metadata
+
+
+def _texture(seed, shape):
+    return np.random.default_rng(seed).integers(0, 256, size=shape, dtype=np.uint8)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """Two side-by-side 320×240 monitors; the button is on the second one."""
+    monitors = [{"left": 0, "top": 0, "width": 320, "height": 240},
+                {"left": 320, "top": 0, "width": 320, "height": 240}]
+    screens = [np.full((240, 320, 3), 90, dtype=np.uint8),
+               np.full((240, 320, 3), 160, dtype=np.uint8)]
+    button = _texture(1, (24, 40, 3))
+    screens[1][100:124, 50:90] = button
+    for idx, screen in enumerate(screens, start=1):
+        cv2.imwrite(str(tmp_path / f"screen{idx}.png"), screen)
+    save_metadata(tmp_path, monitors, scales=[1.0, 1.0])
+
+    cv2.imwrite(str(tmp_path / "button.png"), button)
+    cv2.imwrite(str(tmp_path / "missing.png"), _texture(2, (24, 40, 3)))
+    image_engine.use_replay(tmp_path)
+    yield tmp_path
+    image_engine.stop_replay()
+
+
+def _find(path):
+    return image_engine.find_image(path, timeout=0.3, poll_every=0.1, max_attempts=3,
+                                   remember=False, log_fn=lambda msg: None)
+
+
+def test_replay_finds_the_recorded_button(recording):
+    assert _find(recording / "button.png") == (370, 100, 40, 24, 2)
+
+
+def test_replay_misses_an_absent_template(recording):
+    assert _find(recording / "missing.png") is None
@@ -0,0 +1,154 @@
+import pytest
+
+from run_plan import Loop, PlanError, compile_plan
+
+
+def _config(tabs, r_steps=None, r_repeat="1"):
+    config = {"tab_n": tabs}
+    if r_steps is not None:
+        config["recursivity"] = {"r_steps": r_steps, "r_repeat": r_repeat}
+    return config
+
+
+def _steps(*numbers, tab="Tab 1"):
+    return {tab: {f"step_{n}": {"position": f"{n}x{n}"} for n in numbers}}
+
+
+def _errors(config):
+    with pytest.raises(PlanError) as excinfo:
+        compile_plan(config)
+    return excinfo.value.errors
+
+
+def _flatten(body):
+    return [(item.label, item.repeat, _flatten(item.body)) if isinstance(item, Loop) else item.number
+            for item in body]
+
+
+def test_valid_plan_orders_tabs_and_steps_numerically():
+    tabs = {"Tab 10": {"step_1": {"position": "5x6"}},
+            "Tab 2": {"step_10": {"position": "1x2"},
+                      "step_9": {"input": {"input_from": "Keyboard", "keyboard_ascii": "Ctrl + C",
+                                           "keyboard_repeat": "2", "input_sleep": "0.5"}}}}
+
+    plan = compile_plan(_config(tabs))
+
+    assert [tab for tab, _ in plan.tabs] == ["Tab 2", "Tab 10"]
+    assert [s.number for s in plan.iter_steps()] == ["9", "10", "1"]
+    assert plan.steps["10"].position.point == (1, 2)
+    keyboard = plan.steps["9"].input.keyboard
+    assert (keyboard.combo, keyboard.modifiers, keyboard.keys, keyboard.repeat) == (True, ("ctrl",), ("c",), 2)
+    assert plan.steps["9"].input.sleep_after == 0.5
+    assert plan.steps["9"].kind == "input"
+    assert plan.recursivity is None and plan.warnings == ()
+
+
+def test_mouse_input_clicks_at_the_step_position():
+    tabs = {"Tab 1": {"step_1": {"position": "10x20",
+                                 "input": {"input_from": "Mouse", "mouse_event": "Right",
+                                           "mouse_click_qty": "two", "mouse_movement": "5×-3"}}}}
+
+    step = compile_plan(_config(tabs)).steps["1"]
+
+    mouse = step.input.mouse
+    assert (mouse.point, mouse.offset, mouse.button, mouse.clicks) == ((10, 20), (5, -3), "right", 2)
+    assert step.kind == "position+input"
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("3", ["3"]),
+    ("3,1", ["1", "3"]),
+    ("1,,3,", ["1", "3"]),
+    ("2-4", ["2", "3", "4"]),
+    ("1-9", ["1", "2", "3", "4", "5"]),
+    ("1,(3-4)x2,5", ["1", ("(3-4)x2", 2, ["3", "4"]), "5"]),
+    ("( 2 , (3-4) × 3 ) * 2", [("(2,(3-4)×3)*2", 2, ["2", ("(3-4)×3", 3, ["3", "4"])])]),
+])
+def test_loop_grammar(spec, expected):
+    plan = compile_plan(_config(_steps(1, 2, 3, 4, 5), r_steps=spec, r_repeat="3"))
+
+    assert plan.recursivity.repeat == 3
+    assert plan.recursivity.label == spec
+    assert _flatten(plan.recursivity.body) == expected
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("1,a", "expected a step number at position 3"),
+    ("(1-2", "missing ')'"),
+    ("(1-2)", "needs a repeat count"),
+    ("(1-2)x0", "repeat count 0 must be ≥ 1"),
+    ("4-2", "range 4-2 is reversed"),
+    ("7", "step 7 does not exist"),
+    ("6-9", "no steps exist in range 6-9"),
+    ("1)", "unexpected ')' at position 2"),
+    ("1,(1-2)x2", "step 1 is listed twice"),
+])
+def test_malformed_loop_strings(spec, message):
+    errors = _errors(_config(_steps(1, 2, 3, 4, 5), r_steps=spec))
+
+    assert len(errors) == 1
+    assert errors[0].startswith(f"recursivity: r_steps {spec!r}: ")
+    assert message in errors[0]
+
+
+def test_duplicate_step_numbers_warn_and_the_last_tab_wins():
+    tabs = {"Tab 1": {"step_1": {"position": "1x1"}}, "Tab 2": {"step_1": {"position": "2x2"}}}
+
+    plan = compile_plan(_config(tabs, r_steps="1"))
+
+    assert plan.warnings == ("Tab 2: step 1 also exists in Tab 1; branches and loops use the last one",)
+    assert [s.tab for s in plan.iter_steps()] == ["Tab 1", "Tab 2"]
+    assert plan.steps["1"].position.point == (2, 2)
+    assert plan.recursivity.body[0].tab == "Tab 2"
+
+
+def test_every_error_is_listed_with_its_step():
+    tabs = {"Tab 1": {"step_1": {"position": "12-34"},
+                      "step_2": {"input": "bad"},
+                      "step_3": {"image": {"image_path": "", "image_confidence": "high",
+                                           "image_match_index": "-1"}},
+                      "step_4": {"data": {"data_path": "book.xlsx", "data_cell": "A0",
+                                          "data_copy_paste": "Copy From"}},
+                      "stepfive": {}},
+            "Sheet": {}}
+
+    errors = _errors(_config(tabs, r_steps="1-2", r_repeat="0"))
+
+    assert sorted(errors) == sorted([
+        "tab name 'Sheet' is not 'Tab N'",
+        "Tab 1: step key 'stepfive' is not 'step_N'",
+        "Tab 1 / step 1: position '12-34' is not 'XxY' (e.g. 100x200)",
+        "Tab 1 / step 2: input 'bad' is not an object",
+        "Tab 1 / step 3: image_confidence 'high' is not a number",
+        "Tab 1 / step 3: image_match_index -1 must be ≥ 0 (0 = off, N = Nth match)",
+        "Tab 1 / step 4: data_cell 'A0' is not a cell reference (e.g. A3)",
+        "recursivity: r_repeat 0 must be ≥ 1",
+    ])
+
+
+def test_unfilled_modals_are_skipped_with_a_warning():
+    tabs = {"Tab 1": {"step_1": {"image": {"image_path": "", "image_color_mode": "sepia"}},
+                      "step_2": {"data": {"data_path": "", "data_copy_paste": "Copy From"}}}}
+
+    plan = compile_plan(_config(tabs))
+
+    assert plan.steps["1"].image.image_path == ""
+    assert plan.steps["1"].image.color_mode == "bgr"
+    assert plan.steps["2"].data.path == ""
+    assert plan.warnings == (
+        "Tab 1 / step 1: image step has no image_path; it will be skipped",
+        "Tab 1 / step 1: image_color_mode 'sepia' is not one of auto, gray, bgr; using 'bgr'",
+    )
+
+
+def test_then_steps_must_exist(tmp_path):
+    template = tmp_path / "button.png"
+    template.write_bytes(b"")
+    tabs = {"Tab 1": {"step_1": {"image": {"image_path": str(template),
+                                           "image_alternatives": [
+                                               {"image_path": str(template), "then_steps": "2, 9"}]}},
+                      "step_2": {"position": "1x1"}}}
+
+    errors = _errors(_config(tabs))
+
+    assert errors == ["Tab 1 / step 1: then_steps refers to step 9, which does not exist"]